@@ -0,0 +1,240 @@
+"""
+Columnar, vectorized grouped statistics for benchmark results.
+
+Rows are converted once into a Frame: numeric columns become float64 NumPy
+arrays (missing values are NaN) and string columns become categorical integer
+codes. grouped_stats then computes count, mean, median, std, min, max and
+percentiles for any combination of group keys without a Python loop over rows.
+
+Usage:
+    python analysis_engine.py --bench 1000000       # time grouped stats on synthetic rows
+    python analysis_engine.py --bench 100000000     # needs ~3 GB of RAM
+"""
+import time
+import argparse
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NUMERIC_COLUMNS = ["step", "total_latency_ms", "tokens_per_sec", "memory_throughput_gb_s", "param_throughput_gb_s",
+                   "time_to_ready_ms", "joules_per_token"]
+CATEGORICAL_COLUMNS = ["backend", "hostname", "quantize", "size", "device", "test", "build_variant", "phase",
+                       "shards", "page_cache", "beam", "default_device"]
+MISSING = "unknown"
+# Default of each benchmark sweep dimension (tinygrad shards and BEAM, llama.cpp
+# build variant and page-cache state). Rows without a value were recorded
+# before the dimension existed and count as default. The device dimension's
+# default is per host (the default_device column).
+DEFAULT_CONFIG = {"shards": "1", "beam": "0", "build_variant": "generic", "page_cache": "warm"}
+
+
+def to_float_array(values: Sequence) -> np.ndarray:
+    """Convert a column of numbers, numeric strings, None or '' to float64 with NaN for missing."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.full(len(values), np.nan)
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+class Categorical:
+    """Integer codes into a sorted list of category labels."""
+
+    def __init__(self, codes: np.ndarray, categories: List[str]):
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def from_values(cls, values: Sequence) -> "Categorical":
+        labels = np.array([MISSING if v is None or v == "" else str(v) for v in values], dtype=object)
+        categories, codes = np.unique(labels, return_inverse=True) if len(labels) else (np.array([], dtype=object), np.array([], dtype=np.int64))
+        return cls(codes.astype(np.int32), [str(c) for c in categories])
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class Frame:
+    """A minimal column store: float64 arrays plus categorical columns, all the same length."""
+
+    def __init__(self, numeric: Dict[str, np.ndarray], categorical: Dict[str, Categorical]):
+        self.numeric = numeric
+        self.categorical = categorical
+        lengths = {len(c) for c in list(numeric.values()) + list(categorical.values())}
+        assert len(lengths) <= 1, f"column lengths differ: {lengths}"
+        self.num_rows = lengths.pop() if lengths else 0
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence], numeric: Iterable[str] = NUMERIC_COLUMNS,
+                     categorical: Iterable[str] = CATEGORICAL_COLUMNS) -> "Frame":
+        n = len(next(iter(columns.values()), []))
+        return cls(
+            {name: to_float_array(columns.get(name, [None] * n)) for name in numeric},
+            {name: Categorical.from_values(columns.get(name, [None] * n)) for name in categorical},
+        )
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict], numeric: Iterable[str] = NUMERIC_COLUMNS,
+                  categorical: Iterable[str] = CATEGORICAL_COLUMNS) -> "Frame":
+        numeric, categorical = list(numeric), list(categorical)
+        columns = {name: [row.get(name) for row in rows] for name in numeric + categorical}
+        return cls.from_columns(columns, numeric, categorical)
+
+    def filter(self, mask: np.ndarray) -> "Frame":
+        return Frame(
+            {name: col[mask] for name, col in self.numeric.items()},
+            {name: Categorical(col.codes[mask], col.categories) for name, col in self.categorical.items()},
+        )
+
+    def equals(self, column: str, value: str) -> np.ndarray:
+        """Boolean mask of rows whose categorical column equals value."""
+        col = self.categorical[column]
+        if value not in col.categories:
+            return np.zeros(self.num_rows, dtype=bool)
+        return col.codes == col.categories.index(value)
+
+    def group_ids(self, keys: Sequence[str]) -> Tuple[np.ndarray, List[Tuple[str, ...]]]:
+        """Combine categorical key columns into one dense group id per row."""
+        if not keys:
+            return np.zeros(self.num_rows, dtype=np.int64), [()]
+        cols = [self.categorical[k] for k in keys]
+        dims = [max(len(c.categories), 1) for c in cols]
+        combined = cols[0].codes.astype(np.int64)
+        for col, dim in zip(cols[1:], dims[1:]):
+            combined *= dim
+            combined += col.codes
+        # Dense-rank the combined codes with a lookup table instead of np.unique's sort
+        present = np.flatnonzero(np.bincount(combined, minlength=int(np.prod(dims))))
+        remap = np.zeros(int(np.prod(dims)), dtype=np.int64)
+        remap[present] = np.arange(len(present))
+        labels = [tuple(c.categories[i] for c, i in zip(cols, idx)) for idx in zip(*np.unravel_index(present, dims))]
+        return remap[combined], labels
+
+
+def non_default_config(row: Dict, vary: Sequence[str] = ()) -> Dict[str, str]:
+    """The sweep dimensions (device and DEFAULT_CONFIG) on which a result row is off its default, except vary."""
+    off = {}
+    device, default_device = row.get("device"), row.get("default_device")
+    if default_device not in (None, "") and str(device) != str(default_device):
+        off["device"] = str(device)
+    for column, default in DEFAULT_CONFIG.items():
+        value = row.get(column)
+        if value not in (None, "") and str(value) != default:
+            off[column] = str(value)
+    return {column: value for column, value in off.items() if column not in vary}
+
+
+def is_default_config(row: Dict, vary: Sequence[str] = ()) -> bool:
+    """Row-level counterpart of benchmark_analysis.default_config, for scripts that work on row dicts."""
+    return not non_default_config(row, vary)
+
+
+def grouped_stats(frame: Frame, keys: Sequence[str], metric: str,
+                  percentiles: Sequence[float] = (5, 95)) -> Dict[Tuple[str, ...], Dict[str, float]]:
+    """Vectorized per-group n, mean, median, std (ddof=1), min, max and percentiles.
+
+    Rows with a NaN metric are ignored. Percentiles use linear interpolation,
+    matching numpy.percentile's default.
+    """
+    values = frame.numeric[metric]
+    ids, labels = frame.group_ids(keys)
+    valid = ~np.isnan(values)
+    values, ids = values[valid], ids[valid]
+    if values.size == 0:
+        return {}
+
+    # Make every group a contiguous, sorted run: a stable (radix for small
+    # group counts) argsort on the group id, then an in-place sort per run.
+    # This is several times faster than np.lexsort((values, ids)).
+    num_groups = len(labels)
+    order = np.argsort(ids.astype(np.uint16) if num_groups <= np.iinfo(np.uint16).max else ids, kind="stable")
+    values, ids = values[order], ids[order]
+    counts = np.bincount(ids, minlength=num_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    nonempty = counts > 0
+    for start, count in zip(starts[nonempty], counts[nonempty]):
+        values[start:start + count].sort()
+
+    sums = np.bincount(ids, weights=values, minlength=num_groups)
+    means = np.divide(sums, counts, out=np.full(num_groups, np.nan), where=nonempty)
+    sq_dev = np.bincount(ids, weights=(values - means[ids]) ** 2, minlength=num_groups)
+    stds = np.divide(sq_dev, counts - 1, out=np.zeros(num_groups), where=counts > 1) ** 0.5
+
+    def quantile(q: float) -> np.ndarray:
+        pos = starts + q * np.maximum(counts - 1, 0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, starts + np.maximum(counts - 1, 0))
+        frac = pos - lo
+        lo, hi = np.minimum(lo, values.size - 1), np.minimum(hi, values.size - 1)
+        return values[lo] * (1 - frac) + values[hi] * frac
+
+    mins = values[np.minimum(starts, values.size - 1)]
+    maxs = values[np.minimum(starts + counts - 1, values.size - 1)]
+    medians = quantile(0.5)
+    pcts = {p: quantile(p / 100) for p in percentiles}
+
+    result = {}
+    for g in np.flatnonzero(nonempty):
+        s = {
+            "n": int(counts[g]),
+            "mean": float(means[g]),
+            "median": float(medians[g]),
+            "std": float(stds[g]),
+            "min": float(mins[g]),
+            "max": float(maxs[g]),
+        }
+        for p, arr in pcts.items():
+            s[f"p{p:g}"] = float(arr[g])
+        result[labels[g]] = s
+    return result
+
+
+def grouped_values(frame: Frame, keys: Sequence[str], metric: str) -> Dict[Tuple[str, ...], np.ndarray]:
+    """Split a metric's non-NaN values by group, e.g. to feed bootstrap resampling."""
+    values = frame.numeric[metric]
+    ids, labels = frame.group_ids(keys)
+    valid = ~np.isnan(values)
+    values, ids = values[valid], ids[valid]
+    order = np.argsort(ids, kind="stable")
+    counts = np.bincount(ids, minlength=len(labels))
+    chunks = np.split(values[order], np.cumsum(counts)[:-1])
+    return {labels[g]: chunk for g, chunk in enumerate(chunks) if chunk.size}
+
+
+def synthetic_frame(num_rows: int, seed: int = 0) -> Frame:
+    """Random benchmark-like rows for benchmarking the engine."""
+    rng = np.random.default_rng(seed)
+    categorical = {
+        "backend": Categorical(rng.integers(0, 3, num_rows, dtype=np.int32), ["llamacpp", "mlc_llm", "tinygrad"]),
+        "hostname": Categorical(rng.integers(0, 50, num_rows, dtype=np.int32), [f"host{i:02d}" for i in range(50)]),
+        "quantize": Categorical(rng.integers(0, 4, num_rows, dtype=np.int32), ["default", "float16", "int8", "nf4"]),
+    }
+    tps = rng.gamma(4.0, 8.0, num_rows)
+    numeric = {"tokens_per_sec": tps, "total_latency_ms": 20_000 / tps}
+    return Frame(numeric, categorical)
+
+
+def benchmark(num_rows: int, key_sets: Optional[List[List[str]]] = None):
+    key_sets = key_sets or [["backend"], ["backend", "hostname"], ["backend", "hostname", "quantize"]]
+    start = time.perf_counter()
+    frame = synthetic_frame(num_rows)
+    print(f"Generated {num_rows:,} rows in {time.perf_counter() - start:.2f}s")
+    # Untimed pass so first-touch page faults don't count against the first key set
+    grouped_stats(frame, key_sets[0], "tokens_per_sec")
+    for keys in key_sets:
+        start = time.perf_counter()
+        result = grouped_stats(frame, keys, "tokens_per_sec")
+        elapsed = time.perf_counter() - start
+        print(f"  {' x '.join(keys):<32} {len(result):>6} groups  {elapsed:>7.2f}s  {num_rows / elapsed / 1e6:>8.1f} M rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized grouped statistics for benchmark results")
+    parser.add_argument("--bench", type=int, default=1_000_000, metavar="ROWS", help="Number of synthetic rows (default: 1M)")
+    args = parser.parse_args()
+    benchmark(args.bench)
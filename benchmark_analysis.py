@@ -1,148 +1,288 @@
 """
 Analyze and compare benchmark results across backends (tinygrad vs llamacpp) and hosts.
-Usage: python benchmark_analysis.py
+
+All tables are computed from a single columnar load (see analysis_engine.py).
+
+Usage:
+    python benchmark_analysis.py
+    python benchmark_analysis.py --hostname softmacs --since 2025-11-01
 """
-import csv
-from collections import defaultdict
-from statistics import mean, median, stdev
-
-
-def load_csv(path: str) -> list[dict]:
-    with open(path, "r") as f:
-        return list(csv.DictReader(f))
-
-
-def safe_float(val: str) -> float | None:
-    try:
-        return float(val) if val else None
-    except ValueError:
-        return None
-
-
-def aggregate_by_group(rows: list[dict], group_keys: list[str], metric: str) -> dict:
-    """Group rows by keys and aggregate metric values."""
-    groups = defaultdict(list)
-    for row in rows:
-        key = tuple(row.get(k, "unknown") for k in group_keys)
-        val = safe_float(row.get(metric))
-        if val is not None:
-            groups[key].append(val)
-    return groups
-
-
-def stats(values: list[float]) -> dict:
-    if not values:
-        return {"n": 0, "mean": None, "median": None, "std": None, "min": None, "max": None}
-    return {
-        "n": len(values),
-        "mean": mean(values),
-        "median": median(values),
-        "std": stdev(values) if len(values) > 1 else 0,
-        "min": min(values),
-        "max": max(values),
-    }
-
-
-def print_comparison_table(title: str, data: dict, metric_name: str):
-    """Print a formatted comparison table."""
-    print(f"\n{'='*80}")
+import os
+import argparse
+
+import numpy as np
+
+from analysis_engine import (Frame, MISSING, NUMERIC_COLUMNS, CATEGORICAL_COLUMNS, DEFAULT_CONFIG, grouped_stats,
+                             grouped_values)
+from bench_stats import compare, format_comparison, median_ci
+from results_store import DEFAULT_PATH, ResultsStore, load_results
+
+BACKENDS = ["tinygrad", "llamacpp"]
+
+
+def load_frame(**filters) -> Frame:
+    """Load all backends into one Frame, straight from the results store when available.
+
+    The Frame keeps tinygrad's compile/warmup steps; see steady_state.
+    """
+    columns = NUMERIC_COLUMNS + CATEGORICAL_COLUMNS
+    if os.path.exists(DEFAULT_PATH):
+        with ResultsStore(DEFAULT_PATH) as store:
+            data = store.query(columns, backend=BACKENDS, **filters)
+        if data["backend"]:
+            return Frame.from_columns(data)
+
+    rows = []
+    for backend in BACKENDS:
+        for row in load_results(backend, **filters):
+            row["backend"] = backend
+            rows.append(row)
+    frame = Frame.from_rows(rows)
+    # llama-bench summary rows (step 0) duplicate the per-sample rows
+    return frame.filter(frame.numeric["step"] != 0)
+
+
+def steady_state(frame: Frame) -> Frame:
+    """Drop tinygrad compile and JIT-warmup steps (see tinygrad_parse.label_phases)."""
+    return frame.filter(~(frame.equals("phase", "compile") | frame.equals("phase", "warmup")))
+
+
+def decode_only(frame: Frame) -> Frame:
+    """Drop llama-bench prompt processing tests (pp512), leaving decode (tg) and tinygrad steps."""
+    tests = frame.categorical["test"]
+    prefill = np.array([label.startswith("pp") for label in tests.categories], dtype=bool)
+    if not len(prefill):
+        return frame
+    return frame.filter(~prefill[tests.codes])
+
+
+def default_config(frame: Frame, vary: tuple[str, ...] = ()) -> Frame:
+    """Keep rows at the default of each sweep dimension, except those in vary.
+
+    The defaults are the host's default device, one tinygrad shard, no BEAM
+    search, the baseline llama.cpp build and a warm page cache (DEFAULT_CONFIG);
+    rows from before a dimension was recorded count as default.
+    """
+    default = np.ones(frame.num_rows, dtype=bool)
+    if "device" not in vary:
+        device, host_default = frame.categorical["device"], frame.categorical["default_device"]
+        labels = np.asarray(device.categories, dtype=object)[device.codes]
+        defaults = np.asarray(host_default.categories, dtype=object)[host_default.codes]
+        default &= (defaults == MISSING) | (labels == defaults)
+    for column, value in DEFAULT_CONFIG.items():
+        if column not in vary:
+            default &= frame.equals(column, MISSING) | frame.equals(column, value)
+    return frame.filter(default)
+
+
+def print_time_to_ready_table(frame: Frame):
+    """Median time to steady state per run (compile + warmup), by backend, host and quantization."""
+    # one row per run: the first step carries the run's time_to_ready_ms like every other step
+    first = frame.filter((frame.numeric["step"] == 1) & ~np.isnan(frame.numeric["time_to_ready_ms"]))
+    if not first.num_rows:
+        return
+    stats = grouped_stats(first, ["backend", "hostname", "quantize"], "time_to_ready_ms")
+    print(f"\n{'='*96}")
+    print(" TIME TO READY (ms, compile + JIT warmup per run) by Backend, Host & Quantization")
+    print(f"{'='*96}")
+    print(f"{'Group':<44} {'Runs':>6} {'Median':>12} {'Min':>12} {'Max':>12}")
+    print("-" * 96)
+    for key in sorted(stats):
+        s = stats[key]
+        print(f"{' / '.join(key):<44} {s['n']:>6} {s['median']:>12.1f} {s['min']:>12.1f} {s['max']:>12.1f}")
+
+
+def print_comparison_table(title: str, data: dict, values: dict):
+    """Print a formatted comparison table from grouped_stats output.
+
+    The median is shown with a 95% bootstrap confidence interval.
+    """
+    print(f"\n{'='*96}")
     print(f" {title}")
-    print(f"{'='*80}")
-    print(f"{'Group':<50} {'N':>6} {'Mean':>10} {'Median':>10} {'Std':>10}")
-    print("-" * 80)
+    print(f"{'='*96}")
+    print(f"{'Group':<44} {'N':>6} {'Mean':>10} {'Median':>10} {'95% CI':>14} {'Std':>10}")
+    print("-" * 96)
 
-    sorted_keys = sorted(data.keys())
-    for key in sorted_keys:
-        s = stats(data[key])
-        if s["n"] > 0:
-            label = " / ".join(str(k) for k in key)
-            print(f"{label:<50} {s['n']:>6} {s['mean']:>10.2f} {s['median']:>10.2f} {s['std']:>10.2f}")
+    for key in sorted(data.keys()):
+        s = data[key]
+        _, lo, hi = median_ci(values[key])
+        label = " / ".join(str(k) for k in key)
+        ci = f"[{lo:.2f}, {hi:.2f}]"
+        print(f"{label:<44} {s['n']:>6} {s['mean']:>10.2f} {s['median']:>10.2f} {ci:>14} {s['std']:>10.2f}")
 
 
-def main():
-    # Load data
-    tinygrad_data = load_csv("benchmark_output/tinygrad.csv")
-    llamacpp_data = load_csv("benchmark_output/llamacpp.csv")
+def print_speedup_table(title: str, frame: Frame, keys: list[str], metric: str, baseline: str, candidate: str):
+    """Print candidate/baseline median speedup per group with CI and significance."""
+    values = grouped_values(frame, ["backend"] + keys, metric)
+    groups = sorted({key[1:] for key in values})
+
+    print(f"\n{'='*96}")
+    print(f" {title}")
+    print(f"{'='*96}")
+    print(f"{'Group':<36} {'Speedup':>9} {'95% CI':>18} {'p (MWU)':>10} {'p (perm)':>10} {'Sig':>6}")
+    print("-" * 96)
+    for group in groups:
+        base, cand = values.get((baseline, *group)), values.get((candidate, *group))
+        if base is None or cand is None:
+            continue
+        r = compare(base, cand, statistic="median")
+        label = " / ".join(group)
+        ci = f"[{r['ci_lo']:.2f}, {r['ci_hi']:.2f}]"
+        sig = "*" if r["significant"] else "n.s."
+        print(f"{label:<36} {r['speedup']:>8.2f}x {ci:>18} {r['p_mannwhitney']:>10.3g} {r['p_permutation']:>10.3g} {sig:>6}")
+
+
+def print_build_variant_table(frame: Frame, baseline: str = DEFAULT_CONFIG["build_variant"]):
+    """Rank llama.cpp build variants per host and test (pp/tg) by median tokens/sec."""
+    mask = frame.equals("backend", "llamacpp") & ~frame.equals("build_variant", MISSING)
+    if not mask.any():
+        return
+    variants = frame.filter(mask)
+    stats = grouped_stats(variants, ["hostname", "test", "build_variant"], "tokens_per_sec")
+    values = grouped_values(variants, ["hostname", "test", "build_variant"], "tokens_per_sec")
+
+    print(f"\n{'='*96}")
+    print(f" LLAMA.CPP BUILD VARIANTS by Host & Test (median tokens/sec, speedup vs {baseline})")
+    print(f"{'='*96}")
+    for host, test in sorted({key[:2] for key in stats}):
+        ranked = sorted(((key[2], s) for key, s in stats.items() if key[:2] == (host, test)),
+                        key=lambda x: x[1]["median"], reverse=True)
+        print(f"\n{host} / {test}: fastest build is {ranked[0][0]}")
+        base = values.get((host, test, baseline))
+        for variant, s in ranked:
+            vs = "" if base is None or variant == baseline else format_comparison(
+                compare(base, values[(host, test, variant)], statistic="median"))
+            print(f"  {variant:<18} {s['median']:>10.2f} tok/s (n={s['n']})  {vs}")
+
+
+def print_page_cache_table(frame: Frame):
+    """Cold vs warm page cache (prewarm.py) per host and quantization: median tok/s, spread and warm speedup."""
+    mask = frame.equals("backend", "llamacpp") & ~frame.equals("page_cache", MISSING)
+    if not mask.any():
+        return
+    runs = frame.filter(mask)
+    keys = ["hostname", "quantize", "page_cache"]
+    stats = grouped_stats(runs, keys, "tokens_per_sec")
+    values = grouped_values(runs, keys, "tokens_per_sec")
+
+    print(f"\n{'='*96}")
+    print(" LLAMA.CPP PAGE CACHE by Host & Quantization (median tokens/sec, CV, warm vs cold)")
+    print(f"{'='*96}")
+    for host, quant in sorted({key[:2] for key in stats}):
+        print(f"\n{host} / {quant}")
+        for state in ("cold", "asis", "warm"):
+            s = stats.get((host, quant, state))
+            if s is None:
+                continue
+            cv = s["std"] / s["mean"] if s["mean"] else 0.0
+            vs = ""
+            if state == "warm" and (host, quant, "cold") in values:
+                vs = format_comparison(compare(values[(host, quant, "cold")], values[(host, quant, "warm")], statistic="median"))
+            print(f"  {state:<6} {s['median']:>10.2f} tok/s  CV {cv:>6.1%} (n={s['n']})  {vs}")
+
+
+def print_shard_scaling_table(frame: Frame):
+    """tinygrad decode scaling from 1 to N shards: speedup over 1 shard and efficiency (speedup / N)."""
+    tinygrad = frame.filter(frame.equals("backend", "tinygrad"))
+    values = {}
+    for key, v in grouped_values(tinygrad, ["hostname", "quantize", "device", "shards"], "tokens_per_sec").items():
+        # runs from before the shard sweep were unsharded
+        key = (*key[:3], 1 if key[3] == MISSING else int(key[3]))
+        values[key] = np.concatenate([values[key], v]) if key in values else v
+    groups = sorted({key[:3] for key in values if key[3] > 1})
+    if not groups:
+        return
 
-    # Add backend column
-    for row in tinygrad_data:
-        row["backend"] = "tinygrad"
-    for row in llamacpp_data:
-        row["backend"] = "llamacpp"
+    print(f"\n{'='*96}")
+    print(" TINYGRAD SHARD SCALING (median tokens/sec) by Host, Quantization & Device")
+    print(f"{'='*96}")
+    print(f"{'Group':<36} {'Shards':>6} {'Tok/s':>10} {'Speedup':>9} {'95% CI':>16} {'Efficiency':>11}")
+    print("-" * 96)
+    for group in groups:
+        base = values.get((*group, 1))
+        label = " / ".join(group)
+        for shards in sorted(n for (*g, n) in values if tuple(g) == group):
+            cand = values[(*group, shards)]
+            if base is None:
+                print(f"{label:<36} {shards:>6} {np.median(cand):>10.2f} {'-':>9} {'-':>16} {'-':>11}")
+                continue
+            r = compare(base, cand, statistic="median")
+            ci = f"[{r['ci_lo']:.2f}, {r['ci_hi']:.2f}]"
+            print(f"{label:<36} {shards:>6} {np.median(cand):>10.2f} {r['speedup']:>8.2f}x {ci:>16} {r['speedup'] / shards:>10.0%}")
 
-    all_data = tinygrad_data + llamacpp_data
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare benchmark results across backends and hosts")
+    parser.add_argument("--hostname", action="append", help="Only include these hosts (results store only)")
+    parser.add_argument("--quantize", action="append", help="Only include these quantizations (results store only)")
+    parser.add_argument("--since", help="ISO date/time lower bound (results store only)")
+    parser.add_argument("--until", help="ISO date/time upper bound (results store only)")
+    args = parser.parse_args()
+    filters = {"hostname": args.hostname, "quantize": args.quantize, "since": args.since, "until": args.until}
+
+    # Load data once; the tables below are steady-state only, time to ready is reported separately.
+    # Only the build variant table splits by llama-bench test, the rest compare decode throughput.
+    all_steps = load_frame(**filters)
+    steady = steady_state(all_steps)
+    frame = decode_only(steady)
+    # the backend/host/quantization comparisons use the default config; tinygrad devices,
+    # shards and BEAM, llama.cpp build variants and page-cache states each get their own table below
+    main_frame = default_config(frame)
+    backend_counts = np.bincount(frame.categorical["backend"].codes, minlength=len(frame.categorical["backend"].categories))
 
     print("\n" + "=" * 80)
     print(" BENCHMARK DATA SUMMARY")
     print("=" * 80)
-    print(f"Total rows: {len(all_data)}")
-    print(f"  - tinygrad: {len(tinygrad_data)}")
-    print(f"  - llamacpp: {len(llamacpp_data)}")
-
-    # Get unique hosts
-    hosts = set(row.get("hostname", "unknown") for row in all_data)
-    print(f"Hosts: {', '.join(sorted(hosts))}")
-
-    # Get unique quantizations
-    quants = set(row.get("quantize", "unknown") for row in all_data)
-    print(f"Quantizations: {', '.join(sorted(quants))}")
-
-    # Main comparison: tokens/sec by backend and host
-    groups = aggregate_by_group(all_data, ["backend", "hostname"], "tokens_per_sec")
-    print_comparison_table(
-        "TOKENS/SEC by Backend & Host",
-        groups,
-        "tokens_per_sec"
-    )
+    print(f"Total rows: {frame.num_rows} steady-state decode "
+          f"({all_steps.num_rows - steady.num_rows} compile/warmup, {steady.num_rows - frame.num_rows} prompt processing excluded)")
+    for backend, count in zip(frame.categorical["backend"].categories, backend_counts):
+        print(f"  - {backend}: {count}")
 
-    # Comparison by backend, host, and quantization
-    groups = aggregate_by_group(all_data, ["backend", "hostname", "quantize"], "tokens_per_sec")
-    print_comparison_table(
-        "TOKENS/SEC by Backend, Host & Quantization",
-        groups,
-        "tokens_per_sec"
-    )
+    hosts = frame.categorical["hostname"].categories
+    print(f"Hosts: {', '.join(hosts)}")
+    print(f"Quantizations: {', '.join(frame.categorical['quantize'].categories)}")
 
-    # Memory throughput comparison
-    groups = aggregate_by_group(all_data, ["backend", "hostname"], "memory_throughput_gb_s")
-    print_comparison_table(
-        "MEMORY THROUGHPUT (GB/s) by Backend & Host",
-        groups,
-        "memory_throughput_gb_s"
-    )
+    tables = [
+        ("TOKENS/SEC by Backend & Host", ["backend", "hostname"], "tokens_per_sec"),
+        ("TOKENS/SEC by Backend, Host & Quantization", ["backend", "hostname", "quantize"], "tokens_per_sec"),
+        ("MEMORY THROUGHPUT (GB/s) by Backend & Host", ["backend", "hostname"], "memory_throughput_gb_s"),
+        ("PARAM THROUGHPUT (GB/s) by Backend & Host", ["backend", "hostname"], "param_throughput_gb_s"),
+        ("TOTAL LATENCY (ms) by Backend, Host & Quantization", ["backend", "hostname", "quantize"], "total_latency_ms"),
+    ]
+    for title, keys, metric in tables:
+        print_comparison_table(title, grouped_stats(main_frame, keys, metric), grouped_values(main_frame, keys, metric))
 
-    # Param throughput comparison
-    groups = aggregate_by_group(all_data, ["backend", "hostname"], "param_throughput_gb_s")
-    print_comparison_table(
-        "PARAM THROUGHPUT (GB/s) by Backend & Host",
-        groups,
-        "param_throughput_gb_s"
+    print_speedup_table(
+        "SPEEDUP (llamacpp vs tinygrad, median tokens/sec) by Host & Quantization",
+        main_frame, ["hostname", "quantize"], "tokens_per_sec", baseline="tinygrad", candidate="llamacpp",
     )
 
-    # Total latency comparison
-    groups = aggregate_by_group(all_data, ["backend", "hostname", "quantize"], "total_latency_ms")
-    print_comparison_table(
-        "TOTAL LATENCY (ms) by Backend, Host & Quantization",
-        groups,
-        "total_latency_ms"
-    )
+    print_time_to_ready_table(all_steps)
+    print_build_variant_table(default_config(steady, vary=("build_variant",)))
+    print_page_cache_table(default_config(frame, vary=("page_cache",)))
+    print_shard_scaling_table(default_config(frame, vary=("device", "shards")))
+
+    # tinygrad CPU backends (CLANG, LLVM, ...) side by side for each quantization
+    by_device = default_config(frame, vary=("device",))
+    tinygrad = by_device.filter(by_device.equals("backend", "tinygrad"))
+    device_keys = ["hostname", "quantize", "device"]
+    for title, metric in [
+        ("TINYGRAD TOKENS/SEC by Host, Quantization & Device", "tokens_per_sec"),
+        ("TINYGRAD PARAM THROUGHPUT (GB/s) by Host, Quantization & Device", "param_throughput_gb_s"),
+    ]:
+        print_comparison_table(title, grouped_stats(tinygrad, device_keys, metric), grouped_values(tinygrad, device_keys, metric))
 
-    # Summary: best performer per host
+    # Summary: best performer per host, from a single grouped pass
     print("\n" + "=" * 80)
     print(" SUMMARY: MEDIAN TOKENS/SEC BY HOST")
     print("=" * 80)
 
-    for host in sorted(hosts):
+    per_host = grouped_stats(main_frame, ["hostname", "backend", "quantize"], "tokens_per_sec")
+    for host in hosts:
+        results = [(backend, quant, s["median"], s["n"]) for (h, backend, quant), s in per_host.items() if h == host]
+        if not results:
+            continue
         print(f"\n{host}:")
-        host_data = [r for r in all_data if r.get("hostname") == host]
-        backend_groups = aggregate_by_group(host_data, ["backend", "quantize"], "tokens_per_sec")
-
-        results = []
-        for (backend, quant), values in backend_groups.items():
-            s = stats(values)
-            if s["n"] > 0:
-                results.append((backend, quant, s["median"], s["n"]))
-
         results.sort(key=lambda x: x[2], reverse=True)
         for backend, quant, med, n in results:
             print(f"  {backend:10} {quant:10} -> {med:>8.2f} tok/s (n={n})")
@@ -0,0 +1,173 @@
+"""
+Per-commit source checkouts and cached llama.cpp builds.
+
+Each commit of a dependency is checked out once as a detached git worktree
+under build_cache/src/, and each (commit, variant) llama.cpp build gets its own
+build directory under build_cache/llama.cpp/. A build.json stamp records the
+CMake flags, and a build is reused as long as the stamp and binaries exist.
+
+Usage:
+    python build_cache.py build                       # build deps/llama.cpp HEAD
+    python build_cache.py build --commit b4567 --target llama-bench
+    python build_cache.py build --variant avx2        # predefined flags from BUILD_VARIANTS
+    python build_cache.py list
+"""
+import os
+import json
+import time
+import shutil
+import pathlib
+import argparse
+import subprocess
+from typing import Dict, List, Optional, Sequence, Set
+
+BUILD_ROOT = pathlib.Path("build_cache")
+LLAMACPP_REPO = pathlib.Path("deps/llama.cpp")
+TINYGRAD_REPO = pathlib.Path("deps/tinygrad")
+DEFAULT_TARGETS = ("llama-bench", "llama-server")
+
+# Named llama.cpp build variants (CMake flags) for the build-matrix benchmark
+BUILD_VARIANTS = {
+    "generic": ["-DGGML_NATIVE=OFF"],
+    "native": ["-DGGML_NATIVE=ON"],
+    "native-noomp": ["-DGGML_NATIVE=ON", "-DGGML_OPENMP=OFF"],
+    "native-openblas": ["-DGGML_NATIVE=ON", "-DGGML_BLAS=ON", "-DGGML_BLAS_VENDOR=OpenBLAS"],
+    "avx2": ["-DGGML_NATIVE=OFF", "-DGGML_AVX=ON", "-DGGML_AVX2=ON", "-DGGML_FMA=ON", "-DGGML_F16C=ON",
+             "-DGGML_AVX512=OFF"],
+    "avx512": ["-DGGML_NATIVE=OFF", "-DGGML_AVX=ON", "-DGGML_AVX2=ON", "-DGGML_FMA=ON", "-DGGML_F16C=ON",
+               "-DGGML_AVX512=ON"],
+}
+# CPU flags a variant's binaries need at runtime; variants are skipped on hosts without them
+VARIANT_CPU_FLAGS = {
+    "avx2": {"avx", "avx2", "fma", "f16c"},
+    "avx512": {"avx", "avx2", "fma", "f16c", "avx512f"},
+}
+
+
+def git(repo: pathlib.Path, *args: str) -> str:
+    return subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True, text=True).stdout.strip()
+
+
+def resolve(repo: pathlib.Path, rev: str = "HEAD") -> str:
+    """Full commit hash for a rev (tag, branch, short hash)."""
+    return git(repo, "rev-parse", "--verify", f"{rev}^{{commit}}")
+
+
+def describe(repo: pathlib.Path, commit: str) -> str:
+    return git(repo, "log", "-1", "--format=%h %s", commit)
+
+
+def commits_between(repo: pathlib.Path, good: str, bad: str) -> List[str]:
+    """First-parent commits after good up to and including bad, oldest first."""
+    out = git(repo, "rev-list", "--first-parent", "--reverse", f"{resolve(repo, good)}..{resolve(repo, bad)}")
+    return out.split() if out else []
+
+
+def checkout(repo: pathlib.Path, commit: str) -> pathlib.Path:
+    """Return a worktree of repo at commit, creating it on first use.
+
+    HEAD of the submodule itself is used in place, so builds of the current
+    checkout share the cache with builds made through a worktree.
+    """
+    commit = resolve(repo, commit)
+    if commit == resolve(repo):
+        return repo
+    path = BUILD_ROOT / "src" / repo.name / commit[:12]
+    if not (path / ".git").exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        git(repo, "worktree", "prune")
+        git(repo, "worktree", "add", "--detach", "--force", str(path.resolve()), commit)
+    return path
+
+
+def cpu_flags() -> Set[str]:
+    """CPU feature flags from /proc/cpuinfo (empty where it is unavailable)."""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key.strip() in ("flags", "Features"):
+                    return set(value.split())
+    except OSError:
+        pass
+    return set()
+
+
+def supported_variants(names: Optional[Sequence[str]] = None) -> List[str]:
+    """Variants (default: all) whose binaries can run on this host's CPU."""
+    flags = cpu_flags()
+    return [name for name in (names or BUILD_VARIANTS) if VARIANT_CPU_FLAGS.get(name, set()) <= flags]
+
+
+def build_dir(commit: str, variant: str = "default") -> pathlib.Path:
+    return BUILD_ROOT / "llama.cpp" / f"{commit[:12]}-{variant}"
+
+
+def build_llamacpp(commit: Optional[str] = None, variant: str = "default", cmake_flags: Sequence[str] = (),
+                   targets: Sequence[str] = DEFAULT_TARGETS, jobs: Optional[int] = None,
+                   force: bool = False) -> pathlib.Path:
+    """Build llama.cpp at commit (default: the submodule's HEAD) and return its bin/ directory.
+
+    Builds are cached per (commit, variant); a cached build is reused when it was
+    configured with the same flags and all requested targets exist.
+    """
+    commit = resolve(LLAMACPP_REPO, commit or "HEAD")
+    out = build_dir(commit, variant)
+    bin_dir = out / "bin"
+    stamp_path = out / "build.json"
+    flags = ["-DCMAKE_BUILD_TYPE=Release", *cmake_flags]
+
+    if not force and stamp_path.exists():
+        stamp = json.loads(stamp_path.read_text())
+        if stamp["cmake_flags"] == flags and all((bin_dir / t).exists() for t in targets):
+            return bin_dir
+
+    source = checkout(LLAMACPP_REPO, commit)
+    if force and out.exists():
+        shutil.rmtree(out)
+    jobs = jobs or os.cpu_count() or 1
+    print(f"Building llama.cpp {commit[:12]} ({variant}): {' '.join(flags)}")
+    start = time.perf_counter()
+    subprocess.run(["cmake", "-S", str(source), "-B", str(out), *flags], check=True)
+    subprocess.run(["cmake", "--build", str(out), "--config", "Release", "-j", str(jobs), "--target", *targets], check=True)
+    stamp = {
+        "commit": commit,
+        "variant": variant,
+        "cmake_flags": flags,
+        "targets": list(targets),
+        "built_at": time.time(),
+        "build_s": time.perf_counter() - start,
+    }
+    stamp_path.write_text(json.dumps(stamp, indent=2))
+    return bin_dir
+
+
+def cached_builds() -> List[Dict]:
+    return [json.loads(p.read_text()) for p in sorted((BUILD_ROOT / "llama.cpp").glob("*/build.json"))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cached per-commit llama.cpp builds")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="Build (or reuse) llama.cpp at a commit")
+    p.add_argument("--commit", help="llama.cpp commit (default: deps/llama.cpp HEAD)")
+    p.add_argument("--variant", default="default",
+                   help=f"Name for this set of CMake flags; predefined: {', '.join(BUILD_VARIANTS)}")
+    p.add_argument("--flag", action="append", default=[], help="Extra CMake flag, e.g. -DGGML_NATIVE=OFF")
+    p.add_argument("--target", action="append", help=f"Build target (default: {', '.join(DEFAULT_TARGETS)})")
+    p.add_argument("--jobs", type=int, help="Parallel build jobs (default: all cores)")
+    p.add_argument("--force", action="store_true", help="Rebuild even if cached")
+    sub.add_parser("list", help="List cached builds")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        flags = BUILD_VARIANTS.get(args.variant, []) + args.flag
+        bin_dir = build_llamacpp(args.commit, args.variant, flags, args.target or DEFAULT_TARGETS, args.jobs, args.force)
+        print(bin_dir)
+    else:
+        for stamp in cached_builds():
+            print(f"{stamp['commit'][:12]}  {stamp['variant']:<16} {stamp['build_s']:>7.1f}s  {' '.join(stamp['cmake_flags'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Incremental, parallel collation of raw benchmark logs into a single CSV.
+
+Shared by tinygrad_collate.py and llamacpp_collate.py. A manifest next to the
+collated CSV records every ingested log by path, size, mtime and content hash,
+so each run only parses logs that are new or whose content changed. When the
+CSV is missing, the manifest unreadable or the parser's fields changed, every
+log is parsed again and the CSV and store rows are rebuilt. New logs
+are parsed in-process across a process pool; their rows are appended to the
+collated CSV and to the results store.
+"""
+import os
+import csv
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from results_store import ResultsStore
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _parse_and_hash(parse_file: Callable[[str], List[Dict]], path: str) -> Tuple[str, str, List[Dict]]:
+    """Worker: parse one log and hash it. Runs in a pool process."""
+    return path, file_sha256(path), parse_file(path)
+
+
+def load_manifest(path: str) -> Optional[Dict[str, Dict]]:
+    """The manifest at path, or None if it is missing or unreadable."""
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def save_manifest(manifest: Dict[str, Dict], path: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def find_pending(files: List[str], manifest: Dict[str, Dict]) -> Tuple[List[str], List[str]]:
+    """Split files into (new, changed) relative to the manifest.
+
+    Files whose size and mtime match the manifest are skipped without reading
+    them. If only the stat changed but the content hash is the same, the
+    manifest entry is refreshed and the file is skipped.
+    """
+    new, changed = [], []
+    for path in files:
+        st = os.stat(path)
+        entry = manifest.get(path)
+        if entry is None:
+            new.append(path)
+        elif entry["size"] != st.st_size or entry["mtime"] != st.st_mtime:
+            if file_sha256(path) == entry["sha256"]:
+                entry["size"], entry["mtime"] = st.st_size, st.st_mtime
+            else:
+                changed.append(path)
+    return new, changed
+
+
+def _write_rows(writer: csv.DictWriter, rows: List[Dict], fieldnames: List[str]):
+    for row in rows:
+        writer.writerow({field: "" if row.get(field) is None else row.get(field) for field in fieldnames})
+
+
+def _read_header(path: str) -> Optional[List[str]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", newline="") as f:
+        return next(csv.reader(f), None)
+
+
+def collate(files: List[str], parse_file: Callable[[str], List[Dict]], fieldnames: List[str],
+            output_path: str, backend: str, manifest_path: Optional[str] = None,
+            workers: Optional[int] = None) -> Dict[str, int]:
+    """Parse new or changed logs and merge their rows into output_path.
+
+    Returns counts of new, changed and skipped files and rows written.
+    """
+    manifest_path = manifest_path or os.path.join(os.path.dirname(output_path), f".{backend}_manifest.json")
+    # Without both the collated CSV and a readable manifest there is no record
+    # of what the CSV holds, so rebuild it from scratch. The same goes for a
+    # header that differs from fieldnames: the parser gained (or lost) columns,
+    # and only re-parsing every log fills them in for the old rows.
+    current = os.path.exists(output_path) and _read_header(output_path) == fieldnames
+    manifest = load_manifest(manifest_path) if current else None
+    rebuild = manifest is None
+    manifest = manifest or {}
+    new, changed = find_pending(files, manifest)
+    pending = new + changed
+    counts = {"new": len(new), "changed": len(changed), "skipped": len(files) - len(pending), "rows": 0}
+    if not pending:
+        save_manifest(manifest, manifest_path)
+        return counts
+
+    parsed: Dict[str, Tuple[str, List[Dict]]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, sha256, rows in pool.map(_parse_and_hash, [parse_file] * len(pending), pending, chunksize=8):
+            parsed[path] = (sha256, rows)
+
+    # A changed log replaces the rows it contributed before, which means
+    # rewriting the collated CSV. Otherwise new rows are simply appended.
+    stale_uuids = set()
+    for path in changed:
+        stale_uuids.update(manifest[path].get("uuids", []))
+    rewrite = rebuild or bool(stale_uuids)
+
+    if rewrite:
+        kept = []
+        if not rebuild and os.path.exists(output_path):
+            with open(output_path, "r", newline="") as f:
+                kept = [row for row in csv.DictReader(f) if row.get("uuid") not in stale_uuids]
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            _write_rows(writer, kept, fieldnames)
+            for path in pending:
+                _write_rows(writer, parsed[path][1], fieldnames)
+        os.replace(tmp_path, output_path)
+    else:
+        with open(output_path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+            for path in pending:
+                _write_rows(writer, parsed[path][1], fieldnames)
+
+    # The store skips runs it already has, so drop the stale versions first.
+    # On a rebuild every parsed run may be stale.
+    replaced = set(stale_uuids)
+    if rebuild:
+        replaced.update(str(r["uuid"]) for path in pending for r in parsed[path][1] if r.get("uuid"))
+    with ResultsStore() as store:
+        for run_uuid in replaced:
+            store.delete_run(run_uuid)
+        for path in pending:
+            store.ingest(parsed[path][1], backend, source=os.path.basename(path), created_at=os.path.getmtime(path))
+
+    for path in pending:
+        sha256, rows = parsed[path]
+        st = os.stat(path)
+        manifest[path] = {
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "sha256": sha256,
+            "rows": len(rows),
+            "uuids": sorted({str(r.get("uuid")) for r in rows if r.get("uuid")}),
+        }
+        counts["rows"] += len(rows)
+    save_manifest(manifest, manifest_path)
+    return counts
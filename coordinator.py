@@ -0,0 +1,249 @@
+"""
+Central coordinator for benchmark sweeps across hosts.
+
+The coordinator holds the sweep matrix (every config of each runner's SVARS)
+as jobs, and worker_agent.py processes on each host pull them over HTTP. A
+worker announces its capabilities (RAM, device type, backends) when claiming,
+and is only handed jobs it can run. Among those it gets the largest, so big
+hosts take the big models and the small ones stay free for phones. A claimed
+job is leased: workers heartbeat while running it, and jobs whose lease
+expires go back to the queue. Results are posted back as parsed rows and
+ingested into the central results store.
+
+Job state is kept in benchmark_output/coordinator_state.json, so a restarted
+coordinator continues the same sweep.
+
+Endpoints:
+    POST /claim                 worker capabilities -> {"job": ...} or {"job": null, "done": bool}
+                                (done: nothing this worker could run is left)
+    POST /heartbeat/<job_id>    {"worker_id": ...} extends the lease
+    POST /results/<job_id>      {"worker_id": ..., "rows": [...], "source": ..., "error": ...}
+                                (both 409 unless worker_id still holds the job's lease)
+    GET  /status                job counts and workers
+
+Usage:
+    python coordinator.py --port 8700
+    python coordinator.py --port 8700 --backend llamacpp --reset
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from itertools import product
+from typing import Any, Dict, List
+
+from bottle import Bottle, request, response, abort
+
+from results_store import ResultsStore, DEFAULT_PATH
+
+STATE_PATH = "benchmark_output/coordinator_state.json"
+LEASE_S = 300
+MAX_ATTEMPTS = 3
+BACKENDS = ("llamacpp", "tinygrad")
+
+# Parameters per model size and bytes per parameter per quantization, for RAM requirements
+MODEL_PARAMS = {"1B": 1.24e9, "8B": 8.03e9, "70B": 70.6e9, "405B": 405.9e9}
+QUANT_BYTES = {
+    "llamacpp": {"default": 0.82, "int8": 1.06, "nf4": 0.60, "float16": 2.0},
+    "tinygrad": {"default": 2.0, "int8": 1.0, "nf4": 0.56, "float16": 2.0},
+}
+# weights plus KV cache, activations and the runtime itself
+RAM_OVERHEAD = 1.3
+RAM_FLOOR_GB = 1.0
+# tinygrad devices need a desktop toolchain (clang/LLVM), so they are not scheduled on phones
+DEVICE_TYPES = {
+    "llamacpp": ["linux", "mac", "pixel"],
+    "tinygrad": ["linux", "mac"],
+}
+
+app = Bottle()
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"jobs": [], "workers": {}}
+_store_path = DEFAULT_PATH
+
+
+def sweep_configs(backend: str) -> List[List]:
+    """The runner's own sweep matrix (its SVARS), as JSON-friendly lists of (flag, value) pairs."""
+    if backend == "llamacpp":
+        from llamacpp_benchmark import SVARS
+    else:
+        from tinygrad_benchmark import SVARS
+    return [[list(tup) for tup in config] for config in product(*SVARS)]
+
+
+def requirements(backend: str, config: List) -> Dict[str, Any]:
+    flags = dict(tuple(tup) for tup in config if tup)
+    size, quant = flags.get("--size", "1B"), flags.get("--quantize", "default")
+    shards = int(flags.get("--shard", 1))
+    weights_gb = MODEL_PARAMS.get(size, MODEL_PARAMS["1B"]) * QUANT_BYTES[backend].get(quant, 2.0) / 1e9
+    return {
+        "min_ram_gb": max(RAM_FLOOR_GB, round(weights_gb * RAM_OVERHEAD, 1)),
+        "min_cpus": shards,
+        "device_types": DEVICE_TYPES[backend],
+    }
+
+
+def build_jobs(backends) -> List[Dict[str, Any]]:
+    jobs = []
+    for backend in backends:
+        for config in sweep_configs(backend):
+            jobs.append({
+                "id": f"{backend}-{len(jobs)}",
+                "backend": backend,
+                "config": config,
+                "requires": requirements(backend, config),
+                "state": "pending",
+                "attempts": 0,
+                "worker": None,
+                "lease_expires": None,
+                "error": None,
+            })
+    return jobs
+
+
+def save_state(path: str = STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(_state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def fits(job: Dict, caps: Dict) -> bool:
+    req = job["requires"]
+    return (job["backend"] in caps.get("backends", BACKENDS)
+            and caps.get("ram_gb", 0) >= req["min_ram_gb"]
+            and caps.get("cpu_count", 1) >= req["min_cpus"]
+            and caps.get("device_type") in req["device_types"])
+
+
+def _expire_leases(now: float):
+    for job in _state["jobs"]:
+        if job["state"] == "running" and job["lease_expires"] < now:
+            print(f"Lease expired for {job['id']} on {job['worker']}, requeueing")
+            job["state"] = "pending" if job["attempts"] < MAX_ATTEMPTS else "failed"
+            job["worker"] = None
+
+
+def _job(job_id: str) -> Dict:
+    for job in _state["jobs"]:
+        if job["id"] == job_id:
+            return job
+    abort(404, f"unknown job {job_id}")
+
+
+def _leased_job(job_id: str, worker_id: str) -> Dict:
+    """The job, if worker_id still holds its lease; stale workers (expired or requeued) get 409."""
+    _expire_leases(time.time())
+    job = _job(job_id)
+    if job["state"] != "running" or job["worker"] != worker_id:
+        abort(409, f"{worker_id} does not hold the lease on {job_id}")
+    return job
+
+
+def _worker_id(payload: Dict) -> str:
+    return payload.get("worker_id") or request.remote_addr
+
+
+@app.route("/claim", method="POST")
+def claim():
+    caps = request.json or {}
+    worker_id = caps.get("worker_id") or request.remote_addr
+    now = time.time()
+    response.content_type = "application/json"
+    with _lock:
+        _state["workers"][worker_id] = {**caps, "last_seen": now}
+        _expire_leases(now)
+        candidates = [j for j in _state["jobs"] if j["state"] == "pending" and fits(j, caps)]
+        if not candidates:
+            # done for this worker once nothing it could run is left (running jobs may still be requeued)
+            unfinished = any(j["state"] in ("pending", "running") and fits(j, caps) for j in _state["jobs"])
+            return json.dumps({"job": None, "done": not unfinished})
+        # best fit: the most demanding job this worker can take
+        job = max(candidates, key=lambda j: (j["requires"]["min_ram_gb"], j["requires"]["min_cpus"]))
+        job.update(state="running", worker=worker_id, lease_expires=now + LEASE_S, attempts=job["attempts"] + 1)
+        save_state()
+        print(f"{job['id']} -> {worker_id} ({caps.get('device_type')}, {caps.get('ram_gb')} GB)")
+        return json.dumps({"job": job, "lease_s": LEASE_S})
+
+
+@app.route("/heartbeat/<job_id>", method="POST")
+def heartbeat(job_id: str):
+    worker_id = _worker_id(request.json or {})
+    with _lock:
+        job = _leased_job(job_id, worker_id)
+        job["lease_expires"] = time.time() + LEASE_S
+    return {"ok": True}
+
+
+@app.route("/results/<job_id>", method="POST")
+def results(job_id: str):
+    payload = request.json or {}
+    rows = payload.get("rows", [])
+    worker_id = _worker_id(payload)
+    with _lock:
+        backend = _leased_job(job_id, worker_id)["backend"]
+    written = 0
+    if rows:
+        with ResultsStore(_store_path) as store:
+            written = store.ingest(rows, backend, source=payload.get("source", job_id))
+    with _lock:
+        # the lease may have expired while the rows were being stored; they are kept either way
+        job = _job(job_id)
+        if payload.get("error") or not rows:
+            job["error"] = payload.get("error") or "no rows"
+            job["state"] = "pending" if job["attempts"] < MAX_ATTEMPTS else "failed"
+        else:
+            job["state"] = "done"
+            job["error"] = None
+        job["lease_expires"] = None
+        save_state()
+        print(f"{job_id} {job['state']}: {written} rows from {job['worker']}" + (f" ({job['error']})" if job["error"] else ""))
+    return {"ok": True, "rows_written": written, "state": job["state"]}
+
+
+@app.route("/status", method="GET")
+def status():
+    with _lock:
+        counts: Dict[str, int] = {}
+        for job in _state["jobs"]:
+            counts[job["state"]] = counts.get(job["state"], 0) + 1
+        return {"jobs": counts, "workers": _state["workers"],
+                "running": {j["id"]: j["worker"] for j in _state["jobs"] if j["state"] == "running"}}
+
+
+def load_or_build(backends, reset: bool = False, path: str = STATE_PATH):
+    global _state
+    if os.path.exists(path) and not reset:
+        with open(path, "r") as f:
+            _state = json.load(f)
+        # jobs that were running when the coordinator stopped are requeued
+        for job in _state["jobs"]:
+            if job["state"] == "running":
+                job["state"] = "pending"
+                job["worker"] = None
+    else:
+        _state = {"jobs": build_jobs(backends), "workers": {}}
+    save_state(path)
+
+
+def main():
+    global _store_path
+    parser = argparse.ArgumentParser(description="Coordinate a benchmark sweep across worker_agent.py hosts")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--backend", action="append", choices=BACKENDS, help="Runners whose sweep to distribute (default: all)")
+    parser.add_argument("--store", default=DEFAULT_PATH, help=f"Central results store (default: {DEFAULT_PATH})")
+    parser.add_argument("--reset", action="store_true", help=f"Rebuild the job list instead of resuming {STATE_PATH}")
+    args = parser.parse_args()
+
+    _store_path = args.store
+    load_or_build(args.backend or BACKENDS, args.reset)
+    pending = sum(1 for j in _state["jobs"] if j["state"] == "pending")
+    print(f"{len(_state['jobs'])} jobs, {pending} pending")
+    app.run(host=args.host, port=args.port, quiet=True)
+
+
+if __name__ == "__main__":
+    main()
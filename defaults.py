@@ -1,6 +1,9 @@
+import json
 import pathlib
 
 MODEL_DIR = pathlib.Path("./models/")
+# Model size the MODEL_CONFIGS URLs download; other sizes need their GGUFs in models/ already
+MODEL_URL_SIZE = "1B"
 
 # Maps quantization key to (URL, filename suffix)
 # The suffix is used to construct the local filename
@@ -23,5 +26,11 @@ MODEL_CONFIGS = {
     },
 }
 
+# Quantizations derived locally from another config (model_manager.py provision)
+# override or extend the downloaded ones: {"nf4": {"suffix": "Q4_K_M", "source": "float16"}}
+PROVISIONED_PATH = MODEL_DIR / "provisioned.json"
+if PROVISIONED_PATH.exists():
+    MODEL_CONFIGS.update(json.loads(PROVISIONED_PATH.read_text()))
+
 # Backwards compatibility
-MODEL_URLS = {k: v["url"] for k, v in MODEL_CONFIGS.items()}
\ No newline at end of file
+MODEL_URLS = {k: v["url"] for k, v in MODEL_CONFIGS.items() if "url" in v}
\ No newline at end of file
@@ -4,24 +4,14 @@ Creates plots that were listed in the TODO section.
 
 Usage: python generate_additional_plots.py
 """
-import csv
 import os
 from collections import defaultdict
 from typing import Dict, List
 import matplotlib.pyplot as plt
 import numpy as np
 
-
-def load_csv(filepath: str) -> List[Dict]:
-    """Load benchmark results from CSV file."""
-    results = []
-    if not os.path.exists(filepath):
-        return results
-    with open(filepath, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            results.append(row)
-    return results
+from analysis_engine import is_default_config
+from results_store import load_results
 
 
 def plot_latency_distribution(tinygrad_data: List[Dict], llamacpp_data: List[Dict], output_dir: str = "plots"):
@@ -32,7 +22,7 @@ def plot_latency_distribution(tinygrad_data: List[Dict], llamacpp_data: List[Dic
     data_by_quant = defaultdict(lambda: {'tinygrad': [], 'llama.cpp': []})
 
     for row in tinygrad_data:
-        if row.get('step') == '0':
+        if row.get('step') == '0' or row.get('phase') in ('compile', 'warmup'):
             continue
         quant = row.get('quantize', 'unknown')
         try:
@@ -43,7 +33,7 @@ def plot_latency_distribution(tinygrad_data: List[Dict], llamacpp_data: List[Dic
             pass
 
     for row in llamacpp_data:
-        if row.get('step') == '0':
+        if row.get('step') == '0' or row.get('phase') in ('compile', 'warmup'):
             continue
         quant = row.get('quantize', 'unknown')
         try:
@@ -98,7 +88,7 @@ def plot_memory_throughput(tinygrad_data: List[Dict], llamacpp_data: List[Dict],
     def compute_avg_memory_throughput(data):
         grouped = defaultdict(list)
         for row in data:
-            if row.get('step') == '0':
+            if row.get('step') == '0' or row.get('phase') in ('compile', 'warmup'):
                 continue
             quant = row.get('quantize', 'unknown')
             try:
@@ -152,7 +142,7 @@ def plot_device_comparison(tinygrad_data: List[Dict], llamacpp_data: List[Dict],
     def group_by_device(data, backend_name):
         grouped = defaultdict(lambda: defaultdict(list))
         for row in data:
-            if row.get('step') == '0':
+            if row.get('step') == '0' or row.get('phase') in ('compile', 'warmup'):
                 continue
             hostname = row.get('hostname', 'unknown')
             quant = row.get('quantize', 'unknown')
@@ -224,7 +214,7 @@ def plot_param_throughput(tinygrad_data: List[Dict], llamacpp_data: List[Dict],
     def compute_avg_param_throughput(data):
         grouped = defaultdict(list)
         for row in data:
-            if row.get('step') == '0':
+            if row.get('step') == '0' or row.get('phase') in ('compile', 'warmup'):
                 continue
             quant = row.get('quantize', 'unknown')
             try:
@@ -272,8 +262,9 @@ def plot_param_throughput(tinygrad_data: List[Dict], llamacpp_data: List[Dict],
 
 def main():
     # Load data
-    tinygrad_results = load_csv('benchmark_output/tinygrad.csv')
-    llamacpp_results = load_csv('benchmark_output/llamacpp.csv')
+    # only default-config runs; device/shard/BEAM/build-variant/cold-cache sweeps have their own tables
+    tinygrad_results = [row for row in load_results('tinygrad') if is_default_config(row)]
+    llamacpp_results = [row for row in load_results('llamacpp') if is_default_config(row)]
 
     if not tinygrad_results and not llamacpp_results:
         print("No benchmark results found.")
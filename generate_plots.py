@@ -4,32 +4,29 @@ Creates PNG images that can be embedded in presentation slides.
 
 Usage: python generate_plots.py
 """
-import csv
 import os
 from collections import defaultdict
 from typing import Dict, List
 import matplotlib.pyplot as plt
 import numpy as np
 
-
-def load_csv(filepath: str) -> List[Dict]:
-    """Load benchmark results from CSV file."""
-    results = []
-    if not os.path.exists(filepath):
-        return results
-    with open(filepath, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            results.append(row)
-    return results
+from analysis_engine import is_default_config
+from bench_stats import compare
+from results_store import load_results
 
 
 def compute_averages(results: List[Dict], group_by: str = 'quantize') -> Dict:
     """Compute average tokens_per_sec grouped by quantization method."""
     grouped = defaultdict(list)
     for row in results:
-        # Skip summary rows (step == 0 for llamacpp)
-        if row.get('step') == '0':
+        # Skip summary rows (step == 0 for llamacpp) and tinygrad compile/warmup steps
+        if str(row.get('step')) == '0' or row.get('phase') in ('compile', 'warmup'):
+            continue
+        # llama-bench prompt processing (pp512) is not decode throughput
+        if str(row.get('test') or '').startswith('pp'):
+            continue
+        # device/shard/BEAM/build-variant/cold-cache sweeps are not comparable across backends
+        if not is_default_config(row):
             continue
         quant = row.get(group_by, 'unknown')
         try:
@@ -47,6 +44,7 @@ def compute_averages(results: List[Dict], group_by: str = 'quantize') -> Dict:
                 'min': min(values),
                 'max': max(values),
                 'count': len(values),
+                'values': values,
             }
     return averages
 
@@ -123,17 +121,21 @@ def plot_speedup_comparison(backends_data: Dict[str, Dict], output_dir: str = "p
         if backend_name == 'tinygrad':
             continue
 
-        speedups = []
+        # Speedup of means with a 95% bootstrap CI; '*' marks significant differences
+        speedups, err_lo, err_hi, marks = [], [], [], []
         for quant in all_quants:
-            t_val = tinygrad_data[quant]['mean']
-            b_val = backend_data.get(quant, {'mean': 0})['mean']
-            speedup = b_val / t_val if t_val > 0 else 0
-            speedups.append(speedup)
+            r = compare(tinygrad_data[quant]['values'], backend_data[quant]['values'])
+            speedups.append(r['speedup'])
+            err_lo.append(max(r['speedup'] - r['ci_lo'], 0))
+            err_hi.append(max(r['ci_hi'] - r['speedup'], 0))
+            marks.append('*' if r['significant'] else 'n.s.')
 
         offset = (i - 0.5) * width
         color = colors.get(backend_name, '#95a5a6')
-        ax.bar(x + offset, speedups, width, label=f'{backend_name} vs tinygrad',
-               color=color, alpha=0.8)
+        ax.bar(x + offset, speedups, width, yerr=[err_lo, err_hi], capsize=4,
+               label=f'{backend_name} vs tinygrad (95% CI)', color=color, alpha=0.8)
+        for xi, speedup, hi, mark in zip(x + offset, speedups, err_hi, marks):
+            ax.annotate(mark, (xi, speedup + hi), ha='center', va='bottom', fontsize=10)
         i += 1
 
     ax.axhline(y=1.0, color='red', linestyle='--', linewidth=2, alpha=0.5, label='Baseline (tinygrad)')
@@ -237,22 +239,107 @@ def plot_quantization_impact(backends_data: Dict[str, Dict], output_dir: str = "
     plt.close()
 
 
+def plot_time_to_ready(backends_results: Dict[str, List[Dict]], output_dir: str = "plots"):
+    """Generate bar chart of per-run time to steady state (compile + warmup), separate from steady throughput."""
+    # time_to_ready_ms is repeated on every step of a run, so take it once per run uuid
+    per_backend = {}
+    for backend_name, results in backends_results.items():
+        runs = {}
+        for row in results:
+            try:
+                runs.setdefault((row.get('uuid'), row.get('quantize') or 'unknown'), float(row['time_to_ready_ms']))
+            except (KeyError, ValueError, TypeError):
+                continue
+        grouped = defaultdict(list)
+        for (_, quant), value in runs.items():
+            grouped[quant].append(value / 1000)
+        if grouped:
+            per_backend[backend_name] = grouped
+    if not per_backend:
+        return
+    os.makedirs(output_dir, exist_ok=True)
+
+    all_quants = sorted({q for grouped in per_backend.values() for q in grouped})
+    x = np.arange(len(all_quants))
+    width = 0.8 / len(per_backend)
+    colors = {'tinygrad': '#2ecc71', 'llama.cpp': '#3498db', 'mlc_llm': '#e74c3c'}
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    for i, (backend_name, grouped) in enumerate(per_backend.items()):
+        medians = [np.median(grouped[q]) if q in grouped else 0 for q in all_quants]
+        offset = (i - len(per_backend) / 2 + 0.5) * width
+        ax.bar(x + offset, medians, width, label=backend_name, color=colors.get(backend_name, '#95a5a6'), alpha=0.8)
+
+    ax.set_xlabel('Quantization Method', fontsize=12)
+    ax.set_ylabel('Time to Ready (s, median per run)', fontsize=12)
+    ax.set_title('Compile + JIT Warmup Before Steady-State Decode', fontsize=14, fontweight='bold')
+    ax.set_xticks(x)
+    ax.set_xticklabels(all_quants)
+    ax.legend()
+    ax.grid(axis='y', alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(f'{output_dir}/time_to_ready.png', dpi=300, bbox_inches='tight')
+    print(f"Saved: {output_dir}/time_to_ready.png")
+    plt.close()
+
+
+def plot_device_comparison(results: List[Dict], output_dir: str = "plots"):
+    """Generate grouped bars of tinygrad tokens/sec and param GB/s per device for each quantization."""
+    metrics = [('tokens_per_sec', 'Tokens per Second'), ('param_throughput_gb_s', 'Param Throughput (GB/s)')]
+    grouped = defaultdict(lambda: defaultdict(list))
+    for row in results:
+        for metric, _ in metrics:
+            try:
+                value = float(row.get(metric) or 0)
+            except (ValueError, TypeError):
+                continue
+            if value > 0:
+                grouped[metric][(row.get('quantize') or 'unknown', row.get('device') or 'unknown')].append(value)
+
+    devices = sorted({device for values in grouped.values() for _, device in values})
+    if len(devices) < 2:
+        return
+    quants = sorted({quant for values in grouped.values() for quant, _ in values})
+    os.makedirs(output_dir, exist_ok=True)
+
+    fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+    x = np.arange(len(quants))
+    width = 0.8 / len(devices)
+    for ax, (metric, label) in zip(axes, metrics):
+        for i, device in enumerate(devices):
+            means = [np.mean(grouped[metric].get((q, device), [0])) for q in quants]
+            ax.bar(x + (i - len(devices) / 2 + 0.5) * width, means, width, label=device, alpha=0.8)
+        ax.set_xlabel('Quantization Method', fontsize=12)
+        ax.set_ylabel(label, fontsize=12)
+        ax.set_xticks(x)
+        ax.set_xticklabels(quants)
+        ax.grid(axis='y', alpha=0.3)
+    axes[0].legend(title='tinygrad device')
+    fig.suptitle('tinygrad Device / Compiler Comparison', fontsize=14, fontweight='bold')
+
+    plt.tight_layout()
+    plt.savefig(f'{output_dir}/device_comparison.png', dpi=300, bbox_inches='tight')
+    print(f"Saved: {output_dir}/device_comparison.png")
+    plt.close()
+
+
 def main():
     # Load data from all backends
     backends_data = {}
 
     # Load tinygrad results
-    tinygrad_results = load_csv('benchmark_output/tinygrad.csv')
+    tinygrad_results = load_results('tinygrad')
     if tinygrad_results:
         backends_data['tinygrad'] = compute_averages(tinygrad_results)
 
     # Load llama.cpp results
-    llamacpp_results = load_csv('benchmark_output/llamacpp.csv')
+    llamacpp_results = load_results('llamacpp')
     if llamacpp_results:
         backends_data['llama.cpp'] = compute_averages(llamacpp_results)
 
     # Load MLC LLM results
-    mlc_results = load_csv('benchmark_output/mlc_llm.csv')
+    mlc_results = load_results('mlc_llm')
     if mlc_results:
         backends_data['mlc_llm'] = compute_averages(mlc_results)
 
@@ -280,6 +367,9 @@ def main():
     plot_speedup_comparison(backends_data, output_dir)
     plot_summary_stats(backends_data, output_dir)
     plot_quantization_impact(backends_data, output_dir)
+    if tinygrad_results:
+        plot_time_to_ready({'tinygrad': [row for row in tinygrad_results if is_default_config(row)]}, output_dir)
+        plot_device_comparison([row for row in tinygrad_results if is_default_config(row, vary=('device',))], output_dir)
 
     print("\n" + "=" * 80)
     print("DONE! All plots saved to 'plots/' directory")
@@ -289,6 +379,8 @@ def main():
     print("  - plots/speedup_comparison.png")
     print("  - plots/summary_stats.png")
     print("  - plots/quantization_impact.png")
+    print("  - plots/time_to_ready.png")
+    print("  - plots/device_comparison.png (when tinygrad ran on more than one device)")
     print("\nYou can now use these images in your presentation slides!")
 
 
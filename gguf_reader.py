@@ -0,0 +1,261 @@
+"""
+Memory-mapped GGUF reader for exact model byte counts.
+
+Only the header, KV metadata and tensor table are parsed; tensor data is never
+read, so only the first pages of the mapping are touched. From the tensor table
+we get the exact stored size of every tensor, and from that the bytes a single
+decoded token reads per ggml tensor type: every weight matrix once, but only one
+row of token_embd (unless the output projection is tied to it).
+
+Results are cached in models/.gguf_info.json, keyed by the file's SHA256; the
+hash itself is only recomputed when a file's size or mtime changes.
+
+Usage:
+    python gguf_reader.py models/Llama-3.2-1B-Instruct-Q4_K_M.gguf
+    python gguf_reader.py models/*.gguf --tensors
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from collate import file_sha256
+from defaults import MODEL_DIR, MODEL_CONFIGS
+
+GGUF_MAGIC = b"GGUF"
+DEFAULT_ALIGNMENT = 32
+CACHE_PATH = MODEL_DIR / ".gguf_info.json"
+
+# ggml_type -> (name, elements per block, bytes per block)
+GGML_TYPES = {
+    0: ("F32", 1, 4), 1: ("F16", 1, 2), 2: ("Q4_0", 32, 18), 3: ("Q4_1", 32, 20),
+    6: ("Q5_0", 32, 22), 7: ("Q5_1", 32, 24), 8: ("Q8_0", 32, 34), 9: ("Q8_1", 32, 36),
+    10: ("Q2_K", 256, 84), 11: ("Q3_K", 256, 110), 12: ("Q4_K", 256, 144), 13: ("Q5_K", 256, 176),
+    14: ("Q6_K", 256, 210), 15: ("Q8_K", 256, 292), 16: ("IQ2_XXS", 256, 66), 17: ("IQ2_XS", 256, 74),
+    18: ("IQ3_XXS", 256, 98), 19: ("IQ1_S", 256, 50), 20: ("IQ4_NL", 32, 18), 21: ("IQ3_S", 256, 110),
+    22: ("IQ2_S", 256, 82), 23: ("IQ4_XS", 256, 136), 24: ("I8", 1, 1), 25: ("I16", 1, 2),
+    26: ("I32", 1, 4), 27: ("I64", 1, 8), 28: ("F64", 1, 8), 29: ("IQ1_M", 256, 56),
+    30: ("BF16", 1, 2), 34: ("TQ1_0", 256, 54), 35: ("TQ2_0", 256, 66),
+}
+
+# GGUF metadata value type -> struct format (scalars only)
+_SCALARS = {0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i", 6: "<f", 7: "<?", 10: "<Q", 11: "<q", 12: "<d"}
+_STRING, _ARRAY = 8, 9
+
+
+class GGUFError(ValueError):
+    pass
+
+
+class _Cursor:
+    """Sequential little-endian reads from a buffer (the mmap)."""
+
+    def __init__(self, buf, offset: int = 0):
+        self.buf = buf
+        self.offset = offset
+
+    def unpack(self, fmt: str):
+        value = struct.unpack_from(fmt, self.buf, self.offset)[0]
+        self.offset += struct.calcsize(fmt)
+        return value
+
+    def string(self) -> str:
+        n = self.unpack("<Q")
+        value = bytes(self.buf[self.offset:self.offset + n]).decode("utf-8", errors="replace")
+        self.offset += n
+        return value
+
+    def value(self, value_type: int, keep_arrays: bool) -> Any:
+        if value_type in _SCALARS:
+            return self.unpack(_SCALARS[value_type])
+        if value_type == _STRING:
+            return self.string()
+        if value_type == _ARRAY:
+            item_type, n = self.unpack("<I"), self.unpack("<Q")
+            if item_type in _SCALARS and not keep_arrays:
+                # skip e.g. the tokenizer scores without decoding them
+                self.offset += n * struct.calcsize(_SCALARS[item_type])
+                return f"<array of {n}>"
+            items = [self.value(item_type, keep_arrays) for _ in range(n)]
+            return items if keep_arrays else f"<array of {n}>"
+        raise GGUFError(f"unknown GGUF value type {value_type} at offset {self.offset}")
+
+
+def read_gguf(path: str, keep_arrays: bool = False) -> Dict[str, Any]:
+    """Parse header, KV metadata and tensor table of a GGUF file via mmap.
+
+    Large arrays (tokenizer vocab, merges, scores) are skipped unless keep_arrays.
+    """
+    if os.path.getsize(path) == 0:
+        # mmap cannot map an empty file (ValueError)
+        raise GGUFError(f"{path} is empty")
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:4] != GGUF_MAGIC:
+            raise GGUFError(f"{path} is not a GGUF file")
+        cur = _Cursor(mm, 4)
+        version = cur.unpack("<I")
+        if version < 2:
+            raise GGUFError(f"{path}: GGUF v{version} is not supported")
+        n_tensors, n_kv = cur.unpack("<Q"), cur.unpack("<Q")
+
+        metadata = {}
+        for _ in range(n_kv):
+            key = cur.string()
+            metadata[key] = cur.value(cur.unpack("<I"), keep_arrays)
+
+        tensors = []
+        for _ in range(n_tensors):
+            name = cur.string()
+            n_dims = cur.unpack("<I")
+            dims = [cur.unpack("<Q") for _ in range(n_dims)]
+            ggml_type = cur.unpack("<I")
+            offset = cur.unpack("<Q")
+            if ggml_type not in GGML_TYPES:
+                raise GGUFError(f"{path}: tensor {name} has unknown ggml type {ggml_type}")
+            type_name, block, block_bytes = GGML_TYPES[ggml_type]
+            n_elements = 1
+            for d in dims:
+                n_elements *= d
+            tensors.append({
+                "name": name,
+                "dims": dims,
+                "type": type_name,
+                "offset": offset,
+                "n_elements": n_elements,
+                "nbytes": n_elements // block * block_bytes,
+            })
+
+        alignment = int(metadata.get("general.alignment", DEFAULT_ALIGNMENT))
+        data_start = (cur.offset + alignment - 1) // alignment * alignment
+        file_size = len(mm)
+
+    for t in tensors:
+        if data_start + t["offset"] + t["nbytes"] > file_size:
+            raise GGUFError(f"{path}: tensor {t['name']} extends past the end of the file")
+    return {
+        "version": version,
+        "metadata": metadata,
+        "tensors": tensors,
+        "data_start": data_start,
+        "file_size": file_size,
+    }
+
+
+def decode_bytes(tensors: List[Dict]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Total stored bytes and bytes read per decoded token, both per ggml type."""
+    names = {t["name"] for t in tensors}
+    tied_output = "output.weight" not in names
+    total: Dict[str, int] = {}
+    per_token: Dict[str, int] = {}
+    for t in tensors:
+        total[t["type"]] = total.get(t["type"], 0) + t["nbytes"]
+        read = t["nbytes"]
+        if t["name"] == "token_embd.weight" and not tied_output:
+            # embedding lookup touches a single row of n_embd elements
+            rows = t["n_elements"] // t["dims"][0]
+            read = t["nbytes"] // rows
+        per_token[t["type"]] = per_token.get(t["type"], 0) + read
+    return total, per_token
+
+
+def summarize(path: str) -> Dict[str, Any]:
+    info = read_gguf(path)
+    total, per_token = decode_bytes(info["tensors"])
+    meta = info["metadata"]
+    arch = meta.get("general.architecture", "")
+    return {
+        "architecture": arch,
+        "name": meta.get("general.name", ""),
+        "file_type": meta.get("general.file_type"),
+        "n_params": sum(t["n_elements"] for t in info["tensors"]),
+        "n_tensors": len(info["tensors"]),
+        "context_length": meta.get(f"{arch}.context_length"),
+        "tensor_bytes": sum(total.values()),
+        "bytes_per_token": sum(per_token.values()),
+        "tensor_bytes_by_type": total,
+        "bytes_per_token_by_type": per_token,
+        "file_size": info["file_size"],
+    }
+
+
+def _load_cache(path=CACHE_PATH) -> Dict[str, Dict]:
+    """The cache at path; a missing, unreadable or corrupt cache is treated as empty."""
+    try:
+        with open(path, "r") as f:
+            cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"files": {}, "models": {}}
+    if not isinstance(cache, dict) or not isinstance(cache.get("files"), dict) or not isinstance(cache.get("models"), dict):
+        return {"files": {}, "models": {}}
+    return cache
+
+
+def _save_cache(cache: Dict[str, Dict], path=CACHE_PATH):
+    """Write the cache atomically; several processes (collate's pool) may update it at once."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path) or ".", prefix=".gguf_info.", suffix=".tmp",
+                                     delete=False) as f:
+        json.dump(cache, f, indent=2)
+    os.replace(f.name, path)
+
+
+def model_info(path: str, cache_path=CACHE_PATH) -> Dict[str, Any]:
+    """summarize(path), cached by the file's SHA256. The cache is only written on a miss."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    cache = _load_cache(cache_path)
+    entry = cache["files"].get(path)
+    updates: Dict[str, Dict] = {"files": {}, "models": {}}
+    if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": file_sha256(path)}
+        updates["files"][path] = entry
+    digest = entry["sha256"]
+    model = cache["models"].get(digest)
+    if model is None:
+        model = updates["models"][digest] = summarize(path)
+    if updates["files"] or updates["models"]:
+        # merge into the latest cache on disk so concurrent writers lose as little as possible
+        latest = _load_cache(cache_path)
+        for key in ("files", "models"):
+            latest[key].update(updates[key])
+        _save_cache(latest, cache_path)
+    return {"sha256": digest, **model}
+
+
+def model_path_for(quantize: str, size: str = "1B") -> Optional[str]:
+    """Local GGUF for a quantization key in defaults.MODEL_CONFIGS, if it has been downloaded."""
+    model_config = MODEL_CONFIGS.get(quantize)
+    if model_config is None:
+        return None
+    path = MODEL_DIR / f"Llama-3.2-{size}-Instruct-{model_config['suffix']}.gguf"
+    return str(path) if path.exists() else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read GGUF metadata and exact per-token byte counts")
+    parser.add_argument("files", nargs="+", help="GGUF model files")
+    parser.add_argument("--tensors", action="store_true", help="Also list every tensor")
+    args = parser.parse_args()
+
+    for path in args.files:
+        try:
+            info = model_info(path)
+        except (OSError, GGUFError) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            continue
+        print(f"{path}")
+        print(f"  {info['name']} ({info['architecture']}), {info['n_params'] / 1e9:.2f}B params, {info['n_tensors']} tensors")
+        print(f"  tensor bytes {info['tensor_bytes'] / 1e6:.1f} MB, bytes/token {info['bytes_per_token'] / 1e6:.1f} MB")
+        for type_name, nbytes in sorted(info["bytes_per_token_by_type"].items(), key=lambda x: -x[1]):
+            print(f"    {type_name:<8} {nbytes / 1e6:>10.1f} MB/token  ({info['tensor_bytes_by_type'][type_name] / 1e6:.1f} MB stored)")
+        if args.tensors:
+            for t in read_gguf(path)["tensors"]:
+                print(f"    {t['name']:<40} {t['type']:<8} {'x'.join(map(str, t['dims'])):<20} {t['nbytes']:>12}")
+
+
+if __name__ == "__main__":
+    main()
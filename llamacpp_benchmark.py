@@ -5,6 +5,9 @@ Usage:
     python llamacpp_benchmark.py                           # Run benchmarks
     python llamacpp_benchmark.py --port 8080               # Start server on port 8080
     python llamacpp_benchmark.py --port 8080 --quantize int8  # Server with specific quantization
+    python llamacpp_benchmark.py --port 8080 --tuned          # Server with this host's server_tuner.py flags
+    python llamacpp_benchmark.py --build-matrix               # pp/tg sweep over every build variant
+    python llamacpp_benchmark.py --build-matrix --variant generic --variant native
 """
 import os
 import uuid
@@ -12,8 +15,17 @@ import argparse
 import subprocess
 from typing import List, Any
 from itertools import product
-from tinygrad.helpers import fetch
-from defaults import MODEL_DIR, MODEL_CONFIGS
+from defaults import MODEL_DIR
+import llamacpp_parse
+import roofline
+import prewarm
+from model_manager import model_path as get_model_path
+from build_cache import BUILD_VARIANTS, build_llamacpp, supported_variants
+from results_store import ResultsStore
+
+LLAMA_BENCH = "./deps/llama.cpp/build/bin/llama-bench"
+# prompt tokens for the prefill (pp) test in build-matrix mode
+MATRIX_PROMPT_TOKENS = 512
 
 # variables from tinygrad_benchmark.py
 SSEEDS  = [("--seed", str(_)) for _ in [42]]
@@ -77,31 +89,28 @@ def config_to_filename_and_metadata(config) -> tuple[str, dict[str, Any]]:
     return filename, metadata
 
 
-def get_model_path(quantize: str, size: str = "1B") -> str:
-    """Get path to GGUF model file, downloading if necessary."""
-    model_config = MODEL_CONFIGS[quantize]
-    model_url = model_config["url"]
-    model_suffix = model_config["suffix"]
+def run_server(port: int, quantize: str, size: str = "1B", page_cache: str = "warm", mlock: bool = False,
+               hugepages: bool = False, tuned: bool = False):
+    """Run llama-server as an OpenAI-compatible server.
 
-    MODEL_DIR.mkdir(parents=True, exist_ok=True)
-    model_path = MODEL_DIR / f"Llama-3.2-{size}-Instruct-{model_suffix}.gguf"
-
-    if not model_path.exists():
-        print(f"Downloading {model_path}...")
-        fetch(model_url, name=model_path)
-
-    return str(model_path)
-
-
-def run_server(port: int, quantize: str, size: str = "1B"):
-    """Run llama-server as an OpenAI-compatible server."""
+    tuned adds this host's flags from server_tuner.py for the size and quantization.
+    """
     model_path = get_model_path(quantize, size)
+    prewarm.prepare(str(model_path), page_cache)
+    tuned_flags = []
+    if tuned:
+        from server_tuner import tuned_flags as load_tuned_flags
+        tuned_flags = load_tuned_flags(quantize, size)
+        if not tuned_flags:
+            print(f"Warning: no tuned configuration for {size}/{quantize} on this host, using defaults")
 
     command = [
         "./deps/llama.cpp/build/bin/llama-server",
-        "-m", model_path,
+        "-m", str(model_path),
         "--host", "0.0.0.0",
         "--port", str(port),
+        *prewarm.server_flags(mlock, hugepages),
+        *tuned_flags,
     ]
 
     print(f"Starting llama-server on port {port}...")
@@ -117,8 +126,62 @@ def run_server(port: int, quantize: str, size: str = "1B"):
     subprocess.run(args=command)
 
 
-def run_benchmarks():
-    """Run benchmark sweep over all configurations."""
+def run_config(config, llama_bench: str = LLAMA_BENCH, build_variant: str | None = None, n_prompt: int = 0,
+               page_cache: str = "warm") -> list:
+    """Run one config through llama-bench, write its log to benchmark_output/, ingest it and return the rows."""
+    filename, metadata = config_to_filename_and_metadata(config)
+    quantize = metadata['config']['quantize']
+    model_path = get_model_path(quantize, metadata['config']['size'])
+    cache_state = prewarm.prepare(str(model_path), page_cache)
+
+    # Run llama-bench
+    if build_variant:
+        filename = filename.replace('.txt', f'_{build_variant}.txt')
+    command = [
+        llama_bench,
+        "-m", str(model_path),
+        "-p", str(n_prompt),  # 0 = no prompt
+        "-n", "20",  # generate 20 tokens, matching tinygrad --benchmark-len
+        "-r", "5",  # repetitions
+        "-o", "jsonl"
+    ]
+
+    rows = []
+    try:
+        with open(f"benchmark_output/llamacpp_{filename}", "w") as f:
+            # write metadata
+            for key, value in metadata['whoami'].items():
+                f.write(f"{key}: {value}\n")
+            for key, value in metadata['config'].items():
+                f.write(f"{key}: {value}\n")
+            f.write(f"uuid: {metadata['uuid']}\n")
+            if build_variant:
+                f.write(f"build_variant: {build_variant}\n")
+            for key, value in cache_state.items():
+                f.write(f"{key}: {value}\n")
+            # then run subprocess
+            result = subprocess.run(args=command, capture_output=True, text=True)
+            f.write(result.stdout)
+            if result.stderr:
+                f.write(f"STDERR:\n{result.stderr}\n")
+        # parse the log and append it to the results store
+        rows = llamacpp_parse.parse_file(f"benchmark_output/llamacpp_{filename}")
+        with ResultsStore() as store:
+            store.ingest(rows, "llamacpp", source=f"llamacpp_{filename}")
+    except Exception as e:
+        print(f"{command} failed with {e}")
+    return rows
+
+
+def run_benchmarks(llama_bench: str = LLAMA_BENCH, build_variant: str | None = None, n_prompt: int = 0,
+                   page_cache: str = "warm"):
+    """Run benchmark sweep over all configurations.
+
+    build_variant tags every row with the llama.cpp build it came from, and
+    n_prompt > 0 adds a prompt-processing (pp) test alongside token generation.
+    Each model file is put in the page_cache state (see prewarm.py) right
+    before its llama-bench run, and the resulting residency is recorded.
+    """
     # 4. pretty print for dry run
     for config in configs:
         model_key = config[2][1] if len(config) > 2 and config[2] else "default"
@@ -127,38 +190,31 @@ def run_benchmarks():
     # 5. actually run, and save output to file
     MODEL_DIR.mkdir(parents=True, exist_ok=True)
     os.makedirs("benchmark_output", exist_ok=True)
+    # measure this host's memory bandwidth once, for roofline.py
+    roofline.host_bandwidth()
 
     num_runs = len(configs)
     for config in configs[:num_runs]:
-        filename, metadata = config_to_filename_and_metadata(config)
-        quantize = metadata['config']['quantize']
-        model_path = get_model_path(quantize)
-
-        # Run llama-bench
-        command = [
-            "./deps/llama.cpp/build/bin/llama-bench",
-            "-m", model_path,
-            "-p", "0",  # no prompt
-            "-n", "20",  # generate 20 tokens, matching tinygrad --benchmark-len
-            "-r", "5",  # repetitions
-            "-o", "jsonl"
-        ]
+        run_config(config, llama_bench, build_variant, n_prompt, page_cache)
+
+
+def run_build_matrix(variants: List[str] | None = None, page_cache: str = "warm"):
+    """Build each llama.cpp variant into its own cached build dir and run the same pp/tg sweep through it."""
+    variants = variants or list(BUILD_VARIANTS)
+    runnable = supported_variants(variants)
+    for skipped in sorted(set(variants) - set(runnable)):
+        print(f"Skipping variant {skipped}: not supported by this CPU")
 
+    for variant in runnable:
         try:
-            with open(f"benchmark_output/llamacpp_{filename}", "w") as f:
-                # write metadata
-                for key, value in metadata['whoami'].items():
-                    f.write(f"{key}: {value}\n")
-                for key, value in metadata['config'].items():
-                    f.write(f"{key}: {value}\n")
-                f.write(f"uuid: {metadata['uuid']}\n")
-                # then run subprocess
-                result = subprocess.run(args=command, capture_output=True, text=True)
-                f.write(result.stdout)
-                if result.stderr:
-                    f.write(f"STDERR:\n{result.stderr}\n")
-        except Exception as e:
-            print(f"{command} failed with {e}")
+            bin_dir = build_llamacpp(variant=variant, cmake_flags=BUILD_VARIANTS[variant], targets=("llama-bench",))
+        except subprocess.CalledProcessError as e:
+            # e.g. OpenBLAS not installed
+            print(f"Skipping variant {variant}: build failed ({e})")
+            continue
+        print(f"\n=== llama.cpp build variant: {variant} ===")
+        run_benchmarks(str(bin_dir / "llama-bench"), build_variant=variant, n_prompt=MATRIX_PROMPT_TOKENS,
+                       page_cache=page_cache)
 
 
 if __name__ == "__main__":
@@ -166,9 +222,17 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, help="Run as server on this port instead of benchmarking")
     parser.add_argument("--size", choices=["1B", "8B", "70B", "405B"], default="1B", help="Model size (default: 1B)")
     parser.add_argument("--quantize", choices=["default", "int8", "nf4", "float16"], default="default", help="Quantization method")
+    parser.add_argument("--build-matrix", action="store_true", help="Benchmark every llama.cpp build variant (see build_cache.py)")
+    parser.add_argument("--variant", action="append", choices=list(BUILD_VARIANTS), help="Limit --build-matrix to these variants")
+    parser.add_argument("--page-cache", choices=prewarm.CACHE_STATES, default="warm", help="Page-cache state of each model before it runs (see prewarm.py)")
+    parser.add_argument("--mlock", action="store_true", help="Server mode: lock the model in RAM")
+    parser.add_argument("--hugepages", action="store_true", help="Server mode: load weights with --no-mmap so transparent hugepages can back them")
+    parser.add_argument("--tuned", action="store_true", help="Server mode: use this host's flags from server_tuner.py")
     args = parser.parse_args()
 
     if args.port:
-        run_server(args.port, args.quantize, args.size)
+        run_server(args.port, args.quantize, args.size, args.page_cache, args.mlock, args.hugepages, args.tuned)
+    elif args.build_matrix:
+        run_build_matrix(args.variant, args.page_cache)
     else:
-        run_benchmarks()
+        run_benchmarks(page_cache=args.page_cache)
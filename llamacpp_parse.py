@@ -2,16 +2,29 @@
 Parse llama-bench JSONL output files into CSV format.
 Usage: python llamacpp_parse.py <input_file.txt>
 """
+import os
 import sys
 import csv
 import json
-from typing import List, Dict, Optional
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+
+import gguf_reader
+
+FIELDNAMES = [
+    'step', 'enqueue_latency_ms', 'total_latency_ms', 'tokens_per_sec',
+    'memory_throughput_gb_s', 'param_throughput_gb_s', 'generated_text',
+    'platform', 'release', 'device', 'username', 'hostname', 'size', 'quantize', 'seed', 'uuid',
+    'build_commit', 'model_type', 'n_prompt', 'n_gen', 'n_batch', 'n_threads', 'gpu_info', 'backends',
+    'test', 'build_variant', 'page_cache', 'resident_fraction'
+]
 
 
 def parse_metadata(lines: List[str]) -> Dict[str, str]:
     """Parse the metadata header from the benchmark file."""
     metadata = {}
-    metadata_keys = {'platform', 'release', 'device', 'username', 'hostname', 'size', 'quantize', 'seed', 'uuid'}
+    metadata_keys = {'platform', 'release', 'device', 'username', 'hostname', 'size', 'quantize', 'seed', 'uuid',
+                     'build_variant', 'page_cache', 'resident_fraction'}
 
     for line in lines:
         line = line.strip()
@@ -37,37 +50,62 @@ def parse_jsonl_metrics(line: str) -> Optional[Dict]:
         return None
 
 
+@lru_cache(maxsize=None)
+def _gguf_info(path: str) -> Optional[Dict]:
+    try:
+        return gguf_reader.model_info(path)
+    except (OSError, gguf_reader.GGUFError):
+        return None
+
+
+def model_bytes(metadata: Dict[str, str], jsonl_data: Dict) -> Tuple[float, float]:
+    """(bytes read per decoded token, total weight bytes) for a llama-bench result.
+
+    Exact counts come from the GGUF tensor table when the model file is on this
+    machine (llama-bench's model_filename, else MODEL_DIR by quantization);
+    otherwise llama-bench's model_size is used for both.
+    """
+    path = jsonl_data.get('model_filename')
+    if not path or not os.path.exists(path):
+        path = gguf_reader.model_path_for(metadata.get('quantize') or 'default', metadata.get('size') or '1B')
+    info = _gguf_info(path) if path else None
+    if info:
+        return info['bytes_per_token'], info['tensor_bytes']
+    model_size = jsonl_data.get('model_size', 0)
+    return model_size, model_size
+
+
 def convert_to_benchmark_rows(metadata: Dict[str, str], jsonl_data: Dict) -> List[Dict]:
     """
     Convert llama-bench JSONL data to benchmark rows matching tinygrad schema.
 
     llama-bench gives aggregate stats (avg/stddev over repetitions),
-    so we create one row per sample.
+    so we create one row per sample. Prompt-processing (pp) and
+    text-generation (tg) tests are told apart by the `test` field.
     """
     results = []
 
     samples_ns = jsonl_data.get('samples_ns', [])
     samples_ts = jsonl_data.get('samples_ts', [])
     n_gen = jsonl_data.get('n_gen', 20)
+    n_prompt = jsonl_data.get('n_prompt', 0)
+    test = f'tg{n_gen}' if n_gen else f'pp{n_prompt}'
+    bytes_per_token, weight_bytes = model_bytes(metadata, jsonl_data)
 
     for step, (ns, ts) in enumerate(zip(samples_ns, samples_ts), start=1):
         # Convert nanoseconds to milliseconds for total latency
         total_latency_ms = ns / 1_000_000
 
-        # llama-bench doesn't provide enqueue latency separately
-        # We estimate memory throughput from model size and time
-        model_size_bytes = jsonl_data.get('model_size', 0)
-        model_size_gb = model_size_bytes / (1024 ** 3)
-
-        # Memory throughput: model_size * tokens / time
-        # This is an approximation
+        # llama-bench doesn't provide enqueue latency separately.
+        # Throughputs are in GB/s (1e9, like tinygrad) and only meaningful for
+        # token generation: prompt processing reads the weights once per batch
         time_s = ns / 1_000_000_000
-        memory_throughput_gb_s = (model_size_gb * n_gen / time_s) if time_s > 0 else 0
-
-        # param throughput approximation
-        n_params = jsonl_data.get('model_n_params', 0)
-        param_bytes = n_params * 2  # assume fp16 params
-        param_throughput_gb_s = (param_bytes / (1024 ** 3) * n_gen / time_s) if time_s > 0 else 0
+        memory_throughput_gb_s = None
+        param_throughput_gb_s = None
+        if n_gen and time_s > 0:
+            # bytes each decoded token actually reads vs. all weight bytes
+            memory_throughput_gb_s = bytes_per_token / 1e9 * n_gen / time_s
+            param_throughput_gb_s = weight_bytes / 1e9 * n_gen / time_s
 
         row = {
             'step': step,
@@ -81,11 +119,13 @@ def convert_to_benchmark_rows(metadata: Dict[str, str], jsonl_data: Dict) -> Lis
             # Additional llama-bench specific fields
             'build_commit': jsonl_data.get('build_commit', ''),
             'model_type': jsonl_data.get('model_type', ''),
+            'n_prompt': n_prompt,
             'n_gen': n_gen,
             'n_batch': jsonl_data.get('n_batch', ''),
             'n_threads': jsonl_data.get('n_threads', ''),
             'gpu_info': jsonl_data.get('gpu_info', ''),
             'backends': jsonl_data.get('backends', ''),
+            'test': test,
         }
         results.append(row)
 
@@ -105,11 +145,13 @@ def convert_to_benchmark_rows(metadata: Dict[str, str], jsonl_data: Dict) -> Lis
         **metadata,
         'build_commit': jsonl_data.get('build_commit', ''),
         'model_type': jsonl_data.get('model_type', ''),
+        'n_prompt': n_prompt,
         'n_gen': n_gen,
         'n_batch': jsonl_data.get('n_batch', ''),
         'n_threads': jsonl_data.get('n_threads', ''),
         'gpu_info': jsonl_data.get('gpu_info', ''),
         'backends': jsonl_data.get('backends', ''),
+        'test': test,
     }
     results.insert(0, summary_row)
 
@@ -137,19 +179,12 @@ def write_csv(results: List[Dict], output_file: str):
     if not results:
         return
 
-    fieldnames = [
-        'step', 'enqueue_latency_ms', 'total_latency_ms', 'tokens_per_sec',
-        'memory_throughput_gb_s', 'param_throughput_gb_s', 'generated_text',
-        'platform', 'release', 'device', 'username', 'hostname', 'size', 'quantize', 'seed', 'uuid',
-        'build_commit', 'model_type', 'n_gen', 'n_batch', 'n_threads', 'gpu_info', 'backends'
-    ]
-
     with open(output_file, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
         writer.writeheader()
         for row in results:
             # Fill missing fields with empty string
-            for field in fieldnames:
+            for field in FIELDNAMES:
                 if field not in row or row[field] is None:
                     row[field] = ''
             writer.writerow(row)
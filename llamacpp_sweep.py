@@ -5,6 +5,8 @@ Usage:
     python llamacpp_sweep.py
     python llamacpp_sweep.py --env gsm8k --num-examples 10
     python llamacpp_sweep.py --env gsm8k --num-examples 20 --size 1B
+    python llamacpp_sweep.py --concurrency 1 2 4 8 -t 128          # throughput-latency curve and knee per quant
+    python llamacpp_sweep.py --concurrency --driver verifiers --env gsm8k
 """
 import sys
 # Unbuffered output
@@ -15,15 +17,25 @@ import argparse
 import subprocess
 import time
 import json
-import os
+import platform
+import statistics
 from datetime import datetime
 from pathlib import Path
 
-from tinygrad.helpers import fetch
-from defaults import MODEL_DIR, MODEL_CONFIGS
+from model_manager import model_path as get_model_path
+from server_logs import LogDrain
+import prewarm
+import run_cache
+import load_test
+import verifiers_runner
+from build_cache import LLAMACPP_REPO
 
 QUANT_OPTIONS = ["default", "int8", "nf4", "float16"]
 BACKEND_PORT = 8080
+# concurrency sweep: levels, context per llama-server slot, and the throughput gain a level must add to be worth it
+CONCURRENCY_LEVELS = [1, 2, 4, 8]
+SLOT_CTX = 2048
+KNEE_GAIN = 0.10
 
 
 def wait_for_server(port: int, timeout: int = 120) -> bool:
@@ -39,92 +51,56 @@ def wait_for_server(port: int, timeout: int = 120) -> bool:
     return False
 
 
-def get_model_path(quantize: str, size: str = "1B") -> Path:
-    """Get path to GGUF model file, downloading if necessary."""
-    model_config = MODEL_CONFIGS[quantize]
-    model_url = model_config["url"]
-    model_suffix = model_config["suffix"]
-
-    MODEL_DIR.mkdir(parents=True, exist_ok=True)
-    model_path = MODEL_DIR / f"Llama-3.2-{size}-Instruct-{model_suffix}.gguf"
-
-    if not model_path.exists():
-        print(f"Downloading {model_path}...")
-        fetch(model_url, name=model_path)
-
-    return model_path
-
-
-def run_benchmark(env: str, num_examples: int, max_tokens: int, port: int = None, max_concurrent: int = 1) -> dict:
-    """Run vf-eval and capture results."""
-    if port is None:
-        port = BACKEND_PORT
-    cmd = [
-        "uv", "run", "vf-eval", env,
-        "-m", "local",
-        "-b", f"http://localhost:{port}/v1",
-        "-n", str(num_examples),
-        "-r", "1",
-        "-t", str(max_tokens),
-        "-c", str(max_concurrent),  # Max concurrent requests
-        "--save-results",  # Persist runs to database for vf-tui
+def start_server(model_path, port: int, log_path: Path, extra_flags=()):
+    """Start llama-server for model_path, draining its output to log_path; returns (process, drain)."""
+    server_cmd = [
+        "./deps/llama.cpp/build/bin/llama-server",
+        "-m", str(model_path),
+        "--host", "0.0.0.0",
+        "--port", str(port),
+        *extra_flags,
     ]
-
-    env_vars = os.environ.copy()
-    env_vars["OPENAI_API_KEY"] = "dummy"
-
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        env=env_vars,
-        timeout=None  # No timeout - let it run as long as needed
+    print("Starting llama-server...")
+    print(f"Model: {model_path}")
+    server_proc = subprocess.Popen(
+        server_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
     )
-
-    return {
-        "stdout": result.stdout,
-        "stderr": result.stderr,
-        "returncode": result.returncode
-    }
+    # Keep reading the pipe so llama-server never blocks on a full buffer
+    drain = LogDrain(server_proc, log_path)
+    drain.start()
+    return server_proc, drain
 
 
-def parse_results(output: str) -> dict:
-    """Parse vf-eval output to extract metrics."""
-    metrics = {}
-
-    for line in output.split("\n"):
-        # Parse reward lines like "reward: avg - 0.000, std - 0.000"
-        if "avg -" in line and "std -" in line:
-            parts = line.split(":")
-            if len(parts) >= 2:
-                name = parts[0].strip()
-                try:
-                    avg_part = line.split("avg -")[1].split(",")[0].strip()
-                    std_part = line.split("std -")[1].split(",")[0].strip()
-                    metrics[name] = {
-                        "avg": float(avg_part),
-                        "std": float(std_part)
-                    }
-                except (IndexError, ValueError):
-                    pass
-
-        # Parse timing
-        if "Evaluation completed in" in line:
-            try:
-                time_str = line.split("in")[1].split("seconds")[0].strip()
-                metrics["eval_time_seconds"] = float(time_str)
-            except (IndexError, ValueError):
-                pass
-
-    return metrics
-
-
-def run_sweep(env: str, num_examples: int, max_tokens: int, size: str, port: int = None, max_concurrent: int = 1):
-    """Run benchmark sweep across all quantization options."""
+def stop_server(server_proc, drain):
+    server_proc.terminate()
+    try:
+        server_proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server_proc.kill()
+    drain.join(timeout=5)
+
+
+def run_sweep(env: str, num_examples: int, max_tokens: int, size: str, port: int = None, max_concurrent: int = 1,
+              page_cache: str = "warm", mlock: bool = False, hugepages: bool = False, fresh: bool = False):
+    """Run benchmark sweep across all quantization options.
+
+    page_cache puts each model file in a known page-cache state before its
+    server starts (see prewarm.py); mlock and hugepages set llama-server flags.
+    The evaluation runs in-process (see verifiers_runner.py), so per-example
+    reward, tokens and latency are stored under examples in each entry.
+    Each finished quantization is checkpointed in the run cache and skipped
+    on the next run unless fresh is set.
+    """
     if port is None:
         port = BACKEND_PORT
     results = []
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    cache = run_cache.RunCache("llamacpp_sweep", enabled=not fresh)
+    commit = run_cache.build_commit(LLAMACPP_REPO)
+    # load the environment and its dataset once; every quantization reuses it
+    verifiers_runner.load_env(env)
 
     for quant in QUANT_OPTIONS:
         print(f"\n{'='*60}")
@@ -133,23 +109,22 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str, port: int
 
         # Get model path (downloads if necessary)
         model_path = get_model_path(quant, size)
-
-        # Build llama-server command
-        server_cmd = [
-            "./deps/llama.cpp/build/bin/llama-server",
-            "-m", str(model_path),
-            "--host", "0.0.0.0",
-            "--port", str(port),
-        ]
-
-        # Start llama-server
-        print("Starting llama-server...")
-        print(f"Model: {model_path}")
-        server_proc = subprocess.Popen(
-            server_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-        )
+        sweep_config = {
+            "environment": env, "num_examples": num_examples, "max_tokens": max_tokens, "size": size,
+            "quantization": quant, "max_concurrent": max_concurrent,
+            "page_cache": page_cache, "mlock": mlock, "hugepages": hugepages,
+        }
+        key = cache.key(sweep_config, run_cache.model_hash(str(model_path)), commit)
+        cached = cache.get(key, valid=lambda r: r["returncode"] == 0)
+        if cached is not None:
+            print(f"Already completed (run cache {key[:12]}), skipping")
+            results.append(cached)
+            continue
+        cache_state = prewarm.prepare(str(model_path), page_cache)
+        print(f"Page cache: {page_cache}, resident {cache_state['resident_fraction'] or 'unknown'}")
+
+        log_path = Path("verifiers_results") / "logs" / f"llamacpp_{env}_{size}_{quant}_{timestamp}.log"
+        server_proc, drain = start_server(model_path, port, log_path, prewarm.server_flags(mlock, hugepages))
 
         try:
             # Wait for server to load
@@ -163,11 +138,10 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str, port: int
             # Run benchmark (direct connection, no proxy needed)
             print(f"Running {env} benchmark with {num_examples} examples (max_concurrent={max_concurrent})...")
             start_time = time.time()
-            bench_result = run_benchmark(env, num_examples, max_tokens, port, max_concurrent)
+            bench_result = verifiers_runner.evaluate(env, f"http://localhost:{port}/v1", num_examples, max_tokens,
+                                                     max_concurrent)
             elapsed = time.time() - start_time
-
-            # Parse results
-            metrics = parse_results(bench_result["stdout"] + bench_result["stderr"])
+            metrics = bench_result["metrics"]
 
             result_entry = {
                 "quantization": quant,
@@ -180,10 +154,15 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str, port: int
                 "returncode": bench_result["returncode"],
                 "timestamp": datetime.now().isoformat(),
                 "backend": "llamacpp",
-                "stdout": bench_result["stdout"][-1000:] if bench_result["stdout"] else "",  # Last 1000 chars
-                "stderr": bench_result["stderr"][-1000:] if bench_result["stderr"] else "",  # Last 1000 chars
+                "hostname": platform.node(),
+                "server_metrics": drain.summary(),
+                **cache_state,
+                **prewarm.server_metadata(mlock, hugepages),
+                "error": bench_result["error"],
+                "examples": bench_result["examples"],
             }
             results.append(result_entry)
+            cache.put(key, result_entry)
 
             # Print summary
             print(f"\nResults for {quant}:")
@@ -191,22 +170,15 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str, port: int
             print(f"  Return code: {bench_result['returncode']}")
 
             if bench_result['returncode'] != 0:
-                print(f"  ERROR: vf-eval failed!")
-                if bench_result['stderr']:
-                    print(f"  Last stderr output:\n{bench_result['stderr'][-500:]}")
+                print(f"  ERROR: evaluation failed: {bench_result['error']}")
 
-            for name, vals in metrics.items():
-                if isinstance(vals, dict):
-                    print(f"  {name}: avg={vals['avg']:.3f}, std={vals['std']:.3f}")
-                else:
-                    print(f"  {name}: {vals}")
+            verifiers_runner.print_metrics(metrics)
+            server_metrics = result_entry["server_metrics"]
+            if server_metrics["eval_tokens_per_sec"]:
+                print(f"  server eval: {server_metrics['eval_tokens_per_sec']:.2f} tok/s over {server_metrics['num_requests']} requests")
 
         finally:
-            server_proc.terminate()
-            try:
-                server_proc.wait(timeout=10)
-            except subprocess.TimeoutExpired:
-                server_proc.kill()
+            stop_server(server_proc, drain)
 
         # Brief pause between runs
         time.sleep(2)
@@ -241,6 +213,138 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str, port: int
     return results
 
 
+def knee_point(curve: list, min_gain: float = KNEE_GAIN, max_p95_latency_s: float = None):
+    """Concurrency to deploy at: the last level whose throughput still rose by min_gain over the previous one.
+
+    curve is a list of points (concurrency, aggregate_tokens_per_sec,
+    latency_s_p95) in increasing concurrency. Past the knee, more slots only
+    add latency. Levels over max_p95_latency_s are never chosen.
+    """
+    knee, best = None, None
+    for point in sorted(curve, key=lambda p: p["concurrency"]):
+        if point.get("errors") or (max_p95_latency_s and (point.get("latency_s_p95") or 0) > max_p95_latency_s):
+            break
+        if best is not None and point["aggregate_tokens_per_sec"] < best * (1 + min_gain):
+            break
+        knee, best = point["concurrency"], point["aggregate_tokens_per_sec"]
+    return knee
+
+
+def _verifiers_point(result: dict, concurrency: int) -> dict:
+    """A verifiers run in the load tester's summary shape (no TTFT: verifiers requests do not stream)."""
+    examples = result["examples"]
+    wall_s = result["metrics"].get("eval_time_seconds") or 0.0
+    tokens = sum(e["completion_tokens"] for e in examples)
+    per_request = [e["tokens_per_sec"] for e in examples if e["tokens_per_sec"]]
+    point = {
+        "concurrency": concurrency,
+        "requests": len(examples),
+        "errors": 0 if result["returncode"] == 0 else 1,
+        "wall_s": wall_s,
+        "completion_tokens": tokens,
+        "aggregate_tokens_per_sec": tokens / wall_s if wall_s > 0 else 0.0,
+        "request_tokens_per_sec": statistics.median(per_request) if per_request else None,
+        **load_test.percentiles([e["latency_s"] for e in examples], "latency_s"),
+        "reward": result["metrics"].get("reward", {}).get("avg"),
+    }
+    return point
+
+
+def run_concurrency_sweep(levels: list, size: str, port: int = None, driver: str = "load", env: str = "gsm8k",
+                          num_examples: int = 5, max_tokens: int = 512, requests_per_client: int = 4,
+                          slot_ctx: int = SLOT_CTX, max_p95_latency_s: float = None, page_cache: str = "warm",
+                          mlock: bool = False, hugepages: bool = False, fresh: bool = False):
+    """Throughput-latency curve per quantization over concurrency levels, and its knee.
+
+    For each level c, llama-server is restarted with --parallel c and
+    --ctx-size c * slot_ctx (the context is split evenly across slots) from the
+    page-cache state page_cache, then driven at c concurrent requests by the load tester (load_test.py) or by a
+    verifiers evaluation with max_concurrent c.
+    """
+    if port is None:
+        port = BACKEND_PORT
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    cache = run_cache.RunCache("llamacpp_concurrency", enabled=not fresh)
+    commit = run_cache.build_commit(LLAMACPP_REPO)
+    if driver == "verifiers":
+        verifiers_runner.load_env(env)
+    curves, knees = {}, {}
+
+    for quant in QUANT_OPTIONS:
+        print(f"\n{'='*60}")
+        print(f"Concurrency sweep with quantization: {quant}")
+        print(f"{'='*60}")
+        model_path = get_model_path(quant, size)
+        model_hash = run_cache.model_hash(str(model_path))
+        curves[quant] = []
+
+        for concurrency in levels:
+            sweep_config = {
+                "size": size, "quantization": quant, "concurrency": concurrency, "driver": driver,
+                "max_tokens": max_tokens, "slot_ctx": slot_ctx, "page_cache": page_cache, "mlock": mlock,
+                "hugepages": hugepages,
+                **({"environment": env, "num_examples": num_examples} if driver == "verifiers"
+                   else {"requests_per_client": requests_per_client}),
+            }
+            key = cache.key(sweep_config, model_hash, commit)
+            cached = cache.get(key, valid=lambda r: not r["errors"] and r["completion_tokens"] > 0)
+            if cached is not None:
+                print(f"c={concurrency}: already completed (run cache {key[:12]}), skipping")
+                curves[quant].append(cached)
+                continue
+
+            # every level restarts the server, so set the page cache up again just before it loads the model
+            cache_state = prewarm.prepare(str(model_path), page_cache)
+            server_flags = ["--parallel", str(concurrency), "--ctx-size", str(slot_ctx * concurrency),
+                            *prewarm.server_flags(mlock, hugepages)]
+            log_path = Path("benchmark_output") / "logs" / f"llamacpp_concurrency_{size}_{quant}_c{concurrency}_{timestamp}.log"
+            server_proc, drain = start_server(model_path, port, log_path, server_flags)
+            try:
+                if not wait_for_server(port, timeout=180):
+                    print(f"ERROR: Server failed to start for quant={quant}, c={concurrency}")
+                    continue
+                base_url = f"http://localhost:{port}/v1"
+                if driver == "verifiers":
+                    point = _verifiers_point(verifiers_runner.evaluate(env, base_url, num_examples, max_tokens,
+                                                                       concurrency), concurrency)
+                else:
+                    point = load_test.run_load(base_url, concurrency, requests_per_client * concurrency, max_tokens)
+            finally:
+                stop_server(server_proc, drain)
+
+            point.update({
+                "quantization": quant, "size": size, "driver": driver, "slot_ctx": slot_ctx,
+                "backend": "llamacpp", "hostname": platform.node(), "timestamp": datetime.now().isoformat(),
+                "server_metrics": drain.summary(), **cache_state, **prewarm.server_metadata(mlock, hugepages),
+            })
+            print(load_test.format_summary(point))
+            curves[quant].append(point)
+            cache.put(key, point)
+            time.sleep(2)
+
+        knees[quant] = knee_point(curves[quant], max_p95_latency_s=max_p95_latency_s)
+
+    output_dir = Path("benchmark_output")
+    output_dir.mkdir(exist_ok=True)
+    output_file = output_dir / f"llamacpp_concurrency_{size}_{timestamp}.json"
+    with open(output_file, "w") as f:
+        json.dump({"curves": curves, "knees": knees}, f, indent=2)
+
+    print(f"\n{'='*60}")
+    print(f"Concurrency sweep complete! Results saved to {output_file}")
+    print(f"{'='*60}")
+    print("\nThroughput-latency curves:")
+    print(f"{'Quant':<10} {'c':>4} {'Agg tok/s':>10} {'Req tok/s':>10} {'p50 lat s':>10} {'p95 lat s':>10} {'p99 lat s':>10}")
+    print("-" * 70)
+    for quant, curve in curves.items():
+        for p in sorted(curve, key=lambda p: p["concurrency"]):
+            marker = "  <- knee" if p["concurrency"] == knees[quant] else ""
+            cells = [p.get(k) for k in ("request_tokens_per_sec", "latency_s_p50", "latency_s_p95", "latency_s_p99")]
+            print(f"{quant:<10} {p['concurrency']:>4} {p['aggregate_tokens_per_sec']:>10.2f} "
+                  + " ".join(f"{v:>10.2f}" if v is not None else f"{'-':>10}" for v in cells) + marker)
+    return curves, knees
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Sweep verifiers benchmarks across quantization options (llama.cpp backend)")
     parser.add_argument("--env", default="gsm8k", help="Verifiers environment to benchmark")
@@ -250,23 +354,39 @@ if __name__ == "__main__":
     parser.add_argument("--quant", choices=QUANT_OPTIONS, help="Run single quantization instead of full sweep")
     parser.add_argument("--port", type=int, default=8080, help="Port for llama-server")
     parser.add_argument("--max-concurrent", "-c", type=int, default=1, help="Maximum concurrent requests to backend")
+    parser.add_argument("--page-cache", choices=prewarm.CACHE_STATES, default="warm", help="Page-cache state of each model before its server starts")
+    parser.add_argument("--mlock", action="store_true", help="Start llama-server with --mlock")
+    parser.add_argument("--hugepages", action="store_true", help="Load weights with --no-mmap so transparent hugepages can back them")
+    parser.add_argument("--fresh", action="store_true", help="Ignore checkpoints from earlier runs (see run_cache.py)")
+    parser.add_argument("--concurrency", type=int, nargs="*", help=f"Concurrency sweep over these levels instead (default levels: {CONCURRENCY_LEVELS})")
+    parser.add_argument("--driver", choices=["load", "verifiers"], default="load", help="Concurrency sweep: load_test.py requests or a verifiers evaluation")
+    parser.add_argument("--requests-per-client", type=int, default=4, help="Concurrency sweep with --driver load: requests per concurrent client")
+    parser.add_argument("--slot-ctx", type=int, default=SLOT_CTX, help=f"Concurrency sweep: context per server slot (default: {SLOT_CTX})")
+    parser.add_argument("--max-p95-latency", type=float, help="Concurrency sweep: never pick a knee above this p95 latency (s)")
     args = parser.parse_args()
+    server_options = dict(page_cache=args.page_cache, mlock=args.mlock, hugepages=args.hugepages, fresh=args.fresh)
 
     try:
-        if args.quant:
+        if args.concurrency is not None:
+            if args.quant:
+                QUANT_OPTIONS[:] = [args.quant]
+            run_concurrency_sweep(args.concurrency or CONCURRENCY_LEVELS, args.size, args.port, args.driver, args.env,
+                                  args.num_examples, args.max_tokens, args.requests_per_client, args.slot_ctx,
+                                  args.max_p95_latency, **server_options)
+        elif args.quant:
             # Run single quantization
             # Modify QUANT_OPTIONS to run only the specified one
             original_quant_options = QUANT_OPTIONS.copy()
             QUANT_OPTIONS.clear()
             QUANT_OPTIONS.append(args.quant)
 
-            run_sweep(args.env, args.num_examples, args.max_tokens, args.size, args.port, args.max_concurrent)
+            run_sweep(args.env, args.num_examples, args.max_tokens, args.size, args.port, args.max_concurrent, **server_options)
 
             # Restore original
             QUANT_OPTIONS.clear()
             QUANT_OPTIONS.extend(original_quant_options)
         else:
-            run_sweep(args.env, args.num_examples, args.max_tokens, args.size, args.port, args.max_concurrent)
+            run_sweep(args.env, args.num_examples, args.max_tokens, args.size, args.port, args.max_concurrent, **server_options)
     except KeyboardInterrupt:
         print("\nSweep interrupted by user")
         sys.exit(1)
@@ -0,0 +1,172 @@
+"""
+Closed-loop load tester for OpenAI-compatible servers (llama-server, the tinygrad proxy).
+
+`concurrency` client threads each send streaming chat completions back to
+back until `num_requests` have been sent. Per request it records time to
+first token (TTFT), end-to-end latency, completion tokens and time per output
+token (TPOT, the decode interval after the first token). The run summary has
+aggregate tokens/s (all completion tokens over wall time), per-request
+tokens/s and latency percentiles.
+
+Requests ask for a fixed number of tokens (ignore_eos, which llama-server
+honours) and each prompt is distinct, so runs at different concurrencies do
+the same work and never hit the prompt cache.
+
+Only the standard library is used, so it runs as-is in Termux.
+
+Usage:
+    python load_test.py --base-url http://localhost:8080/v1 --concurrency 4 --requests 32
+    python load_test.py --base-url http://localhost:8080/v1 --concurrency 8 --max-tokens 256 --json
+"""
+import json
+import time
+import argparse
+import threading
+import statistics
+import http.client
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+MAX_TOKENS = 128
+PROMPT_TOPICS = ["a lighthouse keeper", "the history of tea", "a robot learning to paint", "tidal pools",
+                 "an old train station", "how bridges are built", "a chess tournament", "migrating birds"]
+
+
+def prompt(i: int) -> str:
+    return f"Request {i}: write a detailed story about {PROMPT_TOPICS[i % len(PROMPT_TOPICS)]}."
+
+
+def stream_request(base_url: str, i: int, max_tokens: int = MAX_TOKENS, timeout: float = 600) -> Dict[str, Any]:
+    """Send one streaming chat completion and time it."""
+    body = {
+        "model": "local",
+        "messages": [{"role": "user", "content": prompt(i)}],
+        "max_tokens": max_tokens,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+        "ignore_eos": True,
+    }
+    request = urllib.request.Request(f"{base_url}/chat/completions", data=json.dumps(body).encode(),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    start = time.perf_counter()
+    first: Optional[float] = None
+    chunks, usage_tokens = 0, None
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            for raw in response:
+                line = raw.decode("utf-8", "replace").strip()
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                try:
+                    event = json.loads(line[6:])
+                except json.JSONDecodeError:
+                    continue
+                if (event.get("usage") or {}).get("completion_tokens") is not None:
+                    usage_tokens = event["usage"]["completion_tokens"]
+                for choice in event.get("choices") or []:
+                    if (choice.get("delta") or {}).get("content"):
+                        first = first or time.perf_counter()
+                        chunks += 1
+    except (OSError, http.client.HTTPException) as e:
+        # HTTPException covers a stream cut short mid-response (IncompleteRead)
+        return {"request": i, "error": f"{type(e).__name__}: {e}"}
+    end = time.perf_counter()
+    # llama-server streams one token per chunk; prefer its usage count when it sends one
+    tokens = usage_tokens if usage_tokens is not None else chunks
+    latency = end - start
+    ttft = (first or end) - start
+    return {
+        "request": i,
+        "ttft_s": ttft,
+        "latency_s": latency,
+        "completion_tokens": tokens,
+        "tpot_s": (latency - ttft) / (tokens - 1) if tokens > 1 else None,
+        "tokens_per_sec": tokens / latency if latency > 0 else None,
+        "error": None,
+    }
+
+
+def percentiles(values: List[float], prefix: str) -> Dict[str, Optional[float]]:
+    if not values:
+        return {f"{prefix}_p{p}": None for p in (50, 95, 99)}
+    # "inclusive" interpolates between order statistics like numpy.percentile's default
+    cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else [values[0]] * 99
+    return {f"{prefix}_p{p}": float(cuts[p - 1]) for p in (50, 95, 99)}
+
+
+def summarize(records: List[Dict], wall_s: float, concurrency: int) -> Dict[str, Any]:
+    ok = [r for r in records if not r["error"]]
+    tokens = sum(r["completion_tokens"] for r in ok)
+    per_request = [r["tokens_per_sec"] for r in ok if r["tokens_per_sec"]]
+    return {
+        "concurrency": concurrency,
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "wall_s": wall_s,
+        "completion_tokens": tokens,
+        "aggregate_tokens_per_sec": tokens / wall_s if wall_s > 0 else 0.0,
+        "request_tokens_per_sec": float(statistics.median(per_request)) if per_request else None,
+        **percentiles([r["latency_s"] for r in ok], "latency_s"),
+        **percentiles([r["ttft_s"] for r in ok], "ttft_s"),
+        **percentiles([r["tpot_s"] for r in ok if r["tpot_s"] is not None], "tpot_s"),
+    }
+
+
+def run_load(base_url: str, concurrency: int, num_requests: int, max_tokens: int = MAX_TOKENS,
+             warmup: int = 1) -> Dict[str, Any]:
+    """Drive the server at a fixed concurrency; returns the summary with per-request records under 'records'."""
+    base_url = base_url.rstrip("/")
+    for i in range(warmup):
+        stream_request(base_url, -1 - i, max_tokens=8)
+
+    lock = threading.Lock()
+    next_id = iter(range(num_requests))
+    records: List[Dict] = []
+
+    def client():
+        while True:
+            with lock:
+                i = next(next_id, None)
+            if i is None:
+                return
+            record = stream_request(base_url, i, max_tokens)
+            with lock:
+                records.append(record)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    summary = summarize(records, time.perf_counter() - start, concurrency)
+    summary["records"] = sorted(records, key=lambda r: r["request"])
+    return summary
+
+
+def format_summary(s: Dict[str, Any]) -> str:
+    def ms(v):
+        return f"{v * 1000:.0f}" if v is not None else "-"
+    request_tok_s = s["request_tokens_per_sec"]
+    return (f"c={s['concurrency']:<3} {s['aggregate_tokens_per_sec']:>8.2f} tok/s aggregate, "
+            f"{request_tok_s if request_tok_s is not None else 0:>7.2f} tok/s per request, "
+            f"latency p50/p95 {ms(s['latency_s_p50'])}/{ms(s['latency_s_p95'])} ms, "
+            f"TTFT p95 {ms(s['ttft_s_p95'])} ms, TPOT p95 {ms(s['tpot_s_p95'])} ms"
+            + (f", {s['errors']} errors" if s["errors"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop load test against an OpenAI-compatible server")
+    parser.add_argument("--base-url", "-b", default="http://localhost:8080/v1")
+    parser.add_argument("--concurrency", "-c", type=int, default=1)
+    parser.add_argument("--requests", "-n", type=int, help="Total requests (default: 4 per client)")
+    parser.add_argument("--max-tokens", "-t", type=int, default=MAX_TOKENS)
+    parser.add_argument("--json", action="store_true", help="Print the full summary, per-request records included")
+    args = parser.parse_args()
+
+    summary = run_load(args.base_url, args.concurrency, args.requests or 4 * args.concurrency, args.max_tokens)
+    print(json.dumps(summary, indent=2) if args.json else format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,10 +14,13 @@ import json
 import platform
 import getpass
 import socket
-from typing import Any
+import pathlib
+from typing import Any, Optional
 from itertools import product
 
 from mlc_llm import MLCEngine
+import mlc_weights
+from results_store import ResultsStore
 
 # Benchmark config - matching other benchmarks
 SSEEDS = [("--seed", str(_)) for _ in [42]]
@@ -77,6 +80,14 @@ def config_to_filename_and_metadata(config) -> tuple[str, dict[str, Any]]:
     return filename, metadata
 
 
+def weight_bytes(model_path: str) -> Optional[dict]:
+    """mlc_weights.model_bytes for the model, also looking in the local dist/ by model name."""
+    for model_dir in (pathlib.Path(model_path), mlc_weights.MLC_DIST / pathlib.Path(model_path).name):
+        if (model_dir / mlc_weights.MANIFEST).exists():
+            return mlc_weights.model_bytes(model_dir)
+    return None
+
+
 def run_benchmark(engine, num_tokens: int = 20, num_runs: int = 5) -> list[dict]:
     """Run benchmark and return timing stats."""
     results = []
@@ -157,6 +168,24 @@ def main():
 
             print(f"  Output saved to: {output_path}")
 
+            # Append to the results store using the shared benchmark schema.
+            # GB/s follows the other backends: bytes per decoded token (or all
+            # weight bytes) times tok/s; each run's time includes its prefill
+            weights = weight_bytes(model_path)
+            rows = [{
+                "step": r["run"],
+                "total_latency_ms": r["time_s"] * 1000,
+                "tokens_per_sec": r["tok_per_sec"],
+                "memory_throughput_gb_s": weights["bytes_per_token"] * r["tok_per_sec"] / 1e9 if weights else None,
+                "param_throughput_gb_s": weights["tensor_bytes"] * r["tok_per_sec"] / 1e9 if weights else None,
+                "n_gen": r["tokens"],
+                **metadata["whoami"],
+                **metadata["config"],
+                "uuid": metadata["uuid"],
+            } for r in results]
+            with ResultsStore() as store:
+                store.ingest(rows, "mlc_llm", source=f"mlc_{filename}")
+
             # Cleanup
             del engine
 
@@ -0,0 +1,228 @@
+"""
+MLC weight shards: manifest validation, load throughput and bytes per token.
+
+An MLC model directory's tensor-cache.json lists every params_shard_*.bin with
+its size and md5, and every record (tensor) inside it with shape, dtype,
+nbytes and byteOffset. From it we can:
+
+    validate   check records tile their shard (in bounds, no overlap, nbytes
+               matches shape x dtype) and shard files match size (and md5)
+    load       read all shards sequentially, with a thread per shard, or via
+               mmap page touching, and report GB/s
+    bytes      exact bytes a decoded token reads: every record once, except
+               one row of the embedding when it is not tied to the lm_head
+
+Load results are appended to benchmark_output/mlc_load.jsonl. The page cache
+is dropped per shard with posix_fadvise(DONTNEED) before each cold pass where
+the platform supports it; --warm skips that.
+
+Usage:
+    python mlc_weights.py validate
+    python mlc_weights.py load --method sequential --method threaded --method mmap
+    python mlc_weights.py bytes --model dist/Llama-3.2-1B-Instruct-q4f16_1-MLC
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import socket
+import hashlib
+import pathlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+MLC_DIST = pathlib.Path("dist")
+DEFAULT_MODEL = MLC_DIST / "Llama-3.2-1B-Instruct-q4f16_1-MLC"
+MANIFEST = "tensor-cache.json"
+CHAT_CONFIG = "mlc-chat-config.json"
+LOAD_REPORT = "benchmark_output/mlc_load.jsonl"
+LOAD_METHODS = ("sequential", "threaded", "mmap")
+EMBEDDING_PREFIX = "model.embed_tokens."
+PAGE_SIZE = mmap.PAGESIZE
+READ_CHUNK = 16 << 20
+
+DTYPE_BYTES = {
+    "float32": 4, "float16": 2, "bfloat16": 2, "float64": 8,
+    "int8": 1, "uint8": 1, "int16": 2, "uint16": 2, "int32": 4, "uint32": 4, "int64": 8, "uint64": 8,
+    "e4m3_float8": 1, "e5m2_float8": 1, "bool": 1,
+}
+
+
+def load_manifest(model_dir: pathlib.Path = DEFAULT_MODEL) -> Dict:
+    with open(pathlib.Path(model_dir) / MANIFEST, "r") as f:
+        return json.load(f)
+
+
+def tied_embeddings(model_dir: pathlib.Path = DEFAULT_MODEL) -> bool:
+    path = pathlib.Path(model_dir) / CHAT_CONFIG
+    if not path.exists():
+        return False
+    with open(path, "r") as f:
+        config = json.load(f)
+    return bool(config.get("model_config", {}).get("tie_word_embeddings", False))
+
+
+def validate(model_dir: pathlib.Path = DEFAULT_MODEL, check_md5: bool = False) -> List[str]:
+    """Problems found in the manifest and the shard files; empty if all is consistent.
+
+    Missing shard files are reported but do not stop the record checks.
+    """
+    model_dir = pathlib.Path(model_dir)
+    problems = []
+    for shard in load_manifest(model_dir)["records"]:
+        name, shard_bytes = shard["dataPath"], shard["nbytes"]
+        end = 0
+        for record in sorted(shard["records"], key=lambda r: r["byteOffset"]):
+            where = f"{name}:{record['name']}"
+            if record["byteOffset"] < end:
+                problems.append(f"{where} overlaps the previous record (offset {record['byteOffset']} < {end})")
+            end = record["byteOffset"] + record["nbytes"]
+            if end > shard_bytes:
+                problems.append(f"{where} ends at {end}, past the shard's {shard_bytes} bytes")
+            n_elements = 1
+            for d in record["shape"]:
+                n_elements *= d
+            itemsize = DTYPE_BYTES.get(record["dtype"])
+            if itemsize is None:
+                problems.append(f"{where} has unknown dtype {record['dtype']}")
+            elif n_elements * itemsize != record["nbytes"]:
+                problems.append(f"{where} is {record['nbytes']} bytes, shape {record['shape']} x {record['dtype']} "
+                                f"is {n_elements * itemsize}")
+
+        path = model_dir / name
+        if not path.exists():
+            problems.append(f"{name} is missing")
+            continue
+        size = path.stat().st_size
+        if size != shard_bytes:
+            problems.append(f"{name} is {size} bytes, manifest says {shard_bytes}")
+        elif check_md5 and "md5sum" in shard:
+            h = hashlib.md5()
+            with open(path, "rb") as f:
+                while chunk := f.read(READ_CHUNK):
+                    h.update(chunk)
+            if h.hexdigest() != shard["md5sum"]:
+                problems.append(f"{name} md5 {h.hexdigest()} != {shard['md5sum']}")
+    return problems
+
+
+def model_bytes(model_dir: pathlib.Path = DEFAULT_MODEL) -> Dict:
+    """Total weight bytes and bytes read per decoded token, from the manifest alone."""
+    manifest = load_manifest(model_dir)
+    tied = tied_embeddings(model_dir)
+    total = per_token = 0
+    for shard in manifest["records"]:
+        for record in shard["records"]:
+            total += record["nbytes"]
+            if record["name"].startswith(EMBEDDING_PREFIX) and not tied:
+                # the lookup reads one row (of weights and of scales)
+                per_token += record["nbytes"] // record["shape"][0]
+            else:
+                per_token += record["nbytes"]
+    return {
+        "tensor_bytes": total,
+        "bytes_per_token": per_token,
+        "tied_embeddings": tied,
+        "param_bytes": manifest.get("metadata", {}).get("ParamBytes"),
+        "bits_per_param": manifest.get("metadata", {}).get("BitsPerParam"),
+    }
+
+
+def _drop_cache(path: pathlib.Path):
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def _read_shard(path: pathlib.Path) -> int:
+    buf = bytearray(READ_CHUNK)
+    total = 0
+    with open(path, "rb", buffering=0) as f:
+        while n := f.readinto(buf):
+            total += n
+    return total
+
+
+def _mmap_shard(path: pathlib.Path) -> int:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # one byte per page is enough to fault the whole shard in
+        for i in range(0, len(mm), PAGE_SIZE):
+            mm[i]
+        return len(mm)
+
+
+def load_shards(model_dir: pathlib.Path = DEFAULT_MODEL, method: str = "sequential",
+                threads: Optional[int] = None, cold: bool = True) -> Dict:
+    """Read every shard once with method and return bytes, seconds and GB/s."""
+    model_dir = pathlib.Path(model_dir)
+    paths = [model_dir / shard["dataPath"] for shard in load_manifest(model_dir)["records"]]
+    missing = [p.name for p in paths if not p.exists()]
+    if missing:
+        raise FileNotFoundError(f"{len(missing)} shard(s) missing in {model_dir}, e.g. {missing[0]}")
+    if cold:
+        for p in paths:
+            _drop_cache(p)
+
+    start = time.perf_counter()
+    if method == "sequential":
+        total = sum(_read_shard(p) for p in paths)
+    elif method == "threaded":
+        with ThreadPoolExecutor(threads or min(len(paths), os.cpu_count() or 1)) as pool:
+            total = sum(pool.map(_read_shard, paths))
+    elif method == "mmap":
+        total = sum(_mmap_shard(p) for p in paths)
+    else:
+        raise ValueError(f"unknown load method {method!r}")
+    elapsed = time.perf_counter() - start
+    return {
+        "model": model_dir.name,
+        "method": method,
+        "cold": cold and hasattr(os, "posix_fadvise"),
+        "shards": len(paths),
+        "bytes": total,
+        "seconds": elapsed,
+        "load_gb_s": total / elapsed / 1e9,
+        "hostname": socket.gethostname(),
+        "measured_at": datetime.now().isoformat(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and load MLC weight shards from tensor-cache.json")
+    parser.add_argument("command", choices=["validate", "load", "bytes"])
+    parser.add_argument("--model", type=pathlib.Path, default=DEFAULT_MODEL, help=f"MLC model directory (default: {DEFAULT_MODEL})")
+    parser.add_argument("--md5", action="store_true", help="validate: also check shard md5sums")
+    parser.add_argument("--method", action="append", choices=LOAD_METHODS, help="load: method(s) to time (default: all)")
+    parser.add_argument("--threads", type=int, help="load: threads for the threaded method (default: one per shard, up to cores)")
+    parser.add_argument("--warm", action="store_true", help="load: do not drop the page cache first")
+    args = parser.parse_args()
+
+    if args.command == "validate":
+        problems = validate(args.model, args.md5)
+        for p in problems:
+            print(p)
+        print(f"{args.model}: {'OK' if not problems else f'{len(problems)} problem(s)'}")
+        sys.exit(1 if problems else 0)
+    elif args.command == "bytes":
+        info = model_bytes(args.model)
+        print(f"{args.model}: {info['tensor_bytes'] / 1e6:.1f} MB of weights, {info['bytes_per_token'] / 1e6:.1f} MB/token "
+              f"(tied embeddings: {info['tied_embeddings']}, {info['bits_per_param']:.2f} bits/param)")
+    else:
+        os.makedirs(os.path.dirname(LOAD_REPORT), exist_ok=True)
+        for method in args.method or LOAD_METHODS:
+            result = load_shards(args.model, method, args.threads, cold=not args.warm)
+            print(f"{method:<12} {result['bytes'] / 1e6:>9.1f} MB in {result['seconds']:.2f}s = {result['load_gb_s']:.2f} GB/s"
+                  f"{'' if result['cold'] else ' (warm)'}")
+            with open(LOAD_REPORT, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""
+Model download manager: parallel ranged downloads, resume, SHA256, shared blobs.
+
+Every file is stored once by content in a blob store (~/.cache/t-eai/blobs, or
+$MODEL_STORE) and hardlinked into models/ under its usual name, so several
+checkouts on one host share the same GGUFs. The URL -> SHA256 mapping is kept
+in the store's index.json, so a model already fetched by any checkout is
+linked without touching the network.
+
+Downloads are split into CHUNK_SIZE byte ranges fetched by a thread pool into a
+preallocated .part file; finished chunks are recorded next to it, so an
+interrupted download resumes with the missing chunks only. Servers without
+range support fall back to one stream. The result is hashed and checked against
+the expected SHA256 (MODEL_CONFIGS "sha256", else the X-Linked-ETag
+Hugging Face sends for LFS files) before it enters the store.
+
+`provision` downloads only the f16 model and derives the other quantizations
+with llama.cpp's llama-quantize, several jobs at once under a core budget.
+Outputs are stored like downloads, keyed by (source SHA256, quant type), and
+registered in models/provisioned.json, which defaults.py merges into
+MODEL_CONFIGS; model_path() then quantizes on demand instead of downloading.
+
+`serve` runs a small range-capable HTTP server over a directory, and
+$MODEL_MIRROR points downloads at one (by file name), e.g. to provision a Pixel
+from a desktop on the same network.
+
+Usage:
+    python model_manager.py fetch                        # every quantization in MODEL_CONFIGS
+    python model_manager.py fetch --quantize nf4 --connections 16
+    python model_manager.py provision --cores 8 --jobs 3   # f16 + local Q6_K/Q8_0/Q4_K_M
+    python model_manager.py provision --size 8B --quant-type Q5_K_M   # with models/Llama-3.2-8B-Instruct-f16.gguf in place
+    python model_manager.py serve --dir models --port 8000
+    MODEL_MIRROR=http://desktop:8000 python model_manager.py fetch
+    python model_manager.py list
+"""
+import os
+import re
+import json
+import shutil
+import hashlib
+import pathlib
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from collate import file_sha256
+from defaults import MODEL_DIR, MODEL_CONFIGS, MODEL_URL_SIZE, PROVISIONED_PATH
+
+STORE_DIR = pathlib.Path(os.environ.get("MODEL_STORE", pathlib.Path.home() / ".cache" / "t-eai" / "blobs"))
+CHUNK_SIZE = 32 << 20
+DEFAULT_CONNECTIONS = 8
+PROVISION_SOURCE = "float16"
+MAX_REDIRECTS = 10
+USER_AGENT = "t-eai-model-manager"
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+# Serializes index.json updates between download and quantize threads
+_index_lock = threading.Lock()
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_head_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def probe(url: str) -> Tuple[str, Optional[int], bool, Optional[str]]:
+    """Follow redirects with HEAD requests: (final url, size, ranges supported, sha256 if advertised).
+
+    Redirects are followed by hand because Hugging Face only sends the LFS
+    SHA256 (X-Linked-ETag) on the first, redirecting response.
+    """
+    sha256 = None
+    for _ in range(MAX_REDIRECTS):
+        request = urllib.request.Request(url, method="HEAD", headers={"User-Agent": USER_AGENT})
+        try:
+            response = _head_opener.open(request, timeout=30)
+        except urllib.error.HTTPError as e:
+            if e.code not in (301, 302, 303, 307, 308):
+                raise DownloadError(f"HEAD {url}: HTTP {e.code}") from e
+            etag = (e.headers.get("X-Linked-ETag") or "").strip('"')
+            sha256 = sha256 or (etag if _SHA256_RE.match(etag) else None)
+            url = urllib.request.urljoin(url, e.headers["Location"])
+            continue
+        with response:
+            size = response.headers.get("Content-Length")
+            ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+            return url, int(size) if size else None, ranges, sha256
+    raise DownloadError(f"too many redirects for {url}")
+
+
+def _get(url: str, start: Optional[int] = None, end: Optional[int] = None):
+    headers = {"User-Agent": USER_AGENT}
+    if start is not None:
+        headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60)
+
+
+def _fetch_chunk(url: str, part: pathlib.Path, start: int, end: int):
+    with _get(url, start, end) as response:
+        if response.status != 206:
+            raise DownloadError(f"{url} ignored the range request (HTTP {response.status})")
+        with open(part, "r+b") as f:
+            f.seek(start)
+            shutil.copyfileobj(response, f, 1 << 20)
+            if f.tell() != end + 1:
+                raise DownloadError(f"{url}: short read for bytes {start}-{end}")
+
+
+def _download_ranged(url: str, part: pathlib.Path, size: int, connections: int):
+    state_path = part.with_suffix(".chunks.json")
+    chunks = [(start, min(start + CHUNK_SIZE, size) - 1) for start in range(0, size, CHUNK_SIZE)]
+    done = set()
+    if part.exists() and state_path.exists() and part.stat().st_size == size:
+        state = json.loads(state_path.read_text())
+        if state.get("size") == size and state.get("chunk_size") == CHUNK_SIZE:
+            done = set(state["done"])
+    else:
+        with open(part, "wb") as f:
+            f.truncate(size)
+    todo = [i for i in range(len(chunks)) if i not in done]
+    if done:
+        print(f"  resuming: {len(done)}/{len(chunks)} chunks already downloaded")
+
+    lock = threading.Lock()
+
+    def work(i: int):
+        _fetch_chunk(url, part, *chunks[i])
+        with lock:
+            done.add(i)
+            state_path.write_text(json.dumps({"size": size, "chunk_size": CHUNK_SIZE, "done": sorted(done)}))
+
+    with ThreadPoolExecutor(max(1, min(connections, len(todo)))) as pool:
+        list(pool.map(work, todo))
+    state_path.unlink(missing_ok=True)
+
+
+def _download_stream(url: str, part: pathlib.Path, size: Optional[int]):
+    with _get(url) as response, open(part, "wb") as f:
+        shutil.copyfileobj(response, f, 1 << 20)
+    if size is not None and part.stat().st_size != size:
+        raise DownloadError(f"{url}: got {part.stat().st_size} bytes, expected {size}")
+
+
+def _load_index(store: pathlib.Path) -> Dict[str, str]:
+    path = store / "index.json"
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _update_index(store: pathlib.Path, key: str, sha256: str):
+    """Record key -> sha256, re-reading index.json under the lock so concurrent updates are kept."""
+    with _index_lock:
+        index = _load_index(store)
+        index[key] = sha256
+        with tempfile.NamedTemporaryFile("w", dir=store, prefix="index.", suffix=".tmp", delete=False) as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(f.name, store / "index.json")
+
+
+def blob_path(sha256: str, store: pathlib.Path = STORE_DIR) -> pathlib.Path:
+    return store / "sha256" / sha256[:2] / sha256
+
+
+def link(blob: pathlib.Path, dest: pathlib.Path):
+    """Hardlink blob to dest, copying when they are on different filesystems."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".link")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        shutil.copy2(blob, tmp)
+    os.replace(tmp, dest)
+
+
+def mirror_url(url: str) -> str:
+    mirror = os.environ.get("MODEL_MIRROR")
+    return f"{mirror.rstrip('/')}/{url.rsplit('/', 1)[-1]}" if mirror else url
+
+
+def ensure(url: str, dest: pathlib.Path, sha256: Optional[str] = None, connections: int = DEFAULT_CONNECTIONS,
+           store: pathlib.Path = STORE_DIR) -> pathlib.Path:
+    """Make dest a verified copy of url, downloading into the blob store if needed."""
+    dest = pathlib.Path(dest)
+    store.mkdir(parents=True, exist_ok=True)
+    index = _load_index(store)
+    known = sha256 or index.get(url)
+    if known and blob_path(known, store).exists():
+        if not (dest.exists() and os.path.samefile(dest, blob_path(known, store))):
+            link(blob_path(known, store), dest)
+        return dest
+
+    final_url, size, ranges, advertised = probe(mirror_url(url))
+    expected = sha256 or advertised
+    part = store / "partial" / (hashlib.sha256(url.encode()).hexdigest()[:16] + ".part")
+    part.parent.mkdir(parents=True, exist_ok=True)
+    if ranges and size:
+        print(f"Downloading {url} -> {dest} ({size / 1e6:.1f} MB, {connections} connections)")
+        _download_ranged(final_url, part, size, connections)
+    else:
+        print(f"Downloading {url} -> {dest} (single stream)")
+        _download_stream(final_url, part, size)
+
+    actual = file_sha256(part)
+    if expected and actual != expected:
+        part.unlink()
+        raise DownloadError(f"{url}: SHA256 {actual} does not match expected {expected}")
+    blob = blob_path(actual, store)
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(part, blob)
+    os.chmod(blob, 0o444)
+    _update_index(store, url, actual)
+    link(blob, dest)
+    return dest
+
+
+def source_sha256(path: pathlib.Path, store: pathlib.Path = STORE_DIR) -> str:
+    """SHA256 of a model file, from the store index when it is a linked blob."""
+    for sha in _load_index(store).values():
+        blob = blob_path(sha, store)
+        if blob.exists() and os.path.samefile(blob, path):
+            return sha
+    return file_sha256(path)
+
+
+def build_quantize() -> pathlib.Path:
+    """llama-quantize from the cached llama.cpp build."""
+    from build_cache import build_llamacpp
+    return build_llamacpp(targets=("llama-quantize",)) / "llama-quantize"
+
+
+def quantize_model(source: pathlib.Path, quant_type: str, dest: pathlib.Path, threads: Optional[int] = None,
+                   store: pathlib.Path = STORE_DIR, llama_quantize: Optional[pathlib.Path] = None) -> pathlib.Path:
+    """Make dest the quant_type quantization of source, reusing a cached one for the same source hash.
+
+    llama_quantize is built on demand unless given; concurrent callers must
+    pass it in, since two builds would race on the same build directory.
+    """
+    store.mkdir(parents=True, exist_ok=True)
+    key = f"quantize:{source_sha256(source, store)}:{quant_type}"
+    sha = _load_index(store).get(key)
+    if sha and blob_path(sha, store).exists():
+        link(blob_path(sha, store), dest)
+        return dest
+
+    llama_quantize = llama_quantize or build_quantize()
+    part = store / "partial" / f"{key.split(':')[1][:16]}-{quant_type}.gguf"
+    part.parent.mkdir(parents=True, exist_ok=True)
+    command = [str(llama_quantize), str(source), str(part), quant_type]
+    if threads:
+        command.append(str(threads))
+    print(f"Quantizing {source.name} -> {quant_type} ({threads or 'all'} threads)")
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+
+    sha = file_sha256(part)
+    blob = blob_path(sha, store)
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(part, blob)
+    os.chmod(blob, 0o444)
+    _update_index(store, key, sha)
+    link(blob, dest)
+    return dest
+
+
+def model_path(quantize: str, size: str = "1B", connections: int = DEFAULT_CONNECTIONS,
+               threads: Optional[int] = None) -> pathlib.Path:
+    """Path to the GGUF for a MODEL_CONFIGS quantization key, downloading or quantizing it if necessary."""
+    model_config = MODEL_CONFIGS[quantize]
+    path = MODEL_DIR / f"Llama-3.2-{size}-Instruct-{model_config['suffix']}.gguf"
+    if path.exists() and "sha256" not in model_config:
+        return path
+    if "source" in model_config:
+        source = model_path(model_config["source"], size, connections)
+        return quantize_model(source, model_config["suffix"], path, threads)
+    if size != MODEL_URL_SIZE:
+        # the URLs are for MODEL_URL_SIZE; downloading one under another size's name would mislabel it
+        raise DownloadError(f"no {size} download for {quantize}: MODEL_CONFIGS URLs are {MODEL_URL_SIZE} models, "
+                            f"put {path.name} in {MODEL_DIR} first")
+    return ensure(model_config["url"], path, model_config.get("sha256"), connections)
+
+
+def provision(quant_types: Dict[str, str], size: str = "1B", cores: Optional[int] = None, jobs: int = 2,
+              connections: int = DEFAULT_CONNECTIONS) -> Dict[str, pathlib.Path]:
+    """Download the f16 model once and quantize it to each {config key: quant type}, jobs at a time.
+
+    Each job gets cores // jobs threads. The configs are registered in
+    models/provisioned.json so later runs (and other sizes) quantize locally.
+    Sizes other than MODEL_URL_SIZE need their f16 GGUF in models/ already.
+    """
+    source = model_path(PROVISION_SOURCE, size, connections)
+    llama_quantize = build_quantize()
+    cores = cores or os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(quant_types), cores))
+    threads = max(1, cores // jobs)
+
+    registry = json.loads(PROVISIONED_PATH.read_text()) if PROVISIONED_PATH.exists() else {}
+    for key, quant_type in quant_types.items():
+        registry[key] = {"suffix": quant_type, "source": PROVISION_SOURCE}
+        MODEL_CONFIGS[key] = registry[key]
+    PROVISIONED_PATH.parent.mkdir(parents=True, exist_ok=True)
+    PROVISIONED_PATH.write_text(json.dumps(registry, indent=2, sort_keys=True))
+
+    def job(item):
+        key, quant_type = item
+        dest = MODEL_DIR / f"Llama-3.2-{size}-Instruct-{quant_type}.gguf"
+        return key, quantize_model(source, quant_type, dest, threads, llama_quantize=llama_quantize)
+
+    with ThreadPoolExecutor(jobs) as pool:
+        return dict(pool.map(job, quant_types.items()))
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler with single-range GET support (for mirrors and local testing)."""
+
+    def send_head(self):
+        self._remaining = None
+        range_header = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if not range_header or not os.path.isfile(path):
+            return super().send_head()
+        match = re.match(r"bytes=(\d*)-(\d*)$", range_header.strip())
+        size = os.path.getsize(path)
+        if not match or not (match.group(1) or match.group(2)):
+            self.send_error(416, "Unsupported range")
+            return None
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            start, end = max(0, size - int(match.group(2))), size - 1
+        if start > end or start >= size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.end_headers()
+            return None
+        f = open(path, "rb")
+        f.seek(start)
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        self._remaining = end - start + 1
+        return f
+
+    def end_headers(self):
+        if not self.headers.get("Range"):
+            self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def copyfile(self, source, outputfile):
+        remaining = self._remaining
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining > 0:
+            chunk = source.read(min(1 << 20, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+
+def serve(directory: str, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), partial(RangeRequestHandler, directory=directory))
+    print(f"Serving {directory} on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def list_store(store: pathlib.Path = STORE_DIR) -> List[Tuple[str, str, int]]:
+    index = _load_index(store)
+    return [(url, sha, blob_path(sha, store).stat().st_size) for url, sha in sorted(index.items())
+            if blob_path(sha, store).exists()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download, verify and share GGUF models")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("fetch", help="Download models from MODEL_CONFIGS into models/")
+    p.add_argument("--quantize", action="append", choices=list(MODEL_CONFIGS), help="Quantization key(s) (default: all)")
+    p.add_argument("--size", default="1B")
+    p.add_argument("--connections", type=int, default=DEFAULT_CONNECTIONS, help="Parallel range requests per file")
+    p = sub.add_parser("provision", help="Download the f16 model and quantize the others locally")
+    p.add_argument("--quantize", action="append", choices=[k for k in MODEL_CONFIGS if k != PROVISION_SOURCE],
+                   help="Config key(s) to derive (default: all)")
+    p.add_argument("--quant-type", action="append", default=[],
+                   help="Extra llama-quantize type to derive and register under its own name, e.g. Q5_K_M")
+    p.add_argument("--size", default="1B")
+    p.add_argument("--cores", type=int, help="Core budget shared by all quantize jobs (default: all cores)")
+    p.add_argument("--jobs", type=int, default=2, help="Quantize jobs run in parallel")
+    p.add_argument("--connections", type=int, default=DEFAULT_CONNECTIONS, help="Parallel range requests for the f16 download")
+    p = sub.add_parser("serve", help="Serve a directory with HTTP range support")
+    p.add_argument("--dir", default=str(MODEL_DIR))
+    p.add_argument("--port", type=int, default=8000)
+    sub.add_parser("list", help="List blobs in the store")
+    args = parser.parse_args()
+
+    if args.command == "fetch":
+        for quantize in args.quantize or MODEL_CONFIGS:
+            print(model_path(quantize, args.size, args.connections))
+    elif args.command == "provision":
+        keys = args.quantize or ([] if args.quant_type else [k for k in MODEL_CONFIGS if k != PROVISION_SOURCE])
+        quant_types = {k: MODEL_CONFIGS[k]["suffix"] for k in keys}
+        quant_types.update({t: t for t in args.quant_type})
+        for key, path in provision(quant_types, args.size, args.cores, args.jobs, args.connections).items():
+            print(f"{key:<10} {path}")
+    elif args.command == "serve":
+        serve(args.dir, args.port).serve_forever()
+    else:
+        for url, sha, size in list_store():
+            print(f"{sha[:16]}  {size / 1e6:>9.1f} MB  {url}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Accuracy vs throughput: which quantization to deploy, per workload and device.
+
+Joins verifiers rewards (verifiers_results/*.json, one entry per quantization)
+with decode throughput from the benchmark results (results store or collated
+CSVs) on (host, backend, size, quantization), and computes the Pareto
+frontier of reward against tokens/s, and against joules/token for rows that
+record energy. A config is dominated when another config of the same host and
+environment is at least as good on every axis and better on one; only
+frontier configs are worth deploying.
+
+Throughput is the median steady-state decode rate (tinygrad steady steps,
+llama-bench tg tests). Sweep results written before hostnames were recorded
+are matched to the only host with speed data for that backend/size/quant, and
+skipped when that is ambiguous.
+
+Usage:
+    python pareto.py
+    python pareto.py --env gsm8k --min-reward 0.3     # fastest frontier config with reward >= 0.3
+    python pareto.py --plot                           # plots/pareto_<env>_<host>.png
+"""
+import os
+import csv
+import glob
+import json
+import argparse
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from analysis_engine import MISSING, grouped_stats
+from benchmark_analysis import decode_only, default_config, load_frame, steady_state
+
+VERIFIERS_GLOB = "verifiers_results/*.json"
+OUTPUT_CSV = "benchmark_output/pareto.csv"
+SPEED_KEYS = ["hostname", "backend", "size", "quantize"]
+# (metric, direction) per frontier
+THROUGHPUT_AXES = [("reward", "max"), ("tokens_per_sec", "max")]
+ENERGY_AXES = [("reward", "max"), ("joules_per_token", "min")]
+
+
+def load_accuracy(pattern: str = VERIFIERS_GLOB) -> List[Dict]:
+    """One row per (host, backend, size, quant, environment): the successful run with the most examples, latest first."""
+    best: Dict[Tuple, Dict] = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r") as f:
+            try:
+                entries = json.load(f)
+            except json.JSONDecodeError:
+                continue
+        if not isinstance(entries, list):
+            continue
+        # verifiers_sweep.py (tinygrad) did not record its backend
+        default_backend = "llamacpp" if os.path.basename(path).startswith("llamacpp_") else "tinygrad"
+        for entry in entries:
+            reward = entry.get("metrics", {}).get("reward", {}).get("avg")
+            if entry.get("returncode") != 0 or reward is None:
+                continue
+            row = {
+                "hostname": entry.get("hostname") or MISSING,
+                "backend": entry.get("backend") or default_backend,
+                "size": entry.get("size") or "1B",
+                "quantize": entry.get("quantization") or "default",
+                "environment": entry.get("environment"),
+                "reward": float(reward),
+                "num_examples": entry.get("num_examples") or 0,
+                "timestamp": entry.get("timestamp") or "",
+                "source": os.path.basename(path),
+            }
+            key = tuple(row[k] for k in SPEED_KEYS + ["environment"])
+            current = best.get(key)
+            if current is None or (row["num_examples"], row["timestamp"]) > (current["num_examples"], current["timestamp"]):
+                best[key] = row
+    return list(best.values())
+
+
+def load_speed(**filters) -> Dict[Tuple[str, ...], Dict[str, Optional[float]]]:
+    """Median steady-state decode tokens/s (and joules/token where recorded) per (host, backend, size, quant).
+
+    Only default-config runs count: device/shard/BEAM/build-variant/cold-cache
+    sweeps would otherwise be pooled into the same (host, backend, size, quant) point.
+    """
+    frame = default_config(decode_only(steady_state(load_frame(**filters))))
+    tok_s = grouped_stats(frame, SPEED_KEYS, "tokens_per_sec")
+    energy = grouped_stats(frame, SPEED_KEYS, "joules_per_token")
+    return {
+        key: {"tokens_per_sec": stats["median"],
+              "joules_per_token": energy[key]["median"] if key in energy else None}
+        for key, stats in tok_s.items()
+    }
+
+
+def join(accuracy: List[Dict], speed: Dict[Tuple[str, ...], Dict]) -> List[Dict]:
+    """Accuracy rows with their throughput; rows without a unique speed match are dropped."""
+    joined = []
+    for row in accuracy:
+        key = tuple(row[k] for k in SPEED_KEYS)
+        if key not in speed and row["hostname"] == MISSING:
+            hosts = [k for k in speed if k[1:] == key[1:]]
+            if len(hosts) == 1:
+                key = hosts[0]
+                row = {**row, "hostname": key[0]}
+        if key in speed:
+            joined.append({**row, **speed[key]})
+    return joined
+
+
+def dominates(a: Dict, b: Dict, axes: Sequence[Tuple[str, str]]) -> bool:
+    sign = {"max": 1.0, "min": -1.0}
+    better = [sign[d] * (a[m] - b[m]) for m, d in axes]
+    return all(x >= 0 for x in better) and any(x > 0 for x in better)
+
+
+def frontier(points: List[Dict], axes: Sequence[Tuple[str, str]]) -> Dict[int, List[int]]:
+    """Index of each point -> indices of the points dominating it (empty for the frontier)."""
+    usable = [i for i, p in enumerate(points) if all(p.get(m) is not None for m, _ in axes)]
+    return {i: [j for j in usable if j != i and dominates(points[j], points[i], axes)] for i in usable}
+
+
+def label(point: Dict) -> str:
+    return f"{point['backend']}/{point['size']}/{point['quantize']}"
+
+
+def analyze(points: List[Dict]) -> Dict[Tuple[str, str], List[Dict]]:
+    """Group joined points by (host, environment) and mark frontier membership on each axis pair."""
+    groups: Dict[Tuple[str, str], List[Dict]] = {}
+    for point in points:
+        groups.setdefault((point["hostname"], point["environment"]), []).append(point)
+    for group in groups.values():
+        group.sort(key=lambda p: p["tokens_per_sec"])
+        for name, axes in (("throughput", THROUGHPUT_AXES), ("energy", ENERGY_AXES)):
+            for i, dominators in frontier(group, axes).items():
+                group[i][f"{name}_frontier"] = not dominators
+                group[i][f"{name}_dominated_by"] = ",".join(label(group[j]) for j in dominators)
+    return groups
+
+
+def recommend(group: List[Dict], min_reward: float) -> Optional[Dict]:
+    """Fastest throughput-frontier config whose reward meets min_reward."""
+    ok = [p for p in group if p.get("throughput_frontier") and p["reward"] >= min_reward]
+    return max(ok, key=lambda p: p["tokens_per_sec"]) if ok else None
+
+
+def report(groups: Dict[Tuple[str, str], List[Dict]], min_reward: Optional[float] = None):
+    for (host, env), group in sorted(groups.items()):
+        has_energy = any(p.get("joules_per_token") is not None for p in group)
+        print(f"\n{'='*100}")
+        print(f" PARETO: {env} reward vs decode throughput on {host}")
+        print(f"{'='*100}")
+        print(f"{'Backend / Size / Quant':<28} {'Reward':>8} {'Tok/s':>10} {'J/token':>9} {'N':>5}  Status")
+        print("-" * 100)
+        for p in group:
+            joules = f"{p['joules_per_token']:>9.3f}" if p.get("joules_per_token") is not None else f"{'-':>9}"
+            status = "frontier" if p["throughput_frontier"] else f"dominated by {p['throughput_dominated_by']}"
+            if has_energy and "energy_frontier" in p:
+                status += ", energy frontier" if p["energy_frontier"] else ""
+            print(f"{label(p):<28} {p['reward']:>8.3f} {p['tokens_per_sec']:>10.2f} {joules} {p['num_examples']:>5}  {status}")
+        if min_reward is not None:
+            best = recommend(group, min_reward)
+            print(f"Deploy (reward >= {min_reward}): {label(best) if best else 'no config qualifies'}")
+
+
+def plot(groups: Dict[Tuple[str, str], List[Dict]], output_dir: str = "plots"):
+    import matplotlib.pyplot as plt
+
+    os.makedirs(output_dir, exist_ok=True)
+    for (host, env), group in sorted(groups.items()):
+        fig, ax = plt.subplots(figsize=(8, 6))
+        front = sorted((p for p in group if p["throughput_frontier"]), key=lambda p: p["tokens_per_sec"])
+        dominated = [p for p in group if not p["throughput_frontier"]]
+        ax.scatter([p["tokens_per_sec"] for p in dominated], [p["reward"] for p in dominated],
+                   color="lightgray", edgecolor="gray", label="dominated", zorder=2)
+        ax.plot([p["tokens_per_sec"] for p in front], [p["reward"] for p in front],
+                marker="o", color="tab:blue", label="Pareto frontier", zorder=3)
+        for p in group:
+            ax.annotate(label(p), (p["tokens_per_sec"], p["reward"]), textcoords="offset points", xytext=(5, 5), fontsize=8)
+        ax.set_xlabel("Decode throughput (tokens/s)")
+        ax.set_ylabel(f"{env} reward")
+        ax.set_title(f"Accuracy vs throughput: {env} on {host}")
+        ax.grid(alpha=0.3)
+        ax.legend()
+        path = f"{output_dir}/pareto_{env}_{host}.png"
+        plt.savefig(path, dpi=300, bbox_inches="tight")
+        plt.close(fig)
+        print(f"Saved {path}")
+
+
+def write_csv(groups: Dict[Tuple[str, str], List[Dict]], path: str = OUTPUT_CSV):
+    rows = [p for group in groups.values() for p in group]
+    if not rows:
+        return
+    fields = list(dict.fromkeys(k for row in rows for k in row))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\nWrote {len(rows)} joined configs to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pareto frontier of verifiers reward vs decode throughput")
+    parser.add_argument("--results", default=VERIFIERS_GLOB, help=f"Verifiers sweep results (default: {VERIFIERS_GLOB})")
+    parser.add_argument("--env", action="append", help="Only these verifiers environments")
+    parser.add_argument("--hostname", help="Only this host")
+    parser.add_argument("--min-reward", type=float, help="Recommend the fastest frontier config with at least this reward")
+    parser.add_argument("--plot", action="store_true", help="Write a scatter plot per host and environment to plots/")
+    args = parser.parse_args()
+
+    accuracy = [r for r in load_accuracy(args.results) if not args.env or r["environment"] in args.env]
+    filters = {"hostname": args.hostname} if args.hostname else {}
+    points = join(accuracy, load_speed(**filters))
+    if args.hostname:
+        points = [p for p in points if p["hostname"] == args.hostname]
+    if not points:
+        print(f"No verifiers results could be joined with throughput data ({len(accuracy)} verifiers configs found)")
+        return
+    groups = analyze(points)
+    report(groups, args.min_reward)
+    write_csv(groups)
+    if args.plot:
+        plot(groups)
+
+
+if __name__ == "__main__":
+    main()
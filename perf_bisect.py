@@ -0,0 +1,224 @@
+"""
+Bisect a tokens/sec regression across deps/llama.cpp or deps/tinygrad commits.
+
+Every candidate commit is checked out in its own worktree (and, for llama.cpp,
+built into a per-commit cached build dir, see build_cache.py). It is then run
+with a short, fixed benchmark config. Samples are collected in small batches
+until the bootstrap CI of the median is within --precision of the median, or
+--max-samples is reached. A commit is "bad" when it is significantly slower
+than the good commit by more than --threshold. The binary search reports the
+first bad commit on the first-parent history between good and bad.
+
+A commit whose build or benchmark fails is untestable and skipped, like
+`git bisect skip`: the search tries the nearest testable neighbour instead. If
+skipped commits make the answer ambiguous, the range of possible first bad
+commits is reported and the exit status is 3.
+
+Measurements are cached in benchmark_output/bisect_cache.json, so an
+interrupted bisect resumes without rerunning commits.
+
+Usage:
+    python perf_bisect.py --backend llamacpp --good b4400 --bad b4500
+    python perf_bisect.py --backend llamacpp --good b4400 --bad HEAD --quantize nf4 --threshold 0.03
+    PYTHONPATH=./deps/tinygrad/ python perf_bisect.py --backend tinygrad --good 1a2b3c4 --bad 5d6e7f8
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import tinygrad_parse
+import llamacpp_parse
+from bench_stats import compare, median_ci
+from model_manager import model_path
+import prewarm
+from build_cache import LLAMACPP_REPO, TINYGRAD_REPO, build_llamacpp, checkout, commits_between, describe, resolve
+
+CACHE_PATH = "benchmark_output/bisect_cache.json"
+
+
+def llamacpp_samples(commit: str, quantize: str, size: str, reps: int) -> List[float]:
+    """One llama-bench invocation with reps repetitions; returns tok/s per repetition."""
+    bin_dir = build_llamacpp(commit, targets=("llama-bench",))
+    model = str(model_path(quantize, size))
+    # every commit starts from a resident model, so a cold first build is not blamed
+    prewarm.warm(model)
+    command = [
+        str(bin_dir / "llama-bench"),
+        "-m", model,
+        "-p", "0",
+        "-n", "20",
+        "-r", str(reps),
+        "-o", "jsonl",
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    samples = []
+    for line in result.stdout.splitlines():
+        data = llamacpp_parse.parse_jsonl_metrics(line)
+        if data:
+            samples.extend(data.get("samples_ts", []))
+    return samples
+
+
+def tinygrad_samples(commit: str, quantize: str, size: str, reps: int) -> List[float]:
+    """One llama3.py --benchmark run from a worktree; returns tok/s per steady-state step."""
+    source = checkout(TINYGRAD_REPO, commit)
+    command = [sys.executable, str(source / "examples" / "llama3.py"), "--size", size, "--seed", "42", "--benchmark"]
+    if quantize != "default":
+        command.extend(["--quantize", quantize])
+    env = os.environ.copy()
+    env["PYTHONPATH"] = str(source)
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    rows = tinygrad_parse.label_phases(list(tinygrad_parse.iter_lines(result.stdout.splitlines())))
+    return [r["tokens_per_sec"] for r in tinygrad_parse.steady_rows(rows) if r.get("tokens_per_sec") is not None]
+
+
+RUNNERS = {
+    "llamacpp": (LLAMACPP_REPO, llamacpp_samples),
+    "tinygrad": (TINYGRAD_REPO, tinygrad_samples),
+}
+
+
+def measure(backend: str, commit: str, quantize: str, size: str, precision: float,
+            min_samples: int, max_samples: int, batch: int) -> List[float]:
+    """Sample commit until the median's 95% CI half-width is within precision of the median."""
+    _, run = RUNNERS[backend]
+    samples: List[float] = []
+    while len(samples) < max_samples:
+        new = run(commit, quantize, size, batch)
+        if not new:
+            raise RuntimeError(f"{backend} benchmark at {commit[:12]} produced no samples")
+        samples.extend(new)
+        if len(samples) < min_samples:
+            continue
+        med, lo, hi = median_ci(samples)
+        if med > 0 and (hi - lo) / 2 / med <= precision:
+            break
+    return samples
+
+
+def load_cache(path: str = CACHE_PATH) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_cache(cache: Dict, path: str = CACHE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(cache, f, indent=2)
+
+
+def bisect(backend: str, good: str, bad: str, quantize: str, size: str, threshold: float,
+           precision: float, min_samples: int, max_samples: int, batch: int) -> int:
+    repo, _ = RUNNERS[backend]
+    good, bad = resolve(repo, good), resolve(repo, bad)
+    candidates = commits_between(repo, good, bad)
+    if not candidates:
+        print(f"{bad[:12]} is not a descendant of {good[:12]}")
+        return 2
+
+    cache = load_cache()
+    # failures are not cached, so a resumed bisect retries them
+    skipped: List[str] = []
+
+    def samples_for(commit: str) -> Optional[np.ndarray]:
+        """Cached samples for commit, or None if it cannot be built or benchmarked."""
+        key = f"{backend}|{commit}|{size}|{quantize}"
+        if key not in cache:
+            print(f"Measuring {describe(repo, commit)}")
+            try:
+                cache[key] = measure(backend, commit, quantize, size, precision, min_samples, max_samples, batch)
+            except (subprocess.CalledProcessError, RuntimeError) as e:
+                print(f"  {commit[:12]}: untestable, skipping ({e})")
+                skipped.append(commit)
+                return None
+            save_cache(cache)
+        values = np.asarray(cache[key])
+        print(f"  {commit[:12]}: median {np.median(values):.2f} tok/s (n={values.size})")
+        return values
+
+    reference = samples_for(good)
+    if reference is None:
+        print(f"Good commit {good[:12]} cannot be measured")
+        return 2
+
+    def is_bad(commit: str) -> Optional[bool]:
+        """True/False for a regression, None if the commit is untestable."""
+        values = samples_for(commit)
+        if values is None:
+            return None
+        r = compare(reference, values, statistic="median")
+        regressed = r["significant"] and r["speedup"] < 1 - threshold
+        print(f"  {commit[:12]}: {r['speedup']:.3f}x of good [{r['ci_lo']:.3f}, {r['ci_hi']:.3f}] -> {'bad' if regressed else 'good'}")
+        return regressed
+
+    verdict = is_bad(bad)
+    if verdict is None:
+        print(f"Bad commit {bad[:12]} cannot be measured")
+        return 2
+    if not verdict:
+        print(f"No regression beyond {threshold:.0%} between {good[:12]} and {bad[:12]}")
+        return 1
+
+    # Invariant: candidates[lo] is good (or lo == -1, the good commit), candidates[hi] is bad
+    lo, hi = -1, len(candidates) - 1
+    untestable = set()
+    print(f"Bisecting {len(candidates)} commits (~{max(1, int(np.ceil(np.log2(len(candidates)))))} steps)")
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        # nearest testable neighbour of the midpoint, alternating later/earlier
+        order = sorted(range(lo + 1, hi), key=lambda i: (abs(i - mid), i < mid))
+        probe = next((i for i in order if i not in untestable), None)
+        if probe is None:
+            break
+        verdict = is_bad(candidates[probe])
+        if verdict is None:
+            untestable.add(probe)
+        elif verdict:
+            hi = probe
+        else:
+            lo = probe
+
+    if skipped:
+        print(f"\nSkipped {len(skipped)} untestable commit(s):")
+        for commit in skipped:
+            print(f"  {describe(repo, commit)}")
+    if hi - lo > 1:
+        print(f"\nFirst bad commit is one of these {hi - lo}; untestable commits hide which:")
+        for commit in candidates[lo + 1:hi + 1]:
+            print(f"  {describe(repo, commit)}")
+        return 3
+
+    first_bad = candidates[hi]
+    print(f"\nFirst bad commit: {describe(repo, first_bad)}")
+    print(f"  {repo}: git show {first_bad}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bisect a throughput regression across dependency commits")
+    parser.add_argument("--backend", choices=sorted(RUNNERS), default="llamacpp")
+    parser.add_argument("--good", required=True, help="Known-good commit of the dependency")
+    parser.add_argument("--bad", default="HEAD", help="Known-bad commit of the dependency (default: HEAD)")
+    parser.add_argument("--size", choices=["1B", "8B", "70B", "405B"], default="1B", help="Model size (default: 1B)")
+    parser.add_argument("--quantize", choices=["default", "int8", "nf4", "float16"], default="default", help="Quantization method")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Relative slowdown that counts as bad (default: 0.05)")
+    parser.add_argument("--precision", type=float, default=0.01,
+                        help="Target relative half-width of the median's 95%% CI (default: 0.01)")
+    parser.add_argument("--min-samples", type=int, default=5)
+    parser.add_argument("--max-samples", type=int, default=40)
+    parser.add_argument("--batch", type=int, default=5, help="Repetitions per benchmark invocation (llama.cpp only)")
+    args = parser.parse_args()
+
+    sys.exit(bisect(args.backend, args.good, args.bad, args.quantize, args.size, args.threshold,
+                    args.precision, args.min_samples, args.max_samples, args.batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Page-cache control for model files, so warm and cold runs are chosen rather than accidental.
+
+    warm   posix_fadvise(WILLNEED) to start readahead, then read the file in
+           parallel ranges until it is resident (or just the reads where
+           fadvise does not exist, e.g. macOS)
+    cold   posix_fadvise(DONTNEED) to drop the file's clean pages
+    asis   leave the page cache alone
+
+Residency is measured with mincore(2) on a fresh mapping of the file (through
+ctypes; mapping does not fault pages in), and written into the benchmark
+metadata as page_cache and resident_fraction next to the server's mlock and
+hugepage settings.
+
+Usage:
+    python prewarm.py models/Llama-3.2-1B-Instruct-Q6_K.gguf             # warm + residency
+    python prewarm.py models/*.gguf --state cold
+    python prewarm.py models/*.gguf --state asis                         # residency only
+"""
+import os
+import sys
+import mmap
+import ctypes
+import ctypes.util
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+CACHE_STATES = ("warm", "cold", "asis")
+READ_CHUNK = 8 << 20
+DEFAULT_THREADS = 4
+THP_PATH = "/sys/kernel/mm/transparent_hugepage/enabled"
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+_libc.mmap.restype = ctypes.c_void_p
+_libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+_libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+_libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+_MAP_FAILED = ctypes.c_void_p(-1).value
+
+
+def residency(path: str) -> Optional[float]:
+    """Fraction of path's pages in the page cache, or None where mincore is unavailable."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return 1.0
+    pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        addr = _libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if addr in (None, _MAP_FAILED):
+            return None
+        try:
+            vec = (ctypes.c_ubyte * pages)()
+            if _libc.mincore(addr, size, vec) != 0:
+                return None
+            return sum(b & 1 for b in vec) / pages
+        finally:
+            _libc.munmap(addr, size)
+    finally:
+        os.close(fd)
+
+
+def _read_range(path: str, start: int, end: int):
+    buf = bytearray(READ_CHUNK)
+    with open(path, "rb", buffering=0) as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            n = f.readinto(memoryview(buf)[:min(READ_CHUNK, remaining)])
+            if not n:
+                break
+            remaining -= n
+
+
+def warm(path: str, threads: int = DEFAULT_THREADS):
+    """Pull path into the page cache: fadvise readahead plus parallel reads of equal ranges."""
+    size = os.path.getsize(path)
+    if hasattr(os, "posix_fadvise"):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    step = -(-size // threads)
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda start: _read_range(path, start, min(start + step, size)), range(0, size, step or 1)))
+
+
+def cold(path: str):
+    """Drop path's clean pages from the page cache (a no-op where fadvise is unavailable)."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def prepare(path: str, state: str = "warm", threads: int = DEFAULT_THREADS) -> Dict[str, str]:
+    """Put path into the requested page-cache state; returns metadata lines to record with the run."""
+    if state == "warm":
+        warm(path, threads)
+    elif state == "cold":
+        cold(path)
+    elif state != "asis":
+        raise ValueError(f"unknown page-cache state {state!r}")
+    resident = residency(path)
+    return {
+        "page_cache": state,
+        "resident_fraction": "" if resident is None else f"{resident:.4f}",
+    }
+
+
+def thp_mode() -> str:
+    """The active transparent hugepage mode (always/madvise/never), or '' where it does not apply."""
+    try:
+        with open(THP_PATH, "r") as f:
+            return next((w[1:-1] for w in f.read().split() if w.startswith("[")), "")
+    except OSError:
+        return ""
+
+
+def server_flags(mlock: bool = False, hugepages: bool = False) -> List[str]:
+    """llama-server flags for pinned and/or hugepage-backed weights.
+
+    llama.cpp has no hugepage switch of its own; --no-mmap loads the weights
+    into anonymous memory, which THP backs with huge pages when its mode is
+    'always' (file-backed mmaps mostly are not).
+    """
+    flags = []
+    if mlock:
+        flags.append("--mlock")
+    if hugepages:
+        if thp_mode() != "always":
+            print(f"Warning: transparent hugepages are '{thp_mode() or 'unavailable'}', --hugepages has little effect")
+        flags.append("--no-mmap")
+    return flags
+
+
+def server_metadata(mlock: bool = False, hugepages: bool = False) -> Dict[str, str]:
+    return {
+        "mlock": str(mlock).lower(),
+        "hugepages": thp_mode() if hugepages else "off",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm, drop or inspect model files in the page cache")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--state", choices=CACHE_STATES, default="warm")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="Parallel readers for --state warm")
+    args = parser.parse_args()
+
+    for path in args.files:
+        try:
+            info = prepare(path, args.state, args.threads)
+        except OSError as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            continue
+        print(f"{path}: {args.state}, resident {info['resident_fraction'] or 'unknown'}")
+
+
+if __name__ == "__main__":
+    main()
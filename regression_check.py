@@ -0,0 +1,245 @@
+"""
+Performance regression gate against an explicitly promoted baseline.
+
+Results are grouped per (hostname, backend, size, quantize, test type). The
+test type is "decode" for tinygrad, and "pp<N>" / "tg<N>" for llama-bench
+prompt-processing / text-generation runs. Runs off the default config (another
+device, shards, BEAM, build variant or a cold page cache) get a sixth key part
+such as "beam=4,shards=2", so sweeps are never compared against default runs;
+default-config keys are unchanged. Baselines are stored in
+benchmark_output/baselines.json next to the collated results. They only change
+when `promote` is run.
+
+Only steady-state samples are compared (tinygrad compile/warmup steps are
+dropped). `check` compares the median of each group in the new data to its baseline. A
+group is a regression when the slowdown exceeds the relative threshold and the
+difference is significant (Mann-Whitney U and bootstrap CI, see bench_stats.py).
+The command exits with status 1 if any group regressed.
+
+Usage:
+    python regression_check.py promote --hostname softmacs --since 2025-11-30
+    python regression_check.py check --run uuid1a2b3c4d --threshold 0.05
+    python regression_check.py check --since 2025-12-01 --backend-threshold tinygrad=0.10
+    python regression_check.py show
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from analysis_engine import non_default_config
+from bench_stats import compare
+from results_store import DEFAULT_PATH, ResultsStore
+from tinygrad_parse import steady_rows
+
+BASELINE_PATH = "benchmark_output/baselines.json"
+# Samples kept per baseline group for significance testing
+MAX_BASELINE_SAMPLES = 2000
+
+# Metric -> True if higher is better
+METRICS = {
+    "tokens_per_sec": True,
+    "total_latency_ms": False,
+    "memory_throughput_gb_s": True,
+    "param_throughput_gb_s": True,
+}
+
+KEY_FIELDS = ("hostname", "backend", "size", "quantize", "test")
+
+
+def test_type(row: Dict) -> str:
+    """Classify a result row as decode (tinygrad), or pp<N>/tg<N> for llama-bench."""
+    if row.get("test"):
+        return str(row["test"])
+    n_prompt = int(float(row.get("n_prompt") or 0))
+    n_gen = int(float(row.get("n_gen") or 0))
+    if n_prompt and not n_gen:
+        return f"pp{n_prompt}"
+    if n_gen:
+        return f"tg{n_gen}"
+    return "decode"
+
+
+def group_key(row: Dict) -> str:
+    row = {**row, "test": test_type(row)}
+    parts = [str(row.get(field) or "unknown") for field in KEY_FIELDS]
+    config = non_default_config(row)
+    if config:
+        parts.append(",".join(f"{column}={value}" for column, value in sorted(config.items())))
+    return "|".join(parts)
+
+
+def group_samples(rows: List[Dict], metric: str) -> Dict[str, np.ndarray]:
+    groups: Dict[str, List[float]] = {}
+    for row in steady_rows(rows):
+        value = row.get(metric)
+        if value is None or value == "":
+            continue
+        groups.setdefault(group_key(row), []).append(float(value))
+    return {key: np.asarray(values) for key, values in groups.items()}
+
+
+def load_rows(db: str, runs: Optional[List[str]], **filters) -> List[Dict]:
+    if not os.path.exists(db):
+        print(f"No results store at {db}; run the benchmarks or `python results_store.py import-csv` first")
+        sys.exit(2)
+    with ResultsStore(db) as store:
+        if runs:
+            filters["run_uuid"] = runs
+        return store.rows(**filters)
+
+
+def load_baselines(path: str = BASELINE_PATH) -> Dict:
+    if not os.path.exists(path):
+        return {"groups": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_baselines(baselines: Dict, path: str = BASELINE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def promote(rows: List[Dict], metric: str, path: str = BASELINE_PATH) -> int:
+    """Pin the given rows as the baseline for every group they cover."""
+    baselines = load_baselines(path)
+    samples = group_samples(rows, metric)
+    promoted_at = datetime.now().isoformat()
+    rng = np.random.default_rng(0)
+    for key, values in samples.items():
+        group_rows = [r for r in rows if group_key(r) == key]
+        kept = values if values.size <= MAX_BASELINE_SAMPLES else rng.choice(values, MAX_BASELINE_SAMPLES, replace=False)
+        median = float(np.median(values))
+        baselines["groups"].setdefault(key, {})[metric] = {
+            "median": median,
+            "mad": float(np.median(np.abs(values - median))),
+            "n": int(values.size),
+            "samples": kept.tolist(),
+            "runs": sorted({str(r.get("uuid")) for r in group_rows}),
+            "build_commits": sorted({str(r["build_commit"]) for r in group_rows if r.get("build_commit")}),
+            "promoted_at": promoted_at,
+        }
+    save_baselines(baselines, path)
+    return len(samples)
+
+
+def check(rows: List[Dict], metric: str, threshold: float, backend_thresholds: Dict[str, float],
+          path: str = BASELINE_PATH) -> List[Dict]:
+    """Compare rows to the baseline, returning one result per group."""
+    baselines = load_baselines(path)["groups"]
+    higher_is_better = METRICS[metric]
+    results = []
+    for key, values in sorted(group_samples(rows, metric).items()):
+        backend = key.split("|")[1]
+        limit = backend_thresholds.get(backend, threshold)
+        entry = {"key": key, "n": int(values.size), "median": float(np.median(values)), "threshold": limit}
+        base = baselines.get(key, {}).get(metric)
+        if base is None:
+            results.append({**entry, "status": "NEW"})
+            continue
+
+        r = compare(base["samples"], values, statistic="median")
+        # Relative change in the "good" direction: negative means slower
+        change = (r["speedup"] - 1) if higher_is_better else (1 / r["speedup"] - 1)
+        if r["significant"] and change < -limit:
+            status = "REGRESSION"
+        elif r["significant"] and change > limit:
+            status = "IMPROVED"
+        else:
+            status = "OK"
+        results.append({
+            **entry,
+            "status": status,
+            "baseline_median": base["median"],
+            "change": change,
+            "ci_lo": r["ci_lo"],
+            "ci_hi": r["ci_hi"],
+            "p": r["p_mannwhitney"],
+        })
+    return results
+
+
+def print_diff_table(results: List[Dict], metric: str):
+    print(f"\n{'='*118}")
+    print(f" REGRESSION CHECK: {metric}")
+    print(f"{'='*118}")
+    print(f"{'Host / Backend / Size / Quant / Test':<50} {'Baseline':>10} {'New':>10} {'Change':>9} "
+          f"{'Ratio 95% CI':>16} {'p':>9} {'Status':>11}")
+    print("-" * 118)
+    for r in results:
+        label = r["key"].replace("|", " / ")
+        if r["status"] == "NEW":
+            print(f"{label:<50} {'-':>10} {r['median']:>10.2f} {'-':>9} {'-':>16} {'-':>9} {'NEW':>11}")
+            continue
+        ci = f"[{r['ci_lo']:.3f}, {r['ci_hi']:.3f}]"
+        print(f"{label:<50} {r['baseline_median']:>10.2f} {r['median']:>10.2f} {r['change']:>+8.1%} "
+              f"{ci:>16} {r['p']:>9.3g} {r['status']:>11}")
+
+
+def parse_backend_thresholds(values: List[str]) -> Dict[str, float]:
+    thresholds = {}
+    for value in values or []:
+        backend, _, limit = value.partition("=")
+        thresholds[backend] = float(limit)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check benchmark results against a pinned baseline")
+    parser.add_argument("--db", default=DEFAULT_PATH, help=f"Results store (default: {DEFAULT_PATH})")
+    parser.add_argument("--baselines", default=BASELINE_PATH, help=f"Baseline file (default: {BASELINE_PATH})")
+    parser.add_argument("--metric", default="tokens_per_sec", choices=sorted(METRICS))
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in [("promote", "Pin matching results as the new baseline"),
+                            ("check", "Compare matching results to the baseline")]:
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--run", action="append", help="Run uuid(s) to use (default: all matching rows)")
+        p.add_argument("--backend", action="append")
+        p.add_argument("--hostname", action="append")
+        p.add_argument("--quantize", action="append")
+        p.add_argument("--since", help="ISO date/time lower bound")
+        p.add_argument("--until", help="ISO date/time upper bound")
+        if name == "check":
+            p.add_argument("--threshold", type=float, default=0.05,
+                           help="Relative slowdown that counts as a regression (default: 0.05)")
+            p.add_argument("--backend-threshold", action="append", metavar="BACKEND=THRESHOLD",
+                           help="Per-backend threshold override, e.g. tinygrad=0.10")
+    sub.add_parser("show", help="List pinned baselines")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        for key, metrics in sorted(load_baselines(args.baselines)["groups"].items()):
+            for metric, base in metrics.items():
+                print(f"{key.replace('|', ' / '):<50} {metric:<24} median={base['median']:.2f} "
+                      f"n={base['n']} promoted={base['promoted_at']}")
+        return
+
+    filters = {"backend": args.backend, "hostname": args.hostname, "quantize": args.quantize,
+               "since": args.since, "until": args.until}
+    rows = load_rows(args.db, args.run, **filters)
+    if not rows:
+        print("No matching results")
+        sys.exit(2)
+
+    if args.command == "promote":
+        count = promote(rows, args.metric, args.baselines)
+        print(f"Promoted {count} baseline group(s) for {args.metric} -> {args.baselines}")
+        return
+
+    results = check(rows, args.metric, args.threshold, parse_backend_thresholds(args.backend_threshold), args.baselines)
+    print_diff_table(results, args.metric)
+    regressions = [r for r in results if r["status"] == "REGRESSION"]
+    print(f"\n{len(results)} group(s) checked, {len(regressions)} regression(s)")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Append-only SQLite store for benchmark results.
+
+Every benchmark runner writes its parsed rows here directly, and the analysis,
+plot and visualization scripts read typed columns back out instead of
+re-parsing benchmark_output/*.txt into CSVs of strings.
+
+Schema:
+    runs     one row per benchmark run (keyed by run uuid), ingestion is idempotent
+    samples  one row per measured step, with typed core columns and indices on
+             (backend, hostname, quantize) and created_at; backend-specific
+             fields that have no column of their own are kept in `extra` as JSON
+
+Usage:
+    python results_store.py import-csv                       # import benchmark_output/{tinygrad,llamacpp,mlc_llm}.csv
+    python results_store.py query --backend llamacpp --hostname softmacs
+    python results_store.py query --quantize nf4 --since 2025-11-01
+"""
+import os
+import csv
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+DEFAULT_PATH = "benchmark_output/results.db"
+
+# Column name -> SQLite type. New columns can be appended here; existing
+# databases pick them up through ALTER TABLE on open.
+COLUMNS = {
+    "run_uuid": "TEXT",
+    "backend": "TEXT",
+    "created_at": "REAL",
+    "step": "INTEGER",
+    "enqueue_latency_ms": "REAL",
+    "total_latency_ms": "REAL",
+    "tokens_per_sec": "REAL",
+    "memory_throughput_gb_s": "REAL",
+    "param_throughput_gb_s": "REAL",
+    "generated_text": "TEXT",
+    "platform": "TEXT",
+    "release": "TEXT",
+    "device": "TEXT",
+    "username": "TEXT",
+    "hostname": "TEXT",
+    "size": "TEXT",
+    "quantize": "TEXT",
+    "seed": "INTEGER",
+    "build_commit": "TEXT",
+    "extra": "TEXT",
+    "test": "TEXT",
+    "build_variant": "TEXT",
+    "compiler": "TEXT",
+    "phase": "TEXT",
+    "time_to_ready_ms": "REAL",
+    "shards": "INTEGER",
+    "shard_topology": "TEXT",
+    "page_cache": "TEXT",
+    "resident_fraction": "REAL",
+    "joules_per_token": "REAL",
+    "beam": "INTEGER",
+    "default_device": "TEXT",
+}
+
+INDICES = {
+    "idx_samples_group": ("backend", "hostname", "quantize"),
+    "idx_samples_time": ("created_at",),
+    "idx_samples_run": ("run_uuid",),
+}
+
+# Backend name -> collated CSV written by the *_collate.py scripts
+BACKEND_CSVS = {
+    "tinygrad": "benchmark_output/tinygrad.csv",
+    "llamacpp": "benchmark_output/llamacpp.csv",
+    "mlc_llm": "benchmark_output/mlc_llm.csv",
+}
+
+_CASTS = {"REAL": float, "INTEGER": lambda v: int(float(v)), "TEXT": str}
+
+
+def _cast(value, sql_type: str):
+    if value is None or value == "":
+        return None
+    try:
+        return _CASTS[sql_type](value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultsStore:
+    """Typed, append-only results store backed by a single SQLite file."""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        columns = ", ".join(f"{name} {sql_type}" for name, sql_type in COLUMNS.items())
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS samples ({columns})")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "run_uuid TEXT PRIMARY KEY, backend TEXT, hostname TEXT, created_at REAL, source TEXT, num_rows INTEGER)"
+        )
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(samples)")}
+        for name, sql_type in COLUMNS.items():
+            if name not in existing:
+                self.conn.execute(f"ALTER TABLE samples ADD COLUMN {name} {sql_type}")
+                # rows ingested before the column existed kept the field in extra
+                if "extra" in existing:
+                    self.conn.execute(f"UPDATE samples SET {name} = json_extract(extra, '$.{name}') WHERE extra IS NOT NULL")
+        for name, cols in INDICES.items():
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON samples ({', '.join(cols)})")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def has_run(self, run_uuid: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM runs WHERE run_uuid = ?", (run_uuid,)).fetchone() is not None
+
+    def delete_run(self, run_uuid: str) -> int:
+        """Remove a run and its samples, so a re-parsed log can be ingested again. Returns samples deleted."""
+        with self.conn:
+            deleted = self.conn.execute("DELETE FROM samples WHERE run_uuid = ?", (run_uuid,)).rowcount
+            self.conn.execute("DELETE FROM runs WHERE run_uuid = ?", (run_uuid,))
+        return deleted
+
+    def ingest(self, rows: Iterable[Dict], backend: str, source: str = "", created_at: Optional[float] = None) -> int:
+        """Append parsed benchmark rows. Runs already in the store are skipped.
+
+        Rows are grouped into runs by their `uuid` field. Returns the number of
+        sample rows written.
+        """
+        created_at = time.time() if created_at is None else created_at
+        by_run: Dict[str, List[Dict]] = {}
+        for row in rows:
+            by_run.setdefault(str(row.get("uuid") or f"{source}:{backend}"), []).append(row)
+
+        names = list(COLUMNS)
+        insert = f"INSERT INTO samples ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+        written = 0
+        with self.conn:
+            for run_uuid, run_rows in by_run.items():
+                if self.has_run(run_uuid):
+                    continue
+                values = []
+                for row in run_rows:
+                    record = {"run_uuid": run_uuid, "backend": backend, "created_at": created_at}
+                    extra = {}
+                    for key, value in row.items():
+                        if key == "uuid":
+                            continue
+                        if key in COLUMNS and key not in record:
+                            record[key] = _cast(value, COLUMNS[key])
+                        elif key not in COLUMNS and value not in (None, ""):
+                            extra[key] = value
+                    record["extra"] = json.dumps(extra) if extra else None
+                    values.append(tuple(record.get(name) for name in names))
+                self.conn.executemany(insert, values)
+                first = run_rows[0]
+                self.conn.execute(
+                    "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                    (run_uuid, backend, first.get("hostname"), created_at, source, len(values)),
+                )
+                written += len(values)
+        return written
+
+    def _where(self, backend=None, hostname=None, quantize=None, since=None, until=None,
+               include_summary: bool = False, **filters) -> tuple[str, list]:
+        clauses, params = [], []
+        for name, value in [("backend", backend), ("hostname", hostname), ("quantize", quantize), *filters.items()]:
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                clauses.append(f"{name} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"{name} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(_to_timestamp(since))
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(_to_timestamp(until))
+        if not include_summary:
+            # llama-bench summary rows are stored with step 0
+            clauses.append("(step IS NULL OR step != 0)")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, columns: Optional[Sequence[str]] = None, **filters) -> Dict[str, list]:
+        """Return the selected columns as a dict of equal-length lists.
+
+        Filters: backend, hostname, quantize (value or list of values), since and
+        until (unix time, datetime or ISO date string), include_summary, and any
+        other column name as an equality filter.
+        """
+        columns = list(columns or [c for c in COLUMNS if c != "extra"])
+        where, params = self._where(**filters)
+        cursor = self.conn.execute(f"SELECT {', '.join(columns)} FROM samples{where}", params)
+        rows = cursor.fetchall()
+        if not rows:
+            return {name: [] for name in columns}
+        return {name: list(values) for name, values in zip(columns, zip(*rows))}
+
+    def rows(self, **filters) -> List[Dict]:
+        """Return matching samples as dicts, with `extra` fields merged back in."""
+        names = list(COLUMNS)
+        where, params = self._where(**filters)
+        results = []
+        for values in self.conn.execute(f"SELECT {', '.join(names)} FROM samples{where}", params):
+            row = dict(zip(names, values))
+            extra = row.pop("extra")
+            if extra:
+                row.update(json.loads(extra))
+            row["uuid"] = row["run_uuid"]
+            results.append(row)
+        return results
+
+    def distinct(self, column: str, **filters) -> List:
+        where, params = self._where(**filters)
+        return [r[0] for r in self.conn.execute(f"SELECT DISTINCT {column} FROM samples{where} ORDER BY 1", params)]
+
+
+def _to_timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+def load_results(backend: str, csv_path: Optional[str] = None, store_path: str = DEFAULT_PATH, **filters) -> List[Dict]:
+    """Load one backend's rows, preferring the results store over the collated CSV.
+
+    Summary rows (llama-bench step 0) are excluded from either source unless
+    include_summary is set, matching ResultsStore.query.
+    """
+    if os.path.exists(store_path):
+        with ResultsStore(store_path) as store:
+            rows = store.rows(backend=backend, **filters)
+        if rows:
+            return rows
+    csv_path = csv_path or BACKEND_CSVS.get(backend)
+    if not csv_path or not os.path.exists(csv_path):
+        return []
+    with open(csv_path, "r") as f:
+        rows = list(csv.DictReader(f))
+    if filters.get("include_summary"):
+        return rows
+    return [row for row in rows if str(row.get("step", "")).strip() not in ("0", "0.0")]
+
+
+def import_csvs(store: ResultsStore, csv_paths: Dict[str, str] = BACKEND_CSVS) -> int:
+    """Import collated CSVs, using the CSV mtime as the ingestion time."""
+    total = 0
+    for backend, path in csv_paths.items():
+        if not os.path.exists(path):
+            continue
+        with open(path, "r") as f:
+            rows = list(csv.DictReader(f))
+        written = store.ingest(rows, backend, source=path, created_at=os.path.getmtime(path))
+        print(f"  {backend}: {written} rows from {path}")
+        total += written
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark results store")
+    parser.add_argument("--db", default=DEFAULT_PATH, help=f"Store path (default: {DEFAULT_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("import-csv", help="Import collated CSVs from benchmark_output/")
+    query = sub.add_parser("query", help="Summarize matching samples")
+    query.add_argument("--backend", action="append")
+    query.add_argument("--hostname", action="append")
+    query.add_argument("--quantize", action="append")
+    query.add_argument("--since", help="ISO date/time lower bound")
+    query.add_argument("--until", help="ISO date/time upper bound")
+    args = parser.parse_args()
+
+    with ResultsStore(args.db) as store:
+        if args.command == "import-csv":
+            print(f"Importing into {args.db}...")
+            print(f"Imported {import_csvs(store)} rows")
+            return
+
+        data = store.query(
+            ["backend", "hostname", "quantize", "tokens_per_sec"],
+            backend=args.backend, hostname=args.hostname, quantize=args.quantize,
+            since=args.since, until=args.until,
+        )
+        groups: Dict[tuple, List[float]] = {}
+        for backend, hostname, quant, tps in zip(data["backend"], data["hostname"], data["quantize"], data["tokens_per_sec"]):
+            if tps is not None:
+                groups.setdefault((backend, hostname, quant), []).append(tps)
+        print(f"{'Backend':<10} {'Host':<20} {'Quant':<10} {'N':>8} {'Mean tok/s':>12}")
+        print("-" * 64)
+        for (backend, hostname, quant), values in sorted(groups.items(), key=lambda kv: tuple(str(k) for k in kv[0])):
+            print(f"{backend:<10} {str(hostname):<20} {str(quant):<10} {len(values):>8} {sum(values) / len(values):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Roofline analysis: measured decode throughput against the host's memory-bandwidth bound.
+
+Decode streams every weight once per generated token, so a host that sustains
+B bytes/s cannot exceed B / bytes_per_token tokens/s. The bandwidth comes from
+a STREAM-style copy/triad microbenchmark plus a read-only reduction (NumPy, one
+thread per core, each on its own first-touched arrays); the bound is the best
+of the three. It runs once per host and is cached in
+benchmark_output/host_bandwidth.json.
+
+Bytes per token:
+    llamacpp   bytes a decoded token reads from the row's GGUF (models/), from
+               its tensor table via gguf_reader
+    tinygrad   memory_throughput_gb_s / tokens_per_sec, i.e. the bytes tinygrad
+               itself reports reading per step
+    mlc_llm    the same ratio; mlc_benchmark derives it from tensor-cache.json
+               via mlc_weights
+
+Usage:
+    python roofline.py                        # report for every host with a cached bandwidth
+    python roofline.py --measure              # (re)measure this host's bandwidth
+    python roofline.py --measure --threads 8 --size-mb 1024
+"""
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import gguf_reader
+from results_store import load_results
+
+CACHE_PATH = "benchmark_output/host_bandwidth.json"
+BACKENDS = ["tinygrad", "llamacpp", "mlc_llm"]
+# Total bytes per STREAM array; must be well above the last-level cache
+DEFAULT_SIZE_MB = 512
+DEFAULT_REPEATS = 5
+# Elements per triad block: the a = b + s*c temporary stays in L2
+BLOCK = 1 << 16
+TRIAD_SCALAR = 3.0
+
+
+def _stream_worker(n: int, repeats: int, start_barrier) -> Dict[str, List[float]]:
+    # Allocate and first-touch inside the worker so pages land on its NUMA node
+    a = np.ones(n)
+    b = np.full(n, 2.0)
+    c = np.zeros(n)
+    tmp = np.empty(min(BLOCK, n))
+    times = {"copy": [], "triad": [], "read": []}
+    for _ in range(repeats):
+        start_barrier.wait()
+        t0 = time.perf_counter()
+        np.copyto(c, a)
+        times["copy"].append(time.perf_counter() - t0)
+
+        start_barrier.wait()
+        t0 = time.perf_counter()
+        for i in range(0, n, BLOCK):
+            j = min(i + BLOCK, n)
+            t = tmp[:j - i]
+            np.multiply(c[i:j], TRIAD_SCALAR, out=t)
+            np.add(b[i:j], t, out=a[i:j])
+        times["triad"].append(time.perf_counter() - t0)
+
+        # read-only, like streaming weights during decode
+        start_barrier.wait()
+        t0 = time.perf_counter()
+        b.max()
+        times["read"].append(time.perf_counter() - t0)
+    return times
+
+
+def measure_bandwidth(threads: Optional[int] = None, size_mb: int = DEFAULT_SIZE_MB,
+                      repeats: int = DEFAULT_REPEATS) -> Dict:
+    """Copy, triad and read bandwidth in GB/s (best of repeats, STREAM byte counting).
+
+    bandwidth_gb_s, the roofline bound, is the best of the three.
+    """
+    if threads is None:
+        threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    n = max(BLOCK, size_mb * 1_000_000 // 8 // threads)
+    barrier = threading.Barrier(threads)
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(lambda _: _stream_worker(n, repeats, barrier), range(threads)))
+
+    total = n * threads * 8
+    bandwidth = {}
+    for kernel, arrays in (("copy", 2), ("triad", 3), ("read", 1)):
+        # a repeat is only as fast as its slowest thread
+        per_repeat = [max(r[kernel][k] for r in results) for k in range(repeats)]
+        bandwidth[f"{kernel}_gb_s"] = arrays * total / min(per_repeat) / 1e9
+    bandwidth["bandwidth_gb_s"] = max(bandwidth.values())
+    return {
+        **bandwidth,
+        "threads": threads,
+        "array_mb": total / 1e6,
+        "measured_at": datetime.now().isoformat(),
+    }
+
+
+def load_cache(path: str = CACHE_PATH) -> Dict[str, Dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def host_bandwidth(hostname: Optional[str] = None, refresh: bool = False, path: str = CACHE_PATH, **kwargs) -> Optional[Dict]:
+    """Cached bandwidth for hostname; measured (and cached) when it is this host and missing or refresh is set."""
+    this_host = socket.gethostname()
+    hostname = hostname or this_host
+    cache = load_cache(path)
+    if hostname in cache and not refresh:
+        return cache[hostname]
+    if hostname != this_host:
+        return None
+    print(f"Measuring memory bandwidth on {hostname}...")
+    cache[hostname] = measure_bandwidth(**kwargs)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(cache, f, indent=2)
+    return cache[hostname]
+
+
+@lru_cache(maxsize=None)
+def gguf_bytes(quantize: str, size: str = "1B") -> Optional[int]:
+    path = gguf_reader.model_path_for(quantize, size)
+    if path is None:
+        return None
+    try:
+        return gguf_reader.model_info(path)["bytes_per_token"]
+    except gguf_reader.GGUFError:
+        return None
+
+
+def bytes_per_token(backend: str, row: Dict) -> Optional[float]:
+    """Bytes streamed per decoded token for one result row, or None if unknown."""
+    if backend == "llamacpp":
+        return gguf_bytes(row.get("quantize") or "default", row.get("size") or "1B")
+    try:
+        gb_s, tok_s = float(row["memory_throughput_gb_s"]), float(row["tokens_per_sec"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return gb_s * 1e9 / tok_s if tok_s > 0 and gb_s > 0 else None
+
+
+def annotate(rows: List[Dict], backend: str, bandwidths: Dict[str, Dict]) -> List[Dict]:
+    """Add model_bytes, roofline_tok_s and roofline_efficiency to rows whose host bandwidth is known."""
+    for row in rows:
+        bw = bandwidths.get(row.get("hostname"))
+        model_bytes = bytes_per_token(backend, row)
+        if bw is None or not model_bytes:
+            continue
+        max_tok_s = bw["bandwidth_gb_s"] * 1e9 / model_bytes
+        row["model_bytes"] = model_bytes
+        row["roofline_tok_s"] = max_tok_s
+        row["roofline_efficiency"] = float(row["tokens_per_sec"]) / max_tok_s
+    return rows
+
+
+def report(backends: List[str], bandwidths: Dict[str, Dict]):
+    print(f"\n{'='*100}")
+    print(" ROOFLINE: median decode tokens/sec vs memory-bandwidth bound")
+    print(f"{'='*100}")
+    print(f"{'Backend / Host / Quant':<40} {'Bound GB/s':>10} {'MB/token':>10} {'Max tok/s':>10} {'Tok/s':>10} {'Efficiency':>11}")
+    print("-" * 100)
+    for backend in backends:
+        groups: Dict[tuple, List[Dict]] = {}
+        for row in annotate(load_results(backend), backend, bandwidths):
+            if "roofline_tok_s" in row and row.get("phase") in (None, "", "steady") and (row.get("test") or "tg").startswith("tg"):
+                groups.setdefault((row.get("hostname"), row.get("quantize") or "default"), []).append(row)
+        for (host, quant), rows in sorted(groups.items()):
+            tok_s = float(np.median([float(r["tokens_per_sec"]) for r in rows]))
+            model_bytes = float(np.median([r["model_bytes"] for r in rows]))
+            max_tok_s = bandwidths[host]["bandwidth_gb_s"] * 1e9 / model_bytes
+            print(f"{backend + ' / ' + host + ' / ' + quant:<40} {bandwidths[host]['bandwidth_gb_s']:>10.1f} "
+                  f"{model_bytes / 1e6:>10.1f} {max_tok_s:>10.1f} {tok_s:>10.2f} {tok_s / max_tok_s:>10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare decode throughput to the host memory-bandwidth roofline")
+    parser.add_argument("--measure", action="store_true", help="Measure (or re-measure) this host's bandwidth")
+    parser.add_argument("--threads", type=int, help="STREAM threads (default: usable cores)")
+    parser.add_argument("--size-mb", type=int, default=DEFAULT_SIZE_MB, help=f"Bytes per array in MB (default: {DEFAULT_SIZE_MB})")
+    parser.add_argument("--backend", action="append", choices=BACKENDS, help="Backends to report (default: all)")
+    args = parser.parse_args()
+
+    if args.measure:
+        bw = host_bandwidth(refresh=True, threads=args.threads, size_mb=args.size_mb)
+        print(f"copy {bw['copy_gb_s']:.1f} GB/s, triad {bw['triad_gb_s']:.1f} GB/s, read {bw['read_gb_s']:.1f} GB/s "
+              f"({bw['threads']} threads)")
+    bandwidths = load_cache()
+    if not bandwidths:
+        print(f"No cached bandwidths in {CACHE_PATH}; run with --measure on each host")
+        return
+    report(args.backend or BACKENDS, bandwidths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Checkpoints for sweeps: one cached result per completed configuration.
+
+A configuration's key is the SHA256 of its config, the model file's hash, the
+backend's build commit and the hostname, so a re-quantized model or a new
+llama.cpp/tinygrad checkout re-runs it, while anything already finished is
+skipped on restart.
+Each entry is one JSON file under benchmark_output/run_cache/<namespace>/,
+written atomically as soon as its configuration finishes. Entries whose result
+is not valid (e.g. a failed run) are re-run.
+
+Usage:
+    python run_cache.py list
+    python run_cache.py list --namespace llamacpp_sweep
+    python run_cache.py clear --namespace tinygrad_benchmark
+"""
+import os
+import json
+import time
+import socket
+import hashlib
+import pathlib
+import argparse
+import subprocess
+from typing import Any, Callable, Dict, Iterator, Optional
+
+RUN_CACHE_DIR = pathlib.Path("benchmark_output/run_cache")
+
+
+def model_hash(path: str) -> str:
+    """SHA256 of a model file (cached by gguf_reader for GGUFs, so only hashed once per file)."""
+    import gguf_reader
+    from collate import file_sha256
+    try:
+        return gguf_reader.model_info(path)["sha256"]
+    except gguf_reader.GGUFError:
+        return file_sha256(path)
+
+
+def build_commit(repo: pathlib.Path) -> str:
+    """HEAD commit of a dependency checkout, or 'unknown' if it is not a git checkout."""
+    from build_cache import resolve
+    try:
+        return resolve(repo)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return "unknown"
+
+
+class RunCache:
+    """Completed configurations of one sweep (namespace), keyed by config + model hash + build commit + host."""
+
+    def __init__(self, namespace: str, root: pathlib.Path = RUN_CACHE_DIR, enabled: bool = True):
+        self.dir = pathlib.Path(root) / namespace
+        self.enabled = enabled
+        self._fields: Dict[str, Dict[str, Any]] = {}
+
+    def key(self, config: Dict[str, Any], model_hash: Optional[str] = None, build_commit: Optional[str] = None) -> str:
+        fields = {"config": config, "model_hash": model_hash, "build_commit": build_commit,
+                  "hostname": socket.gethostname()}
+        key = hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+        self._fields[key] = fields
+        return key
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.dir / f"{key}.json"
+
+    def get(self, key: str, valid: Callable[[Any], bool] = lambda result: True) -> Optional[Any]:
+        """The cached result for key, or None if missing, disabled or not valid."""
+        if not self.enabled or not self._path(key).exists():
+            return None
+        with open(self._path(key), "r") as f:
+            result = json.load(f)["result"]
+        return result if valid(result) else None
+
+    def put(self, key: str, result: Any):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        entry = {"key": key, **self._fields.get(key, {}), "completed_at": time.time(), "result": result}
+        tmp = self._path(key).with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(entry, f, indent=2, default=str)
+        os.replace(tmp, self._path(key))
+
+    def entries(self) -> Iterator[Dict[str, Any]]:
+        for path in sorted(self.dir.glob("*.json")):
+            with open(path, "r") as f:
+                yield json.load(f)
+
+    def clear(self) -> int:
+        paths = list(self.dir.glob("*.json"))
+        for path in paths:
+            path.unlink()
+        return len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear sweep checkpoints")
+    parser.add_argument("command", choices=["list", "clear"])
+    parser.add_argument("--namespace", help="Sweep to act on (default: all)")
+    args = parser.parse_args()
+
+    namespaces = [args.namespace] if args.namespace else sorted(p.name for p in RUN_CACHE_DIR.glob("*") if p.is_dir())
+    for namespace in namespaces:
+        cache = RunCache(namespace)
+        if args.command == "clear":
+            print(f"{namespace}: removed {cache.clear()} entries")
+            continue
+        for entry in cache.entries():
+            config = " ".join(f"{k}={v}" for k, v in sorted(entry["config"].items()))
+            print(f"{namespace:<20} {entry['key'][:12]}  {(entry['build_commit'] or '-')[:12]:<12} "
+                  f"{(entry['model_hash'] or '-')[:12]:<12} {config}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Drain server subprocess output into a rotating log file and extract performance metrics.
+
+llama-server and the tinygrad server write a steady stream of log lines. If a
+sweep starts them with stdout=subprocess.PIPE and never reads the pipe, the
+child blocks on write once the ~64 KB pipe buffer is full. LogDrain reads the
+pipe on a background thread, writes every line to disk, and parses the lines
+we care about (load time, buffer sizes, per-request timings) as they arrive.
+
+Usage:
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    drain = LogDrain(proc, "verifiers_results/logs/server.log")
+    drain.start()
+    ...
+    drain.join()
+    metrics = drain.summary()
+"""
+import re
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+# llama.cpp: "load_tensors:   CPU_Mapped model buffer size =  1252.41 MiB"
+MODEL_BUFFER_RE = re.compile(r"model buffer size\s*=\s*(\d+\.?\d*)\s*MiB")
+# llama.cpp: "llama_kv_cache:        CPU KV buffer size =   256.00 MiB"
+KV_BUFFER_RE = re.compile(r"KV buffer size\s*=\s*(\d+\.?\d*)\s*MiB")
+# llama.cpp: "llama_perf_context_print:        load time =     512.34 ms"
+LOAD_TIME_RE = re.compile(r"\bload time\s*=\s*(\d+\.?\d*)\s*ms")
+# llama.cpp server, once per request:
+#   "prompt eval time =      35.12 ms /    10 tokens (    3.51 ms per token,   284.72 tokens per second)"
+#   "       eval time =     523.11 ms /    32 tokens (   16.35 ms per token,    61.17 tokens per second)"
+EVAL_TIME_RE = re.compile(
+    r"(prompt eval|eval) time\s*=\s*(\d+\.?\d*)\s*ms\s*/\s*(\d+)\s*(?:tokens|runs)"
+    r"(?:.*?(\d+\.?\d*)\s*tokens per second)?"
+)
+# tinygrad llama3.py: "loaded weights in 1234.56 ms, 2.47 GB loaded at 2.00 GB/s"
+TINYGRAD_LOAD_RE = re.compile(r"loaded weights in\s+(\d+\.?\d*)\s+ms(?:,\s*(\d+\.?\d*)\s+GB loaded at\s+(\d+\.?\d*)\s+GB/s)?")
+# llama.cpp "server is listening", bottle "Listening on http://..."
+READY_RE = re.compile(r"server is listening|Listening on http", re.IGNORECASE)
+
+
+class ServerMetrics:
+    """Accumulates performance metrics parsed from server log lines."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready_after_s: Optional[float] = None
+        self.load_time_ms: Optional[float] = None
+        self.weights_gb: Optional[float] = None
+        self.weights_load_gb_s: Optional[float] = None
+        self.model_buffer_mib = 0.0
+        self.kv_cache_mib = 0.0
+        self.requests: List[Dict] = []
+        self._pending: Dict = {}
+        self._lock = threading.Lock()
+
+    def feed(self, line: str):
+        """Parse a single log line, updating the accumulated metrics."""
+        with self._lock:
+            self._feed(line)
+
+    def _feed(self, line: str):
+        if self.ready_after_s is None and READY_RE.search(line):
+            self.ready_after_s = time.time() - self.started_at
+            return
+
+        m = EVAL_TIME_RE.search(line)
+        if m:
+            kind = "prompt_eval" if m.group(1) == "prompt eval" else "eval"
+            if kind in self._pending:
+                self._flush_request()
+            self._pending[kind] = {
+                "ms": float(m.group(2)),
+                "tokens": int(m.group(3)),
+                "tokens_per_sec": float(m.group(4)) if m.group(4) else None,
+            }
+            if kind == "eval":
+                self._flush_request()
+            return
+
+        if '"timings"' in line:
+            timings = self._parse_timings(line)
+            if timings:
+                self.requests.append(timings)
+            return
+
+        m = MODEL_BUFFER_RE.search(line)
+        if m:
+            self.model_buffer_mib += float(m.group(1))
+            return
+
+        m = KV_BUFFER_RE.search(line)
+        if m:
+            self.kv_cache_mib += float(m.group(1))
+            return
+
+        m = LOAD_TIME_RE.search(line)
+        if m:
+            self.load_time_ms = float(m.group(1))
+            return
+
+        m = TINYGRAD_LOAD_RE.search(line)
+        if m:
+            self.load_time_ms = float(m.group(1))
+            if m.group(2):
+                self.weights_gb = float(m.group(2))
+                self.weights_load_gb_s = float(m.group(3))
+
+    def _flush_request(self):
+        request = {}
+        for kind, values in self._pending.items():
+            for key, value in values.items():
+                request[f"{kind}_{key}"] = value
+        if request:
+            self.requests.append(request)
+        self._pending = {}
+
+    @staticmethod
+    def _parse_timings(line: str) -> Optional[Dict]:
+        """Pull a llama-server `timings` object out of a logged JSON response."""
+        start = line.find("{")
+        if start < 0:
+            return None
+        try:
+            data = json.loads(line[start:])
+        except json.JSONDecodeError:
+            return None
+        timings = data.get("timings") if isinstance(data, dict) else None
+        if not isinstance(timings, dict):
+            return None
+        return {
+            "prompt_eval_ms": timings.get("prompt_ms"),
+            "prompt_eval_tokens": timings.get("prompt_n"),
+            "prompt_eval_tokens_per_sec": timings.get("prompt_per_second"),
+            "eval_ms": timings.get("predicted_ms"),
+            "eval_tokens": timings.get("predicted_n"),
+            "eval_tokens_per_sec": timings.get("predicted_per_second"),
+        }
+
+    def summary(self) -> Dict:
+        """Return a JSON-serializable summary of everything parsed so far."""
+        with self._lock:
+            if self._pending:
+                self._flush_request()
+            requests = list(self.requests)
+
+        def total(key: str) -> float:
+            return sum(r.get(key) or 0 for r in requests)
+
+        eval_ms, eval_tokens = total("eval_ms"), total("eval_tokens")
+        prompt_ms, prompt_tokens = total("prompt_eval_ms"), total("prompt_eval_tokens")
+        return {
+            "ready_after_s": self.ready_after_s,
+            "load_time_ms": self.load_time_ms,
+            "weights_gb": self.weights_gb,
+            "weights_load_gb_s": self.weights_load_gb_s,
+            "model_buffer_mib": self.model_buffer_mib or None,
+            "kv_cache_mib": self.kv_cache_mib or None,
+            "num_requests": len(requests),
+            "prompt_tokens_per_sec": prompt_tokens / prompt_ms * 1000 if prompt_ms > 0 else None,
+            "eval_tokens_per_sec": eval_tokens / eval_ms * 1000 if eval_ms > 0 else None,
+            "requests": requests,
+        }
+
+
+class LogDrain(threading.Thread):
+    """Background reader for a subprocess's stdout.
+
+    Every line goes to a size-rotated log file and through ServerMetrics.
+    The thread exits by itself when the process closes its stdout.
+    """
+
+    def __init__(self, proc, log_path: str, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 3, echo: bool = False):
+        super().__init__(daemon=True)
+        self.proc = proc
+        self.log_path = Path(log_path)
+        self.echo = echo
+        self.metrics = ServerMetrics()
+
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self._handler = RotatingFileHandler(self.log_path, maxBytes=max_bytes, backupCount=backup_count)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger = logging.getLogger(f"server_logs.{self.log_path}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(self._handler)
+
+    def run(self):
+        try:
+            for raw in iter(self.proc.stdout.readline, b""):
+                line = raw.decode("utf-8", errors="replace") if isinstance(raw, bytes) else raw
+                line = line.rstrip("\n")
+                if not line:
+                    continue
+                self._logger.info(line)
+                self.metrics.feed(line)
+                if self.echo:
+                    print(line)
+        except (ValueError, OSError):
+            # stdout was closed underneath us
+            pass
+        finally:
+            self._logger.removeHandler(self._handler)
+            self._handler.close()
+
+    def summary(self) -> Dict:
+        summary = self.metrics.summary()
+        summary["log_path"] = str(self.log_path)
+        return summary
@@ -0,0 +1,322 @@
+"""
+Tune llama-server flags for throughput under a latency SLO, per host and quantization.
+
+The search space is threads, batch and ubatch size, parallel slots, context
+per slot, flash attention and KV cache type. Configurations are compared by
+successive halving: a random sample of configs each gets a short load test
+(load_test.py at concurrency = parallel slots), the better half survives, and
+the survivors are measured again with twice the requests, until one is left.
+A config is feasible when its p95 TTFT and p95 TPOT are within the limits.
+Feasible configs rank by aggregate tokens/s, infeasible ones by how far they
+miss the SLO.
+
+Every measurement is checkpointed in the run cache (config + budget, model
+hash, llama.cpp commit, host), so an interrupted tune resumes. The winner and
+finalists per host/size/quant are kept in benchmark_output/server_tuner.json.
+Re-tuning after a hardware or build change seeds the first round with them.
+`llamacpp_benchmark.py --port 8080 --tuned` starts the server with the winner.
+
+Usage:
+    python server_tuner.py --quant nf4 --tpot-p95 0.1 --ttft-p95 2
+    python server_tuner.py --configs 24 --eta 3 --max-tokens 64
+    python server_tuner.py --show
+"""
+import os
+import json
+import math
+import random
+import argparse
+import platform
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import load_test
+import prewarm
+import run_cache
+from build_cache import LLAMACPP_REPO
+from model_manager import model_path as get_model_path
+from llamacpp_sweep import QUANT_OPTIONS, BACKEND_PORT, start_server, stop_server, wait_for_server
+
+TUNED_PATH = "benchmark_output/server_tuner.json"
+LLAMA_SERVER = "./deps/llama.cpp/build/bin/llama-server"
+DEFAULT_CONFIGS = 16
+DEFAULT_ETA = 2
+MIN_REQUESTS = 2
+MAX_TOKENS = 64
+FINALISTS = 4
+
+
+def search_space(cpus: Optional[int] = None) -> Dict[str, List]:
+    cpus = cpus or (len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1)
+    return {
+        "threads": sorted({max(1, cpus // 2), max(1, cpus - 1), cpus}),
+        "batch": [512, 1024, 2048],
+        "ubatch": [128, 256, 512],
+        "parallel": [1, 2, 4, 8],
+        "slot_ctx": [1024, 2048, 4096],
+        "flash_attn": ["off", "on"],
+        "cache_type": ["f16", "q8_0", "q4_0"],
+    }
+
+
+def valid(config: Dict[str, Any]) -> bool:
+    # llama.cpp needs flash attention for a quantized V cache
+    return config["ubatch"] <= config["batch"] and (config["cache_type"] == "f16" or config["flash_attn"] == "on")
+
+
+def server_flags(config: Dict[str, Any]) -> List[str]:
+    """llama-server flags for a config (the context is split evenly across the parallel slots)."""
+    return [
+        "--threads", str(config["threads"]),
+        "--batch-size", str(config["batch"]),
+        "--ubatch-size", str(config["ubatch"]),
+        "--parallel", str(config["parallel"]),
+        "--ctx-size", str(config["parallel"] * config["slot_ctx"]),
+        "--flash-attn", config["flash_attn"],
+        "--cache-type-k", config["cache_type"],
+        "--cache-type-v", config["cache_type"],
+    ]
+
+
+def describe(config: Dict[str, Any]) -> str:
+    return (f"t{config['threads']} b{config['batch']} ub{config['ubatch']} np{config['parallel']} "
+            f"ctx{config['slot_ctx']} fa={config['flash_attn']} kv={config['cache_type']}")
+
+
+def format_result(summary: Dict[str, Any]) -> str:
+    if summary.get("errors") and not summary.get("completion_tokens"):
+        return "failed"
+    ms = lambda v: f"{v * 1000:.0f}" if v is not None else "-"
+    return (f"{summary['aggregate_tokens_per_sec']:>8.2f} tok/s, p95 TTFT {ms(summary.get('ttft_s_p95'))} ms, "
+            f"p95 TPOT {ms(summary.get('tpot_s_p95'))} ms")
+
+
+def sample_configs(space: Dict[str, List], n: int, seeds: List[Dict] = (), rng: random.Random = None) -> List[Dict]:
+    """n distinct valid configs: the seeds that still fit the space first, then random ones."""
+    rng = rng or random.Random(0)
+    in_space = lambda c: set(c) == set(space) and all(c[k] in space[k] for k in space) and valid(c)
+    configs = [dict(c) for c in seeds if in_space(c)][:n]
+    total = math.prod(len(v) for v in space.values())
+    attempts = 0
+    while len(configs) < n and attempts < 100 * n:
+        attempts += 1
+        config = {k: rng.choice(v) for k, v in space.items()}
+        if valid(config) and config not in configs:
+            configs.append(config)
+        if len(configs) >= total:
+            break
+    return configs
+
+
+def rank_key(summary: Dict[str, Any], ttft_p95: Optional[float], tpot_p95: Optional[float]):
+    """Sort key (higher is better): feasible configs by aggregate tokens/s, the rest by relative SLO miss."""
+    if summary.get("errors") or not summary.get("completion_tokens"):
+        return (0, -math.inf)
+    excess = 0.0
+    for limit, value in ((ttft_p95, summary.get("ttft_s_p95")), (tpot_p95, summary.get("tpot_s_p95"))):
+        if limit and value is not None and value > limit:
+            excess += value / limit - 1
+    return (1, summary["aggregate_tokens_per_sec"]) if excess == 0 else (0, -excess)
+
+
+def feasible(summary: Dict[str, Any], ttft_p95: Optional[float], tpot_p95: Optional[float]) -> bool:
+    return rank_key(summary, ttft_p95, tpot_p95)[0] == 1
+
+
+def measure(config: Dict[str, Any], model_path, requests_per_slot: int, max_tokens: int, port: int,
+            cache: run_cache.RunCache, model_hash: str, commit: str) -> Dict[str, Any]:
+    """One short load test of config at concurrency = its parallel slots (cached)."""
+    key = cache.key({"config": config, "requests_per_slot": requests_per_slot, "max_tokens": max_tokens},
+                    model_hash, commit)
+    cached = cache.get(key, valid=lambda r: r["completion_tokens"] > 0)
+    if cached is not None:
+        return cached
+    # several configs are measured within a second, so the config is part of the name
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    slug = describe(config).replace("=", "").replace(" ", "_")
+    log_path = Path("benchmark_output") / "logs" / f"server_tuner_{Path(model_path).stem}_{slug}_{timestamp}.log"
+    server_proc, drain = start_server(model_path, port, log_path, server_flags(config))
+    try:
+        if not wait_for_server(port, timeout=180):
+            # e.g. a flag this build does not know: llama-server exits right away
+            summary = {"errors": 1, "completion_tokens": 0, "aggregate_tokens_per_sec": 0.0}
+        else:
+            summary = load_test.run_load(f"http://localhost:{port}/v1", config["parallel"],
+                                         requests_per_slot * config["parallel"], max_tokens)
+            summary.pop("records")
+    finally:
+        stop_server(server_proc, drain)
+    summary["server_metrics"] = drain.summary()
+    if summary["completion_tokens"] > 0:
+        cache.put(key, summary)
+    return summary
+
+
+def successive_halving(configs: List[Dict], evaluate, eta: int = DEFAULT_ETA, min_requests: int = MIN_REQUESTS,
+                       ttft_p95: Optional[float] = None, tpot_p95: Optional[float] = None) -> List[Dict]:
+    """Keep the best 1/eta of the configs each round while multiplying the per-slot requests by eta.
+
+    evaluate(config, requests_per_slot) returns a load-test summary. Stops once
+    a round would leave a single config, since measuring it alone decides
+    nothing. Returns every round's entries, each round sorted best first.
+    """
+    history, survivors, requests, round_ = [], list(configs), min_requests, 0
+    while survivors:
+        entries = []
+        for config in survivors:
+            summary = evaluate(config, requests)
+            entries.append({"round": round_, "requests_per_slot": requests, "config": config, "summary": summary})
+            print(f"  round {round_} {describe(config):<48} {format_result(summary)}"
+                  + ("" if feasible(summary, ttft_p95, tpot_p95) else "  (misses SLO)"))
+        entries.sort(key=lambda e: rank_key(e["summary"], ttft_p95, tpot_p95), reverse=True)
+        history.extend(entries)
+        if len(entries) // eta <= 1:
+            break
+        survivors = [e["config"] for e in entries[:len(entries) // eta]]
+        requests *= eta
+        round_ += 1
+    return history
+
+
+def best_entry(history: List[Dict], ttft_p95: Optional[float], tpot_p95: Optional[float]) -> Optional[Dict]:
+    """The top entry of the latest round with a feasible config (later rounds measured longer)."""
+    for round_ in sorted({e["round"] for e in history}, reverse=True):
+        top = next(e for e in history if e["round"] == round_)
+        if feasible(top["summary"], ttft_p95, tpot_p95):
+            return top
+    return None
+
+
+def load_tuned(path: str = TUNED_PATH) -> Dict[str, Dict]:
+    """Tuned entries by tuned_key; a missing or unreadable file counts as nothing tuned."""
+    try:
+        with open(path, "r") as f:
+            tuned = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Ignoring unreadable {path}: {e}")
+        return {}
+    if not isinstance(tuned, dict):
+        return {}
+    # entries whose config lacks a flag (hand-edited, or from an older search space) are skipped
+    return {key: entry for key, entry in tuned.items() if isinstance(entry, dict) and is_complete(entry.get("config"))}
+
+
+def is_complete(config) -> bool:
+    return isinstance(config, dict) and set(search_space(1)) <= set(config)
+
+
+def save_tuned(tuned: Dict[str, Dict], path: str = TUNED_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(tuned, f, indent=2)
+    os.replace(tmp, path)
+
+
+def tuned_key(quant: str, size: str, hostname: Optional[str] = None) -> str:
+    return f"{hostname or platform.node()}/{size}/{quant}"
+
+
+def tuned_flags(quant: str, size: str = "1B", path: str = TUNED_PATH) -> List[str]:
+    """The tuned llama-server flags for this host, size and quant, or [] if it has not been tuned."""
+    entry = load_tuned(path).get(tuned_key(quant, size))
+    return server_flags(entry["config"]) if entry else []
+
+
+def tune(quant: str, size: str = "1B", num_configs: int = DEFAULT_CONFIGS, eta: int = DEFAULT_ETA,
+         min_requests: int = MIN_REQUESTS, max_tokens: int = MAX_TOKENS, ttft_p95: Optional[float] = None,
+         tpot_p95: Optional[float] = None, port: int = BACKEND_PORT, seed: int = 0, fresh: bool = False,
+         path: str = TUNED_PATH) -> Optional[Dict[str, Any]]:
+    """Tune one quantization on this host; stores and returns the winner (None if nothing met the SLO)."""
+    model_path = get_model_path(quant, size)
+    model_hash = run_cache.model_hash(str(model_path))
+    commit = run_cache.build_commit(LLAMACPP_REPO)
+    cache = run_cache.RunCache("server_tuner", enabled=not fresh)
+    prewarm.prepare(str(model_path), "warm")
+
+    previous = load_tuned(path).get(tuned_key(quant, size))
+    seeds = [c for c in [previous["config"], *previous.get("finalists", [])] if is_complete(c)] if previous else []
+    if previous:
+        print(f"Seeding with the previous winner and finalists (tuned at {previous.get('tuned_at')}, "
+              f"build {(previous.get('build_commit') or '')[:12]})")
+    configs = sample_configs(search_space(), num_configs, seeds, random.Random(seed))
+    print(f"Tuning {size}/{quant}: {len(configs)} configs, eta {eta}, "
+          f"SLO p95 TTFT <= {ttft_p95 or '-'} s, p95 TPOT <= {tpot_p95 or '-'} s")
+
+    history = successive_halving(
+        configs, lambda config, requests: measure(config, model_path, requests, max_tokens, port, cache, model_hash, commit),
+        eta, min_requests, ttft_p95, tpot_p95)
+    best = best_entry(history, ttft_p95, tpot_p95)
+    if best is None:
+        print(f"No configuration met the SLO for {size}/{quant}")
+        return None
+
+    # finalists: the runners-up, latest rounds first, for seeding the next tune
+    ranked = sorted(history, key=lambda e: (e["round"], rank_key(e["summary"], ttft_p95, tpot_p95)), reverse=True)
+    finalists = []
+    for entry in ranked:
+        if entry["config"] != best["config"] and entry["config"] not in finalists:
+            finalists.append(entry["config"])
+    winner = {
+        "config": best["config"],
+        "command": " ".join([LLAMA_SERVER, "-m", str(model_path), "--host", "0.0.0.0", "--port", str(port),
+                             *server_flags(best["config"])]),
+        "summary": best["summary"],
+        "slo": {"ttft_p95_s": ttft_p95, "tpot_p95_s": tpot_p95},
+        "max_tokens": max_tokens,
+        "model_hash": model_hash,
+        "build_commit": commit,
+        "tuned_at": datetime.now().isoformat(),
+        "finalists": finalists[:FINALISTS],
+    }
+    # re-read: other quantizations may have been tuned while this one ran
+    tuned = load_tuned(path)
+    tuned[tuned_key(quant, size)] = winner
+    save_tuned(tuned, path)
+    return winner
+
+
+def show(path: str = TUNED_PATH):
+    for key, entry in sorted(load_tuned(path).items()):
+        s = entry.get("summary") or {}
+        print(f"{key}: {s.get('aggregate_tokens_per_sec') or 0:.2f} tok/s, p95 TTFT {s.get('ttft_s_p95') or 0:.3f} s, "
+              f"p95 TPOT {s.get('tpot_s_p95') or 0:.3f} s (build {(entry.get('build_commit') or '')[:12]}, {entry.get('tuned_at')})")
+        print(f"  {entry.get('command') or ' '.join(server_flags(entry['config']))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune llama-server flags for throughput under a latency SLO")
+    parser.add_argument("--quant", action="append", choices=QUANT_OPTIONS, help="Quantizations to tune (default: all)")
+    parser.add_argument("--size", default="1B", choices=["1B", "8B", "70B", "405B"])
+    parser.add_argument("--ttft-p95", type=float, help="p95 time to first token limit in seconds")
+    parser.add_argument("--tpot-p95", type=float, help="p95 time per output token limit in seconds")
+    parser.add_argument("--configs", type=int, default=DEFAULT_CONFIGS, help=f"Configs in the first round (default: {DEFAULT_CONFIGS})")
+    parser.add_argument("--eta", type=int, default=DEFAULT_ETA, help=f"Keep 1/eta of the configs per round (default: {DEFAULT_ETA})")
+    parser.add_argument("--min-requests", type=int, default=MIN_REQUESTS, help=f"Requests per slot in the first round (default: {MIN_REQUESTS})")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS, help=f"Tokens per request (default: {MAX_TOKENS})")
+    parser.add_argument("--port", type=int, default=BACKEND_PORT)
+    parser.add_argument("--seed", type=int, default=0, help="Seed for sampling configs")
+    parser.add_argument("--fresh", action="store_true", help="Ignore cached measurements (see run_cache.py)")
+    parser.add_argument("--show", action="store_true", help="Print the tuned configurations and exit")
+    args = parser.parse_args()
+
+    if args.show:
+        show()
+        return
+    if args.eta < 2:
+        parser.error("--eta must be at least 2")
+    if not (args.ttft_p95 or args.tpot_p95):
+        print("Warning: no --ttft-p95/--tpot-p95 given, tuning for throughput alone")
+    for quant in args.quant or QUANT_OPTIONS:
+        winner = tune(quant, args.size, args.configs, args.eta, args.min_requests, args.max_tokens, args.ttft_p95,
+                      args.tpot_p95, args.port, args.seed, args.fresh)
+        if winner:
+            print(f"\nBest for {tuned_key(quant, args.size)}: {winner['summary']['aggregate_tokens_per_sec']:.2f} tok/s")
+            print(f"  {winner['command']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import hashlib
+import threading
+
+import pytest
+
+import model_manager
+from model_manager import DownloadError, blob_path, ensure, serve
+
+
+@pytest.fixture
+def server(tmp_path):
+    """RangeRequestHandler serving tmp_path/www on a free local port."""
+    www = tmp_path / "www"
+    www.mkdir()
+    httpd = serve(str(www), 0, host="127.0.0.1")
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield www, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def model(server, monkeypatch):
+    """A 1 MiB file served in 64 KiB chunks, with its URL and SHA256."""
+    www, base = server
+    data = os.urandom(1 << 20)
+    (www / "model.gguf").write_bytes(data)
+    monkeypatch.setattr(model_manager, "CHUNK_SIZE", 64 << 10)
+    monkeypatch.delenv("MODEL_MIRROR", raising=False)
+    return f"{base}/model.gguf", data, hashlib.sha256(data).hexdigest()
+
+
+def test_resume_after_failure(model, tmp_path, monkeypatch):
+    url, data, sha256 = model
+    store, dest = tmp_path / "store", tmp_path / "models" / "model.gguf"
+    fetch_chunk = model_manager._fetch_chunk
+    fetched, failed = [], []
+
+    def flaky(url, part, start, end):
+        fetched.append(start)
+        if start == 5 * model_manager.CHUNK_SIZE and not failed:
+            failed.append(start)
+            raise DownloadError("injected failure")
+        fetch_chunk(url, part, start, end)
+
+    monkeypatch.setattr(model_manager, "_fetch_chunk", flaky)
+    with pytest.raises(DownloadError, match="injected"):
+        ensure(url, dest, connections=4, store=store)
+    assert not dest.exists()
+
+    # chunks still queued when one fails are cancelled, so only the finished ones are kept
+    finished = set(fetched) - set(failed)
+    assert finished
+    fetched.clear()
+    ensure(url, dest, connections=4, store=store)
+    assert failed[0] in fetched
+    assert not finished & set(fetched)
+    assert len(finished) + len(fetched) == len(data) // model_manager.CHUNK_SIZE
+    assert dest.read_bytes() == data
+    assert os.path.samefile(dest, blob_path(sha256, store))
+
+
+def test_bad_sha256_is_rejected(model, tmp_path):
+    url, _, _ = model
+    store, dest = tmp_path / "store", tmp_path / "models" / "model.gguf"
+    with pytest.raises(DownloadError, match="does not match"):
+        ensure(url, dest, sha256="0" * 64, connections=2, store=store)
+    assert not dest.exists()
+    assert not list((store / "partial").glob("*.part"))
+    assert not (store / "sha256").exists()
+
+
+def test_checkouts_share_one_blob(model, tmp_path, monkeypatch):
+    url, data, sha256 = model
+    store = tmp_path / "store"
+    first, second = tmp_path / "a" / "models" / "model.gguf", tmp_path / "b" / "models" / "model.gguf"
+    ensure(url, first, connections=2, store=store)
+
+    def offline(url):
+        raise AssertionError(f"{url} should come from the store index")
+
+    monkeypatch.setattr(model_manager, "probe", offline)
+    ensure(url, second, store=store)
+    assert os.path.samefile(first, second)
+    assert os.path.samefile(second, blob_path(sha256, store))
+    assert second.read_bytes() == data
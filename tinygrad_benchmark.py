@@ -1,38 +1,68 @@
 """
 PYTHONPATH=./deps/tinygrad/ python tinygrad_benchmark.py
 PYTHONPATH=./deps/tinygrad/ python tinygrad_benchmark.py --port 7776 --size 1B --quantize int8
+PYTHONPATH=./deps/tinygrad/ python tinygrad_benchmark.py --port 7776 --device LLVM
+PYTHONPATH=./deps/tinygrad/ python tinygrad_benchmark.py --port 7776 --shard 4
+PYTHONPATH=./deps/tinygrad/ python tinygrad_benchmark.py --beam 4 --kernel-cache /shared/kernel_cache
 """
 import os
+import json
+import time
 import uuid
+import hashlib
 import argparse
+import platform
 import subprocess
 from typing import List, Any
 from itertools import product, chain
 
+import roofline
+import run_cache
+from build_cache import TINYGRAD_REPO
+import tinygrad_parse
+from results_store import ResultsStore
+
 # variables from examples/llama3.py
 AVAILABLE_MODELS    = [ None ]
 AVAILABLE_SIZES     = [("--size", _) for _ in ["1B", "8B", "70B", "405B"]]
-# --shard is skipped
+AVAILABLE_SHARDS    = [()] + [("--shard", str(_)) for _ in [2, 4, 8, 16]]
 # --temperature is skipped
 AVAILABLE_QUANTS    = [()] + [("--quantize", _) for _ in ["int8", "nf4", "float16"]] # fp8 disabled due to lack of hardware support
+# tinygrad CPU backends and the environment that selects each one; () keeps tinygrad's own default.
+# CPU_LLVM is the CPU device with the LLVM compiler instead of clang (newer tinygrad, where CLANG became CPU)
+DEVICE_ENVS         = {"CPU": {"CPU": "1"}, "CLANG": {"CLANG": "1"}, "LLVM": {"LLVM": "1"}, "CPU_LLVM": {"CPU": "1", "CPU_LLVM": "1"}}
+AVAILABLE_DEVICES   = [()] + [("--device", _) for _ in DEVICE_ENVS]
+# compiler behind each device, queried for its version and recorded in the metadata
+DEVICE_COMPILERS    = {"CPU": ["clang", "--version"], "CLANG": ["clang", "--version"],
+                       "LLVM": ["llvm-config", "--version"], "CPU_LLVM": ["llvm-config", "--version"]}
 
 # variables to sweep over
 SSEEDS  = [("--seed", str(_)) for _ in [42]]
 SSIZES  = [("--size", _) for _ in ["1B"]]
 SQUANTS = [()] + [("--quantize", _) for _ in ["int8", "nf4", "float16"]]
+SDEVICES = [()] + [("--device", _) for _ in ["CLANG", "LLVM"]]
+SSHARDS = [()] + [("--shard", _) for _ in ["2", "4"]]
 
 # SLEN    = [20] -- number of output tokens
 # SINPUT  = ["some string to pass in, or file to pass in, to test prefill"]
 
-SVARS   = [SSEEDS, SSIZES, SQUANTS]
+SVARS   = [SSEEDS, SSIZES, SQUANTS, SDEVICES, SSHARDS]
+# sweep variables applied through the environment instead of llama3.py flags
+ENV_VARS = {"--device"}
+
+# BEAM kernel search (--beam): persistent tinygrad CACHEDBs per hardware id, and the speedup/cost report
+DEFAULT_BEAM        = 4
+KERNEL_CACHE_DIR    = "kernel_cache"
+BEAM_REPORT         = "benchmark_output/beam_report.jsonl"
 
 def whoami():
-  import platform
   import getpass
   import socket
   from tinygrad.device import Device
   return {
     "platform": platform.system(), "release": platform.release(), "device": str(Device.default),
+    # device is overridden for --device runs; this keeps the host default for comparison
+    "default_device": str(Device.default),
     "username": getpass.getuser(), "hostname": socket.gethostname()
   }
 
@@ -44,6 +74,70 @@ def is_subset(a: List, b: List) -> bool:
 
 assert is_subset(SSIZES,    AVAILABLE_SIZES)
 assert is_subset(SQUANTS,   AVAILABLE_QUANTS)
+assert is_subset(SDEVICES,  AVAILABLE_DEVICES)
+assert is_subset(SSHARDS,   AVAILABLE_SHARDS)
+
+def shard_affinity(shards: int) -> list[int] | None:
+  """Cores a sharded run is pinned to: an equal, contiguous slice per shard of the cores this process may use.
+
+  tinygrad's CPU:0..N-1 shard devices live in one process, so a process-wide
+  affinity mask is the only pinning available from outside; which shard runs
+  on which of these cores is left to the OS. Unsharded runs are not pinned (None).
+  """
+  if shards <= 1:
+    return None
+  cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+  per_shard = max(1, len(cores) // shards)
+  return cores[:per_shard * shards]
+
+def format_cores(cores: list[int]) -> str:
+  """e.g. [0, 1, 2, 3, 8, 9] -> '0-3,8-9'"""
+  ranges, start = [], cores[0]
+  for prev, cur in zip(cores, cores[1:] + [None]):
+    if cur is None or cur != prev + 1:
+      ranges.append(f"{start}-{prev}" if prev != start else str(start))
+      start = cur
+  return ",".join(ranges)
+
+def pin_to(cores: list[int] | None):
+  """preexec_fn pinning the benchmark process to cores (Linux only); None when there is nothing to apply."""
+  if not cores or not hasattr(os, "sched_setaffinity"):
+    return None
+  return lambda: os.sched_setaffinity(0, cores)
+
+def device_env(device: str | None) -> dict[str, str]:
+  """Environment for a run on device (None: tinygrad's default device)."""
+  env = os.environ.copy()
+  env["PYTHONPATH"] = "./deps/tinygrad/"
+  if device:
+    env.update(DEVICE_ENVS[device])
+  return env
+
+def compiler_info(device: str | None) -> str:
+  """First line of the device compiler's version output, e.g. 'Ubuntu clang version 18.1.3'."""
+  if device is None:
+    from tinygrad.device import Device
+    device = Device.default
+  command = DEVICE_COMPILERS.get(device)
+  if command is None:
+    return "unknown"
+  try:
+    out = subprocess.run(command, capture_output=True, text=True, timeout=10).stdout.strip().splitlines()
+  except (OSError, subprocess.TimeoutExpired):
+    return "unknown"
+  if not out:
+    return "unknown"
+  return out[0] if command[0] != "llvm-config" else f"llvm {out[0]}"
+
+def config_device(config) -> str | None:
+  return dict(tup for tup in config if tup).get("--device")
+
+def config_shards(config) -> int:
+  return int(dict(tup for tup in config if tup).get("--shard", 1))
+
+def benchmark_command(config) -> list[str]:
+  args = [tup for tup in config if tup and tup[0] not in ENV_VARS]
+  return ["python", "deps/tinygrad/examples/llama3.py"] + list(chain.from_iterable(args)) + ["--benchmark"]
 
 # 2. generate benchmark commands (for subprocess)
 configs = list(product(*SVARS))
@@ -57,11 +151,21 @@ def config_to_filename_and_metadata(config) -> tuple[str, dict[str, Any]]:
       k, v = tup
       config_dict[k] = v
   
+  shards = int(config_dict.get('--shard', 1))
   normalized_config = {
     'size': config_dict['--size'],
     'quantize': config_dict.get('--quantize', 'default'),
-    'seed': config_dict['--seed']
+    'seed': config_dict['--seed'],
+    'shards': shards,
   }
+  # record the affinity actually applied to the run (see shard_affinity); unpinned runs have none
+  affinity = shard_affinity(shards) if hasattr(os, "sched_setaffinity") else None
+  if affinity:
+    normalized_config['shard_topology'] = format_cores(affinity)
+  device = config_dict.get('--device')
+  if device:
+    whoiam['device'] = device
+  whoiam['compiler'] = compiler_info(device)
   
   parts = [
     whoiam['hostname'],
@@ -70,6 +174,10 @@ def config_to_filename_and_metadata(config) -> tuple[str, dict[str, Any]]:
     f"seed{normalized_config['seed']}",
     f"uuid{str(uuid.uuid4())[:8]}"
   ]
+  if device:
+    parts.insert(-1, device)
+  if shards > 1:
+    parts.insert(-1, f"shard{shards}")
   filename = '_'.join(parts) + '.txt'
   metadata = {
     'config': normalized_config,
@@ -78,58 +186,159 @@ def config_to_filename_and_metadata(config) -> tuple[str, dict[str, Any]]:
   }
   return filename, metadata
 
-def run_benchmarks():
-  """Run benchmark sweep over all configurations."""
+def run_config(config, env: dict[str, str] | None = None, extra: dict[str, Any] | None = None) -> tuple[list, float]:
+  """Run one config, write its log to benchmark_output/, ingest it and return (rows, wall seconds)."""
+  filename, metadata = config_to_filename_and_metadata(config)
+  command = benchmark_command(config)
+  env = env or device_env(config_device(config))
+  rows, elapsed = [], 0.0
+
+  try:
+    with open(f"benchmark_output/{filename}", "w") as f:
+      # write metadata
+      for key, value in metadata['whoami'].items():
+        f.write(f"{key}: {value}\n")
+      for key, value in metadata['config'].items():
+        f.write(f"{key}: {value}\n")
+      f.write(f"uuid: {metadata['uuid']}\n")
+      for key, value in (extra or {}).items():
+        f.write(f"{key}: {value}\n")
+      f.flush()
+      # then run subprocess
+      start = time.perf_counter()
+      subprocess.run(args=command, env=env, stdout=f, preexec_fn=pin_to(shard_affinity(config_shards(config))))
+      elapsed = time.perf_counter() - start
+    # parse the log and append it to the results store
+    rows = tinygrad_parse.parse_file(f"benchmark_output/{filename}")
+    with ResultsStore() as store:
+      store.ingest(rows, "tinygrad", source=filename)
+  except Exception as e:
+    print(f"{command} failed with {e}")
+  return rows, elapsed
+
+def run_benchmarks(fresh: bool = False):
+  """Run benchmark sweep over all configurations.
+
+  Each finished config is checkpointed in the run cache (keyed by the tinygrad
+  commit) and skipped on the next run unless fresh is set.
+  """
   # 4. pretty print for dry run
   for config in configs:
-    command = ["python", "examples/llama3.py"] + list(chain.from_iterable(config)) + ["--benchmark"]
-    print(command)
+    print(benchmark_command(config), config_device(config) or "default")
 
   # 5. actually run, and save output to file
   os.makedirs("benchmark_output", exist_ok=True)
+  # measure this host's memory bandwidth once, for roofline.py
+  roofline.host_bandwidth()
 
+  cache = run_cache.RunCache("tinygrad_benchmark", enabled=not fresh)
+  commit = run_cache.build_commit(TINYGRAD_REPO)
   num_runs = len(configs)
   for config in configs[:num_runs]:
-    filename, metadata = config_to_filename_and_metadata(config)
-    command = ["python", "deps/tinygrad/examples/llama3.py"] + list(chain.from_iterable(config)) + ["--benchmark"]
-    env = os.environ.copy()
-    env["PYTHONPATH"] = "./deps/tinygrad/"
-
-    try:
-      with open(f"benchmark_output/{filename}", "w") as f:
-        # write metadata
-        for key, value in metadata['whoami'].items():
-          f.write(f"{key}: {value}\n")
-        for key, value in metadata['config'].items():
-          f.write(f"{key}: {value}\n")
-        f.write(f"uuid: {metadata['uuid']}\n")
-        # then run subprocess
-        subprocess.run(args=command, env=env, stdout=f)
-    except Exception as e:
-      print(f"{command} failed with {e}")
-
-
-def run_server(port: int, size: str, quantize: str | None, seed: int | None):
+    key = cache.key(dict(tup for tup in config if tup), build_commit=commit)
+    if cache.get(key, valid=lambda r: r["steps"] > 0) is not None:
+      print(f"Already completed (run cache {key[:12]}), skipping {benchmark_command(config)}")
+      continue
+    rows, elapsed = run_config(config)
+    cache.put(key, {"steps": len(rows), "elapsed_s": elapsed,
+                    "tokens_per_sec": steady_tokens_per_sec(rows)})
+
+def hardware_id() -> str:
+  """Short hash of the CPU model and feature flags; hosts with identical hardware share kernel caches."""
+  from build_cache import cpu_flags
+  model = platform.processor()
+  try:
+    with open("/proc/cpuinfo", "r") as f:
+      model = next((line.split(":", 1)[1].strip() for line in f if line.startswith(("model name", "CPU part"))), model)
+  except OSError:
+    pass
+  fingerprint = "|".join([platform.machine(), model, *sorted(cpu_flags())])
+  return hashlib.sha256(fingerprint.encode()).hexdigest()[:12]
+
+def kernel_cache_path(config, cache_dir: str = KERNEL_CACHE_DIR) -> str:
+  """Persistent tinygrad CACHEDB for one (hardware, device, shards, size, quant)."""
+  config_dict = dict(tup for tup in config if tup)
+  name = f"{config_device(config) or 'default'}_x{config_shards(config)}_{config_dict['--size']}_{config_dict.get('--quantize', 'default')}.db"
+  return os.path.join(cache_dir, hardware_id(), name)
+
+def steady_tokens_per_sec(rows: list) -> list[float]:
+  return [r['tokens_per_sec'] for r in tinygrad_parse.steady_rows(rows) if r.get('tokens_per_sec') is not None]
+
+def run_beam(beam: int = DEFAULT_BEAM, cache_dir: str = KERNEL_CACHE_DIR):
+  """Compare default kernels against BEAM-searched kernels for every config.
+
+  The search runs once per (hardware, device, shards, size, quant) into a persistent
+  CACHEDB; later runs, sweeps and hosts with the same hardware id reuse it.
+  """
+  from bench_stats import compare, format_comparison
+  os.makedirs("benchmark_output", exist_ok=True)
+  report = []
+
+  for config in configs:
+    cache_db = kernel_cache_path(config, cache_dir)
+    os.makedirs(os.path.dirname(cache_db), exist_ok=True)
+    device = config_device(config)
+
+    baseline_env = device_env(device)
+    baseline_env["BEAM"] = "0"
+    baseline, _ = run_config(config, baseline_env, {"beam": 0, "kernel_cache": "none"})
+
+    beam_env = device_env(device)
+    beam_env.update({"BEAM": str(beam), "CACHEDB": os.path.abspath(cache_db), "CACHELEVEL": "2"})
+    search_s = None
+    if not os.path.exists(cache_db):
+      # cold run: the wall time over a warm run is the one-time search cost
+      _, cold_s = run_config(config, beam_env, {"beam": beam, "kernel_cache": "cold"})
+      search_s = cold_s
+    tuned, warm_s = run_config(config, beam_env, {"beam": beam, "kernel_cache": "warm"})
+    if search_s is not None:
+      search_s -= warm_s
+
+    result = compare(steady_tokens_per_sec(baseline), steady_tokens_per_sec(tuned), statistic="median")
+    entry = {
+      "config": dict(tup for tup in config if tup),
+      "hardware_id": hardware_id(),
+      "beam": beam,
+      "kernel_cache": cache_db,
+      "search_s": search_s,
+      **result,
+    }
+    report.append(entry)
+    search = f"{search_s:.1f}s search" if search_s is not None else "cached kernels"
+    print(f"{cache_db}: BEAM={beam} vs default {format_comparison(result)} ({search})")
+
+  with open(BEAM_REPORT, "a") as f:
+    for entry in report:
+      f.write(json.dumps({"timestamp": time.time(), **entry}) + "\n")
+  print(f"Appended {len(report)} entries to {BEAM_REPORT}")
+
+
+def run_server(port: int, size: str, quantize: str | None, seed: int | None, device: str | None = None, shards: int = 1):
   """Run llama3.py as an OpenAI-compatible server."""
   command = ["python", "deps/tinygrad/examples/llama3.py", "--size", size, "--port", str(port)]
+  cores = None
+  if shards > 1:
+    command.extend(["--shard", str(shards)])
+    cores = shard_affinity(shards)
 
   if quantize:
     command.extend(["--quantize", quantize])
   if seed is not None:
     command.extend(["--seed", str(seed)])
 
-  env = os.environ.copy()
-  env["PYTHONPATH"] = "./deps/tinygrad/"
+  env = device_env(device)
 
   print(f"Starting server on port {port}...")
   print(f"Command: {' '.join(command)}")
+  if cores:
+    print(f"Shards: {shards}, pinned to cores {format_cores(cores)}")
   print(f"\nOpenAI-compatible endpoints available at:")
   print(f"  POST http://localhost:{port}/v1/completions")
   print(f"  POST http://localhost:{port}/v1/chat/completions")
   print(f"  GET  http://localhost:{port}/v1/models")
   print()
 
-  subprocess.run(args=command, env=env)
+  subprocess.run(args=command, env=env, preexec_fn=pin_to(cores))
 
 
 if __name__ == "__main__":
@@ -138,9 +347,16 @@ if __name__ == "__main__":
   parser.add_argument("--size", choices=["1B", "8B", "70B", "405B"], default="1B", help="Model size (default: 1B)")
   parser.add_argument("--quantize", choices=["int8", "nf4", "float16"], help="Quantization method")
   parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+  parser.add_argument("--device", choices=list(DEVICE_ENVS), help="tinygrad device for the server (default: tinygrad's default)")
+  parser.add_argument("--shard", type=int, default=1, help="Shard the server's model across this many device instances (default: 1)")
+  parser.add_argument("--beam", type=int, nargs="?", const=DEFAULT_BEAM, help=f"Benchmark BEAM-searched kernels against the defaults (width, default: {DEFAULT_BEAM})")
+  parser.add_argument("--fresh", action="store_true", help="Re-run configs already checkpointed by an earlier sweep (see run_cache.py)")
+  parser.add_argument("--kernel-cache", default=KERNEL_CACHE_DIR, help=f"Persistent kernel cache directory, can be shared between hosts (default: {KERNEL_CACHE_DIR})")
   args = parser.parse_args()
 
   if args.port:
-    run_server(args.port, args.size, args.quantize, args.seed)
+    run_server(args.port, args.size, args.quantize, args.seed, args.device, args.shard)
+  elif args.beam:
+    run_beam(args.beam, args.kernel_cache)
   else:
-    run_benchmarks()
+    run_benchmarks(args.fresh)
@@ -1,14 +1,72 @@
 import re
 import sys
+import random
 import csv
-from typing import List, Dict, Optional
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional, TypedDict
+
+FIELDNAMES = ['step', 'enqueue_latency_ms', 'total_latency_ms', 'tokens_per_sec',
+              'memory_throughput_gb_s', 'param_throughput_gb_s', 'generated_text',
+              'platform', 'release', 'device', 'username', 'hostname', 'size', 'quantize', 'seed', 'uuid',
+              'compiler', 'beam', 'kernel_cache', 'phase', 'time_to_ready_ms', 'shards', 'shard_topology',
+              'default_device']
+
+METADATA_KEYS = frozenset({'platform', 'release', 'device', 'username', 'hostname', 'size', 'quantize', 'seed', 'uuid',
+                           'compiler', 'beam', 'kernel_cache', 'shards', 'shard_topology', 'default_device'})
+SKIP_PREFIXES = ("seed", "loaded weights", "output validated")
+
+# TinyJit runs the first step uncaptured (compiling every kernel) and captures
+# the graph on the second; from the third step on it replays the capture
+JIT_COMPILE_STEPS = 1
+JIT_CAPTURE_STEPS = 1
+# A pre-steady step this many times slower than the steady median counts as compile
+COMPILE_FACTOR = 5.0
+# A change point must drop the median step latency by at least this fraction
+# and by this many robust standard deviations (1.4826 * MAD) of the later steps
+CHANGE_POINT_MIN_DROP = 0.05
+CHANGE_POINT_MADS = 3.0
+MIN_STEADY_STEPS = 3
+# Compile and warmup are looked for in the first PHASE_WINDOW steps of a run; later steps are steady
+PHASE_WINDOW = 64
+
+ENQUEUE_RE = re.compile(r"enqueue in\s+(\d+\.?\d*)\s+ms")
+TOTAL_RE = re.compile(r"total\s+(\d+\.?\d*)\s+ms,\s+(\d+\.?\d*)\s+tok/s,\s+(\d+\.?\d*)\s+GB/s,\s+param\s+(\d+\.?\d*)\s+GB/s")
+
+class BenchmarkRow(TypedDict, total=False):
+    step: int
+    enqueue_latency_ms: float
+    total_latency_ms: float
+    tokens_per_sec: float
+    memory_throughput_gb_s: float
+    param_throughput_gb_s: float
+    generated_text: str
+    platform: str
+    release: str
+    device: str
+    username: str
+    hostname: str
+    size: str
+    quantize: str
+    seed: str
+    uuid: str
+    compiler: str
+    beam: str
+    kernel_cache: str
+    phase: str
+    time_to_ready_ms: float
+    shards: str
+    shard_topology: str
+    default_device: str
 
 def parse_metrics(line: str) -> Dict[str, Optional[float]]:
     metrics = {}
-    enqueue_match = re.search(r"enqueue in\s+(\d+\.?\d*)\s+ms", line)
+    # both timing lines end in "ms", so skip the regexes for everything else
+    if "ms" not in line:
+        return metrics
+    enqueue_match = ENQUEUE_RE.search(line)
     if enqueue_match:
         metrics['enqueue_latency_ms'] = float(enqueue_match.group(1))
-    total_match = re.search(r"total\s+(\d+\.?\d*)\s+ms,\s+(\d+\.?\d*)\s+tok/s,\s+(\d+\.?\d*)\s+GB/s,\s+param\s+(\d+\.?\d*)\s+GB/s", line)
+    total_match = TOTAL_RE.search(line)
     if total_match:
         metrics['total_latency_ms'] = float(total_match.group(1))
         metrics['tokens_per_sec'] = float(total_match.group(2))
@@ -16,94 +74,280 @@ def parse_metrics(line: str) -> Dict[str, Optional[float]]:
         metrics['param_throughput_gb_s'] = float(total_match.group(4))
     return metrics
 
-def parse_file(filepath: str) -> List[Dict]:
+def iter_lines(lines: Iterable[str]) -> Iterator[BenchmarkRow]:
+    """Single-pass parser over log lines, yielding one record per benchmark step.
+
+    The metadata header written by tinygrad_benchmark.py precedes the llama3.py
+    output, so it is always known by the time the first step is emitted.
+    """
     metadata = {}
-    metadata_keys = {'platform', 'release', 'device', 'username', 'hostname', 'size', 'quantize', 'seed', 'uuid'}
-    
-    # First pass: collect metadata
-    with open(filepath, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip()
-                if key in metadata_keys:
-                    metadata[key] = value.strip()
-    
-    # Second pass: parse results
-    results = []
     current_text = ""
     step = 0
     pending_metrics = {}
-    
-    with open(filepath, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith(("seed", "loaded weights", "output validated")):
-                continue
-            metrics = parse_metrics(line)
-            if metrics:
-                pending_metrics.update(metrics)
-                if 'total_latency_ms' in pending_metrics or len(pending_metrics) >= 2:
-                    step += 1
-                    results.append({
-                        'step': step,
-                        'generated_text': current_text,
-                        **pending_metrics,
-                        **metadata
-                    })
-                    pending_metrics = {}
-            elif line and not any(x in line for x in ["enqueue in", "total", "ms"]):
-                current_text = line
-    return results
-
-def write_csv(results: List[Dict], output_file: str):
-    if not results:
-        return
-    fieldnames = ['step', 'enqueue_latency_ms', 'total_latency_ms', 'tokens_per_sec', 
-                  'memory_throughput_gb_s', 'param_throughput_gb_s', 'generated_text',
-                  'platform', 'release', 'device', 'username', 'hostname', 'size', 'quantize', 'seed', 'uuid']
-    with open(output_file, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if ':' in line:
+            key, value = line.split(':', 1)
+            key = key.strip()
+            if key in METADATA_KEYS:
+                metadata[key] = value.strip()
+        if line.startswith(SKIP_PREFIXES):
+            continue
+        metrics = parse_metrics(line)
+        if metrics:
+            pending_metrics.update(metrics)
+            if 'total_latency_ms' in pending_metrics or len(pending_metrics) >= 2:
+                step += 1
+                yield {
+                    'step': step,
+                    'generated_text': current_text,
+                    **pending_metrics,
+                    **metadata
+                }
+                pending_metrics = {}
+            continue
+        if not any(x in line for x in ("enqueue in", "total", "ms")):
+            current_text = line
+
+def iter_records(filepath: str) -> Iterator[BenchmarkRow]:
+    """Stream records from a tinygrad benchmark log in constant memory."""
+    with open(filepath, 'r', buffering=1 << 20) as f:
+        yield from iter_lines(f)
+
+def _median(values: List[float]) -> float:
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def _change_point(latencies: List[float], start: int) -> Optional[int]:
+    """Best two-segment split of latencies[start:] by squared error, if the first segment is significantly slower."""
+    n = len(latencies)
+    if n - start < MIN_STEADY_STEPS + 1:
+        return None
+    sums, squares = [0.0], [0.0]
+    for v in latencies[start:]:
+        sums.append(sums[-1] + v)
+        squares.append(squares[-1] + v * v)
+
+    def sse(i: int, j: int) -> float:
+        total = sums[j - start] - sums[i - start]
+        return squares[j - start] - squares[i - start] - total * total / (j - i)
+
+    best = min(range(start + 1, n - MIN_STEADY_STEPS + 1), key=lambda t: sse(start, t) + sse(t, n))
+    before, after = _median(latencies[start:best]), _median(latencies[best:])
+    mad = _median([abs(v - after) for v in latencies[best:]])
+    if before - after > max(CHANGE_POINT_MIN_DROP * after, CHANGE_POINT_MADS * 1.4826 * mad):
+        return best
+    return None
+
+def _label_window(rows: List[BenchmarkRow]) -> float:
+    """Label the leading steps of one run in place; returns the run's time_to_ready_ms."""
+    latencies = [r.get('total_latency_ms') or 0.0 for r in rows]
+    steady_start = min(JIT_COMPILE_STEPS + JIT_CAPTURE_STEPS, len(rows))
+    while (point := _change_point(latencies, steady_start)) is not None:
+        steady_start = point
+
+    steady_median = _median(latencies[steady_start:]) if steady_start < len(rows) else 0.0
+    time_to_ready_ms = sum(latencies[:steady_start])
+    for i, row in enumerate(rows):
+        if i >= steady_start:
+            row['phase'] = 'steady'
+        elif i < JIT_COMPILE_STEPS or (steady_median and latencies[i] > COMPILE_FACTOR * steady_median):
+            row['phase'] = 'compile'
+        else:
+            row['phase'] = 'warmup'
+        row['time_to_ready_ms'] = time_to_ready_ms
+    return time_to_ready_ms
+
+def label_phases(rows: List[BenchmarkRow]) -> List[BenchmarkRow]:
+    """Label each step of one run as compile, warmup or steady.
+
+    The known JIT step counts give a lower bound for where steady state
+    starts; binary segmentation on per-step latency over the first
+    PHASE_WINDOW steps moves it later while the earlier steps are still
+    significantly slower (e.g. lazily compiled kernels or caches warming up).
+    Every row also gets the run's time_to_ready_ms, the summed latency of the
+    steps before steady state.
+    """
+    time_to_ready_ms = _label_window(rows[:PHASE_WINDOW])
+    for row in rows[PHASE_WINDOW:]:
+        row['phase'] = 'steady'
+        row['time_to_ready_ms'] = time_to_ready_ms
+    return rows
+
+def iter_phased(records: Iterable[BenchmarkRow]) -> Iterator[BenchmarkRow]:
+    """Label phases per run (consecutive rows with the same uuid), buffering at most PHASE_WINDOW rows."""
+    window: List[BenchmarkRow] = []
+    run_uuid, time_to_ready_ms = None, None
+    for row in records:
+        if row.get('uuid') != run_uuid:
+            if window:
+                _label_window(window)
+                yield from window
+            window, run_uuid, time_to_ready_ms = [], row.get('uuid'), None
+        if time_to_ready_ms is not None:
+            row['phase'] = 'steady'
+            row['time_to_ready_ms'] = time_to_ready_ms
+            yield row
+            continue
+        window.append(row)
+        if len(window) == PHASE_WINDOW:
+            time_to_ready_ms = _label_window(window)
+            yield from window
+            window = []
+    if window:
+        _label_window(window)
+        yield from window
+
+def steady_rows(rows: Iterable[Dict]) -> List[Dict]:
+    """Rows in steady state; rows parsed before phase labelling existed are all kept."""
+    return [r for r in rows if r.get('phase') in (None, '', 'steady')]
+
+def parse_file(filepath: str) -> List[BenchmarkRow]:
+    return list(iter_phased(iter_records(filepath)))
+
+def write_csv(results: Iterable[Dict], output_file: str) -> int:
+    """Write rows to CSV as they arrive. Returns the number of rows written."""
+    count = 0
+    f = None
+    try:
         for row in results:
-            for field in fieldnames:
+            if f is None:
+                f = open(output_file, 'w', newline='')
+                writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+                writer.writeheader()
+            for field in FIELDNAMES:
                 if field not in row:
                     row[field] = ''
             writer.writerow(row)
+            count += 1
+    finally:
+        if f is not None:
+            f.close()
+    return count
+
+SUMMARY_METRICS = ['enqueue_latency_ms', 'total_latency_ms', 'tokens_per_sec',
+                   'memory_throughput_gb_s', 'param_throughput_gb_s']
+# Steady values kept per metric for the median; beyond this it is estimated from a reservoir sample
+SUMMARY_SAMPLE = 10_000
+
+class RunningSummary:
+    """compute_summary in bounded memory: running min/max/sum plus a reservoir sample for the median."""
+
+    def __init__(self, sample_size: int = SUMMARY_SAMPLE, seed: int = 0):
+        self.sample_size = sample_size
+        self.rng = random.Random(seed)
+        self.time_to_ready_ms: Optional[float] = None
+        self.first = True
+        self.phases = {'compile': 0, 'warmup': 0}
+        self.stats = {m: {'min': float('inf'), 'max': float('-inf'), 'sum': 0.0, 'count': 0, 'sample': []}
+                      for m in SUMMARY_METRICS}
+
+    def add(self, row: Dict):
+        if self.first:
+            self.first = False
+            self.time_to_ready_ms = row.get('time_to_ready_ms')
+        if row.get('phase') in self.phases:
+            self.phases[row['phase']] += 1
+        if row.get('phase') not in (None, '', 'steady'):
+            return
+        for metric, stat in self.stats.items():
+            v = row.get(metric)
+            if v is None:
+                continue
+            stat['min'] = min(stat['min'], v)
+            stat['max'] = max(stat['max'], v)
+            stat['sum'] += v
+            stat['count'] += 1
+            if len(stat['sample']) < self.sample_size:
+                stat['sample'].append(v)
+            elif (j := self.rng.randrange(stat['count'])) < self.sample_size:
+                stat['sample'][j] = v
+
+    def summary(self) -> Dict:
+        summary = {}
+        if self.time_to_ready_ms is not None:
+            summary['time_to_ready_ms'] = self.time_to_ready_ms
+            summary['compile_steps'] = self.phases['compile']
+            summary['warmup_steps'] = self.phases['warmup']
+        for metric, stat in self.stats.items():
+            if stat['count']:
+                summary[f'{metric}_min'] = stat['min']
+                summary[f'{metric}_max'] = stat['max']
+                summary[f'{metric}_mean'] = stat['sum'] / stat['count']
+                summary[f'{metric}_median'] = sorted(stat['sample'])[len(stat['sample']) // 2]
+        return summary
+
+def compute_summary(results: Iterable[Dict]) -> Dict:
+    """Steady-state statistics, plus time to ready (compile + warmup) of the first run."""
+    running = RunningSummary()
+    for row in results:
+        running.add(row)
+    return running.summary()
 
-def compute_summary(results: List[Dict]) -> Dict:
-    summary = {}
-    metrics = ['enqueue_latency_ms', 'total_latency_ms', 'tokens_per_sec', 
-               'memory_throughput_gb_s', 'param_throughput_gb_s']
-    for metric in metrics:
-        values = []
-        for r in results:
-            v = r.get(metric)
-            if v is not None:
-                values.append(v)
-        if values:
-            summary[f'{metric}_min'] = min(values)
-            summary[f'{metric}_max'] = max(values)
-            summary[f'{metric}_mean'] = sum(values) / len(values)
-            summary[f'{metric}_median'] = sorted(values)[len(values) // 2]
-    return summary
+def _collect_metrics(results: Iterable[Dict], summary: RunningSummary) -> Iterator[Dict]:
+    """Pass rows through, adding each to the running summary."""
+    for row in results:
+        summary.add(row)
+        yield row
+
+def benchmark_throughput(num_steps: int = 1_000_000) -> float:
+    """Parse a synthetic log of num_steps benchmark steps and report lines/s."""
+    import os
+    import time
+    import tempfile
+
+    fd, path = tempfile.mkstemp(suffix='.txt')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            for key in sorted(METADATA_KEYS):
+                f.write(f"{key}: synthetic\n")
+            f.write("seed = 42\nloaded weights in 1234.56 ms, 2.47 GB loaded at 2.00 GB/s\n")
+            for i in range(num_steps):
+                latency = 50 + random.random() * 50
+                f.write(f"enqueue in {random.random() * 10:6.2f} ms\n")
+                f.write(f"total {latency:6.2f} ms, {1000 / latency:.2f} tok/s, 20.00 GB/s, param 19.00 GB/s\n")
+                f.write(f"generated text for step {i}\n")
+        # metadata header, seed and weights lines, then three lines per step
+        num_lines = len(METADATA_KEYS) + 2 + 3 * num_steps
+        size_mb = os.path.getsize(path) / 1e6
+
+        start = time.perf_counter()
+        steps = sum(1 for _ in iter_records(path))
+        elapsed = time.perf_counter() - start
+    finally:
+        os.remove(path)
+
+    lines_per_sec = num_lines / elapsed
+    print(f"Parsed {steps} steps ({num_lines} lines, {size_mb:.1f} MB) in {elapsed:.2f}s")
+    print(f"  {lines_per_sec:,.0f} lines/s, {size_mb / elapsed:.1f} MB/s")
+    return lines_per_sec
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python parse_benchmark.py <input_file.txt>")
+    parser = argparse.ArgumentParser(description="Parse a tinygrad benchmark log into CSV")
+    parser.add_argument("input_file", nargs="?", help="Benchmark log (.txt)")
+    parser.add_argument("--bench", type=int, metavar="STEPS", help="Measure parser throughput on a synthetic log with STEPS steps")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark_throughput(args.bench)
+        return
+    if not args.input_file:
+        parser.print_usage()
         sys.exit(1)
-    
-    input_file = sys.argv[1]
+
+    input_file = args.input_file
     output_file = input_file.replace('.txt', '.csv')
-    
-    results = parse_file(input_file)
-    write_csv(results, output_file)
-    
-    summary = compute_summary(results)
-    print(f"Processed {len(results)} steps -> {output_file}")
+
+    running = RunningSummary()
+    count = write_csv(_collect_metrics(iter_phased(iter_records(input_file)), running), output_file)
+
+    summary = running.summary()
+    print(f"Processed {count} steps -> {output_file}")
     for key, value in summary.items():
-        print(f"  {key}: {value:.2f}")
+        print(f"  {key}: {value:.2f}" if isinstance(value, float) else f"  {key}: {value}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,150 @@
+"""
+Run verifiers evaluations in-process, for verifiers_sweep.py and llamacpp_sweep.py.
+
+Spawning `uv run vf-eval` per quantization pays for interpreter startup,
+environment resolution and dataset loading every time, and only leaves the
+printed averages to scrape. Here each environment (with its eval dataset) is
+loaded once per process through verifiers' Python API and evaluated against
+each server in turn. The rollouts come back as structured results, so
+per-example reward, token counts and latency are kept next to the averages.
+
+Results are still saved in vf-eval's format (./outputs/evals/...) for vf-tui.
+
+Usage:
+    python verifiers_runner.py --env gsm8k -n 5 -b http://localhost:8080/v1
+    python verifiers_runner.py --env gsm8k -n 20 -b http://localhost:7777/v1 -c 1 --examples
+"""
+import os
+import time
+import argparse
+import statistics
+import traceback
+from functools import lru_cache
+from typing import Any, Dict, List
+
+MODEL = "local"
+# vf-eval's default
+MAX_CONCURRENT = 32
+
+
+@lru_cache(maxsize=None)
+def load_env(env_id: str):
+    """The verifiers environment for env_id, loaded (dataset included) once per process."""
+    import verifiers as vf
+    print(f"Loading verifiers environment {env_id}...")
+    return vf.load_environment(env_id=env_id)
+
+
+def make_client(base_url: str):
+    from openai import AsyncOpenAI
+    # local servers can take minutes per request on small devices, so no request timeout
+    return AsyncOpenAI(base_url=base_url, api_key=os.getenv("OPENAI_API_KEY", "dummy"), timeout=None, max_retries=3)
+
+
+def _usage(state) -> Dict[str, int]:
+    prompt_tokens = completion_tokens = 0
+    for step in state.get("trajectory") or []:
+        usage = getattr(step.get("response"), "usage", None)
+        if usage is not None:
+            prompt_tokens += usage.prompt_tokens or 0
+            completion_tokens += usage.completion_tokens or 0
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "turns": len(state.get("trajectory") or [])}
+
+
+def example_rows(outputs) -> List[Dict[str, Any]]:
+    """One row per rollout: reward, rubric metrics, tokens and latency."""
+    rows = []
+    for i, state in enumerate(outputs["state"]):
+        timing = state.get("timing") or {}
+        generation_s = timing.get("generation_ms", 0.0) / 1000
+        row = {
+            "example_id": outputs["example_id"][i],
+            "reward": outputs["reward"][i],
+            **{name: values[i] for name, values in outputs["metrics"].items()},
+            **_usage(state),
+            "latency_s": round(generation_s, 4),
+            "scoring_s": round(timing.get("scoring_ms", 0.0) / 1000, 4),
+        }
+        row["tokens_per_sec"] = round(row["completion_tokens"] / generation_s, 3) if generation_s else None
+        rows.append(row)
+    return rows
+
+
+def summarize(examples: List[Dict[str, Any]], metric_names: List[str]) -> Dict[str, Any]:
+    """avg/std per metric (the shape vf-eval prints), plus token and latency totals."""
+    metrics: Dict[str, Any] = {}
+    for name in ["reward", *metric_names]:
+        values = [row[name] for row in examples]
+        if values:
+            metrics[name] = {"avg": statistics.fmean(values), "std": statistics.pstdev(values)}
+    latencies = [row["latency_s"] for row in examples]
+    if latencies:
+        metrics["latency_s"] = {"avg": statistics.fmean(latencies), "std": statistics.pstdev(latencies)}
+        metrics["completion_tokens"] = sum(row["completion_tokens"] for row in examples)
+        metrics["prompt_tokens"] = sum(row["prompt_tokens"] for row in examples)
+    return metrics
+
+
+def evaluate(env_id: str, base_url: str, num_examples: int, max_tokens: int, max_concurrent: int = MAX_CONCURRENT,
+             rollouts: int = 1, save_results: bool = True) -> Dict[str, Any]:
+    """Evaluate env_id against the OpenAI-compatible server at base_url.
+
+    Returns {"metrics", "examples", "returncode", "error"}; returncode is 0 on
+    success and 1 if the evaluation raised, so callers can treat it like the
+    exit status of vf-eval.
+    """
+    start = time.time()
+    try:
+        env = load_env(env_id)
+        outputs = env.evaluate_sync(
+            make_client(base_url),
+            model=MODEL,
+            sampling_args={"max_tokens": max_tokens},
+            num_examples=num_examples,
+            rollouts_per_example=rollouts,
+            max_concurrent=max_concurrent,
+            save_results=save_results,
+        )
+    except Exception as e:
+        traceback.print_exc()
+        return {"metrics": {}, "examples": [], "returncode": 1, "error": f"{type(e).__name__}: {e}"}
+
+    examples = example_rows(outputs)
+    metrics = summarize(examples, list(outputs["metrics"]))
+    metrics["eval_time_seconds"] = time.time() - start
+    return {"metrics": metrics, "examples": examples, "returncode": 0, "error": None}
+
+
+def print_metrics(metrics: Dict[str, Any]):
+    for name, vals in metrics.items():
+        if isinstance(vals, dict):
+            print(f"  {name}: avg={vals['avg']:.3f}, std={vals['std']:.3f}")
+        else:
+            print(f"  {name}: {vals}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one verifiers evaluation in-process")
+    parser.add_argument("--env", default="gsm8k", help="Verifiers environment")
+    parser.add_argument("--base-url", "-b", default="http://localhost:8080/v1", help="OpenAI-compatible endpoint")
+    parser.add_argument("--num-examples", "-n", type=int, default=5)
+    parser.add_argument("--max-tokens", "-t", type=int, default=512)
+    parser.add_argument("--rollouts", "-r", type=int, default=1)
+    parser.add_argument("--max-concurrent", "-c", type=int, default=MAX_CONCURRENT)
+    parser.add_argument("--examples", action="store_true", help="Also print every example's row")
+    args = parser.parse_args()
+
+    result = evaluate(args.env, args.base_url, args.num_examples, args.max_tokens, args.max_concurrent, args.rollouts)
+    if result["error"]:
+        print(f"Evaluation failed: {result['error']}")
+        return 1
+    print_metrics(result["metrics"])
+    if args.examples:
+        for row in result["examples"]:
+            print(f"  #{row['example_id']}: reward {row['reward']:.3f}, {row['completion_tokens']} tokens, "
+                  f"{row['latency_s']:.2f}s")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -16,9 +16,15 @@ import time
 import signal
 import json
 import os
+import platform
 from datetime import datetime
 from pathlib import Path
 
+from server_logs import LogDrain
+import run_cache
+import verifiers_runner
+from build_cache import TINYGRAD_REPO
+
 QUANT_OPTIONS = [None, "int8", "nf4", "float16"]
 BACKEND_PORT = 7776
 PROXY_PORT = 7777
@@ -37,71 +43,21 @@ def wait_for_server(port: int, timeout: int = 120) -> bool:
     return False
 
 
-def run_benchmark(env: str, num_examples: int, max_tokens: int) -> dict:
-    """Run vf-eval and capture results."""
-    cmd = [
-        "uv", "run", "vf-eval", env,
-        "-m", "local",
-        "-b", f"http://localhost:{PROXY_PORT}/v1",
-        "-n", str(num_examples),
-        "-r", "1",
-        "-t", str(max_tokens),
-        "--save-results",  # Persist runs to database for vf-tui
-    ]
-
-    env_vars = os.environ.copy()
-    env_vars["OPENAI_API_KEY"] = "dummy"
-
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        env=env_vars,
-        timeout=600
-    )
-
-    return {
-        "stdout": result.stdout,
-        "stderr": result.stderr,
-        "returncode": result.returncode
-    }
-
-
-def parse_results(output: str) -> dict:
-    """Parse vf-eval output to extract metrics."""
-    metrics = {}
-
-    for line in output.split("\n"):
-        # Parse reward lines like "reward: avg - 0.000, std - 0.000"
-        if "avg -" in line and "std -" in line:
-            parts = line.split(":")
-            if len(parts) >= 2:
-                name = parts[0].strip()
-                try:
-                    avg_part = line.split("avg -")[1].split(",")[0].strip()
-                    std_part = line.split("std -")[1].split(",")[0].strip()
-                    metrics[name] = {
-                        "avg": float(avg_part),
-                        "std": float(std_part)
-                    }
-                except (IndexError, ValueError):
-                    pass
-
-        # Parse timing
-        if "Evaluation completed in" in line:
-            try:
-                time_str = line.split("in")[1].split("seconds")[0].strip()
-                metrics["eval_time_seconds"] = float(time_str)
-            except (IndexError, ValueError):
-                pass
-
-    return metrics
-
+def run_sweep(env: str, num_examples: int, max_tokens: int, size: str, fresh: bool = False):
+    """Run benchmark sweep across all quantization options.
 
-def run_sweep(env: str, num_examples: int, max_tokens: int, size: str):
-    """Run benchmark sweep across all quantization options."""
+    The evaluation runs in-process (see verifiers_runner.py), so per-example
+    reward, tokens and latency are stored under examples in each entry.
+    Each finished quantization is checkpointed in the run cache (keyed by the
+    tinygrad commit; llama3.py fetches its own weights) and skipped on the next
+    run unless fresh is set.
+    """
     results = []
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    cache = run_cache.RunCache("verifiers_sweep", enabled=not fresh)
+    commit = run_cache.build_commit(TINYGRAD_REPO)
+    # load the environment and its dataset once; every quantization reuses it
+    verifiers_runner.load_env(env)
 
     for quant in QUANT_OPTIONS:
         quant_name = quant or "default"
@@ -109,6 +65,15 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str):
         print(f"Running benchmark with quantization: {quant_name}")
         print(f"{'='*60}")
 
+        sweep_config = {"environment": env, "num_examples": num_examples, "max_tokens": max_tokens, "size": size,
+                        "quantization": quant_name}
+        key = cache.key(sweep_config, build_commit=commit)
+        cached = cache.get(key, valid=lambda r: r["returncode"] == 0)
+        if cached is not None:
+            print(f"Already completed (run cache {key[:12]}), skipping")
+            results.append(cached)
+            continue
+
         # Build tinygrad server command
         server_cmd = [
             "python", "deps/tinygrad/examples/llama3.py",
@@ -129,6 +94,10 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str):
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
         )
+        # Keep reading the pipe so the server never blocks on a full buffer
+        log_dir = Path("verifiers_results") / "logs"
+        drain = LogDrain(server_proc, log_dir / f"tinygrad_{env}_{size}_{quant_name}_{timestamp}.log")
+        drain.start()
 
         try:
             # Wait for server to load
@@ -148,6 +117,8 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str):
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
             )
+            proxy_drain = LogDrain(proxy_proc, log_dir / f"proxy_{env}_{size}_{quant_name}_{timestamp}.log")
+            proxy_drain.start()
 
             try:
                 # Wait for proxy
@@ -159,11 +130,9 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str):
                 # Run benchmark
                 print(f"Running {env} benchmark with {num_examples} examples...")
                 start_time = time.time()
-                bench_result = run_benchmark(env, num_examples, max_tokens)
+                bench_result = verifiers_runner.evaluate(env, f"http://localhost:{PROXY_PORT}/v1", num_examples, max_tokens)
                 elapsed = time.time() - start_time
-
-                # Parse results
-                metrics = parse_results(bench_result["stdout"] + bench_result["stderr"])
+                metrics = bench_result["metrics"]
 
                 result_entry = {
                     "quantization": quant_name,
@@ -174,22 +143,27 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str):
                     "metrics": metrics,
                     "elapsed_seconds": elapsed,
                     "returncode": bench_result["returncode"],
+                    "error": bench_result["error"],
                     "timestamp": datetime.now().isoformat(),
+                    "backend": "tinygrad",
+                    "hostname": platform.node(),
+                    "server_metrics": drain.summary(),
+                    "examples": bench_result["examples"],
                 }
                 results.append(result_entry)
+                cache.put(key, result_entry)
 
                 # Print summary
                 print(f"\nResults for {quant_name}:")
                 print(f"  Time: {elapsed:.1f}s")
-                for name, vals in metrics.items():
-                    if isinstance(vals, dict):
-                        print(f"  {name}: avg={vals['avg']:.3f}, std={vals['std']:.3f}")
-                    else:
-                        print(f"  {name}: {vals}")
+                if bench_result["error"]:
+                    print(f"  ERROR: evaluation failed: {bench_result['error']}")
+                verifiers_runner.print_metrics(metrics)
 
             finally:
                 proxy_proc.terminate()
                 proxy_proc.wait(timeout=5)
+                proxy_drain.join(timeout=5)
 
         finally:
             server_proc.terminate()
@@ -197,6 +171,7 @@ def run_sweep(env: str, num_examples: int, max_tokens: int, size: str):
                 server_proc.wait(timeout=10)
             except subprocess.TimeoutExpired:
                 server_proc.kill()
+            drain.join(timeout=5)
 
         # Brief pause between runs
         time.sleep(2)
@@ -237,10 +212,11 @@ if __name__ == "__main__":
     parser.add_argument("--num-examples", "-n", type=int, default=5, help="Number of examples per run")
     parser.add_argument("--max-tokens", "-t", type=int, default=512, help="Max tokens to generate")
     parser.add_argument("--size", default="1B", choices=["1B", "8B", "70B", "405B"], help="Model size")
+    parser.add_argument("--fresh", action="store_true", help="Ignore checkpoints from earlier runs (see run_cache.py)")
     args = parser.parse_args()
 
     try:
-        run_sweep(args.env, args.num_examples, args.max_tokens, args.size)
+        run_sweep(args.env, args.num_examples, args.max_tokens, args.size, args.fresh)
     except KeyboardInterrupt:
         print("\nSweep interrupted by user")
         sys.exit(1)
@@ -4,29 +4,25 @@ Generates bar charts comparing tokens/sec across quantization methods.
 
 Usage: python visualize_benchmarks.py
 """
-import csv
-import os
 from collections import defaultdict
 
-
-def load_csv(filepath: str) -> list[dict]:
-    """Load benchmark results from CSV file."""
-    results = []
-    if not os.path.exists(filepath):
-        return results
-    with open(filepath, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            results.append(row)
-    return results
+from analysis_engine import is_default_config
+from bench_stats import compare
+from results_store import load_results
 
 
 def compute_averages(results: list[dict], group_by: str = 'quantize') -> dict:
     """Compute average tokens_per_sec grouped by quantization method."""
     grouped = defaultdict(list)
     for row in results:
-        # Skip summary rows (step == 0 for llamacpp)
-        if row.get('step') == '0':
+        # Skip summary rows (step == 0 for llamacpp) and tinygrad compile/warmup steps
+        if str(row.get('step')) == '0' or row.get('phase') in ('compile', 'warmup'):
+            continue
+        # llama-bench prompt processing (pp512) is not decode throughput
+        if str(row.get('test') or '').startswith('pp'):
+            continue
+        # device/shard/BEAM/build-variant/cold-cache sweeps are not comparable across backends
+        if not is_default_config(row):
             continue
         quant = row.get(group_by, 'unknown')
         try:
@@ -44,6 +40,7 @@ def compute_averages(results: list[dict], group_by: str = 'quantize') -> dict:
                 'min': min(values),
                 'max': max(values),
                 'count': len(values),
+                'values': values,
             }
     return averages
 
@@ -103,7 +100,7 @@ def render_ascii_bar_chart(tinygrad_avgs: dict, llamacpp_avgs: dict):
 
 
 def render_speedup_comparison(tinygrad_avgs: dict, llamacpp_avgs: dict):
-    """Show speedup comparison between backends."""
+    """Show speedup comparison between backends, with a 95% bootstrap CI and significance."""
     print("\n" + "=" * 80)
     print("SPEEDUP COMPARISON (llama.cpp vs tinygrad)")
     print("=" * 80)
@@ -112,20 +109,23 @@ def render_speedup_comparison(tinygrad_avgs: dict, llamacpp_avgs: dict):
 
     for quant in sorted(common_quants):
         t_val = tinygrad_avgs[quant]['mean']
-        l_val = llamacpp_avgs[quant]['mean']
 
         if t_val > 0:
-            speedup = l_val / t_val
+            r = compare(tinygrad_avgs[quant]['values'], llamacpp_avgs[quant]['values'])
+            speedup, lo, hi = r['speedup'], r['ci_lo'], r['ci_hi']
+            sig = "significant" if r['significant'] else "not significant"
             if speedup >= 1:
-                print(f"  {quant:<15}: llama.cpp is {speedup:.2f}x faster")
+                print(f"  {quant:<15}: llama.cpp is {speedup:.2f}x faster "
+                      f"(95% CI {lo:.2f}-{hi:.2f}x, p={r['p_mannwhitney']:.3g}, {sig})")
             else:
-                print(f"  {quant:<15}: tinygrad is {1/speedup:.2f}x faster")
+                print(f"  {quant:<15}: tinygrad is {1/speedup:.2f}x faster "
+                      f"(95% CI {1/hi:.2f}-{1/lo:.2f}x, p={r['p_mannwhitney']:.3g}, {sig})")
 
 
 def main():
     # Load data
-    tinygrad_results = load_csv('benchmark_output/tinygrad.csv')
-    llamacpp_results = load_csv('benchmark_output/llamacpp.csv')
+    tinygrad_results = load_results('tinygrad')
+    llamacpp_results = load_results('llamacpp')
 
     if not tinygrad_results and not llamacpp_results:
         print("No benchmark results found. Run the benchmarks first:")
@@ -4,30 +4,26 @@ Generates bar charts comparing tokens/sec across quantization methods.
 
 Usage: python visualize_benchmarks_all.py
 """
-import csv
-import os
 from collections import defaultdict
 from typing import Dict, List, Tuple
 
-
-def load_csv(filepath: str) -> List[Dict]:
-    """Load benchmark results from CSV file."""
-    results = []
-    if not os.path.exists(filepath):
-        return results
-    with open(filepath, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            results.append(row)
-    return results
+from analysis_engine import is_default_config
+from bench_stats import compare
+from results_store import load_results
 
 
 def compute_averages(results: List[Dict], group_by: str = 'quantize') -> Dict:
     """Compute average tokens_per_sec grouped by quantization method."""
     grouped = defaultdict(list)
     for row in results:
-        # Skip summary rows (step == 0 for llamacpp)
-        if row.get('step') == '0':
+        # Skip summary rows (step == 0 for llamacpp) and tinygrad compile/warmup steps
+        if str(row.get('step')) == '0' or row.get('phase') in ('compile', 'warmup'):
+            continue
+        # llama-bench prompt processing (pp512) is not decode throughput
+        if str(row.get('test') or '').startswith('pp'):
+            continue
+        # device/shard/BEAM/build-variant/cold-cache sweeps are not comparable across backends
+        if not is_default_config(row):
             continue
         quant = row.get(group_by, 'unknown')
         try:
@@ -45,6 +41,7 @@ def compute_averages(results: List[Dict], group_by: str = 'quantize') -> Dict:
                 'min': min(values),
                 'max': max(values),
                 'count': len(values),
+                'values': values,
             }
     return averages
 
@@ -106,7 +103,7 @@ def render_ascii_bar_chart(backends_data: Dict[str, Dict]):
 
 
 def render_speedup_comparison(backends_data: Dict[str, Dict]):
-    """Show speedup comparison between backends."""
+    """Show speedup comparison between backends, with a 95% bootstrap CI and significance."""
     print("\n" + "=" * 100)
     print("SPEEDUP COMPARISON (relative to tinygrad)")
     print("=" * 100)
@@ -130,14 +127,17 @@ def render_speedup_comparison(backends_data: Dict[str, Dict]):
             
         for quant in sorted(common_quants):
             t_val = tinygrad_data[quant]['mean']
-            b_val = backend_data[quant]['mean']
             
             if t_val > 0:
-                speedup = b_val / t_val
+                r = compare(tinygrad_data[quant]['values'], backend_data[quant]['values'])
+                speedup, lo, hi = r['speedup'], r['ci_lo'], r['ci_hi']
+                sig = "significant" if r['significant'] else "not significant"
                 if speedup >= 1:
-                    print(f"  {quant:<15}: {backend_name} is {speedup:.2f}x faster")
+                    print(f"  {quant:<15}: {backend_name} is {speedup:.2f}x faster "
+                          f"(95% CI {lo:.2f}-{hi:.2f}x, p={r['p_mannwhitney']:.3g}, {sig})")
                 else:
-                    print(f"  {quant:<15}: tinygrad is {1/speedup:.2f}x faster")
+                    print(f"  {quant:<15}: tinygrad is {1/speedup:.2f}x faster "
+                          f"(95% CI {1/hi:.2f}-{1/lo:.2f}x, p={r['p_mannwhitney']:.3g}, {sig})")
 
 
 def render_summary_stats(backends_data: Dict[str, Dict]):
@@ -167,17 +167,17 @@ def main():
     backends_data = {}
     
     # Load tinygrad results
-    tinygrad_results = load_csv('benchmark_output/tinygrad.csv')
+    tinygrad_results = load_results('tinygrad')
     if tinygrad_results:
         backends_data['tinygrad'] = compute_averages(tinygrad_results)
     
     # Load llama.cpp results
-    llamacpp_results = load_csv('benchmark_output/llamacpp.csv')
+    llamacpp_results = load_results('llamacpp')
     if llamacpp_results:
         backends_data['llama.cpp'] = compute_averages(llamacpp_results)
     
     # Load MLC LLM results
-    mlc_results = load_csv('benchmark_output/mlc_llm.csv')
+    mlc_results = load_results('mlc_llm')
     if mlc_results:
         backends_data['mlc_llm'] = compute_averages(mlc_results)
     
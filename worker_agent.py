@@ -0,0 +1,172 @@
+"""
+Worker agent: pulls benchmark configs from coordinator.py and runs them on this host.
+
+The agent reports this host's capabilities (RAM, cores, device type and which
+runners are installed) with every claim, runs each job through the existing
+runner (llamacpp_benchmark.run_config / tinygrad_benchmark.run_config), and
+posts the parsed rows back to the coordinator's central store; the runner also
+keeps its usual local log and store copy. It heartbeats while a job runs so
+the coordinator can requeue jobs of workers that disappear.
+
+HTTP uses only the standard library, but the runners need what the benchmark
+scripts need: numpy (via roofline.py) plus tinygrad or a llama.cpp build.
+Capabilities can be overridden, e.g. to try the scheduler with several local
+workers posing as different hosts.
+
+Usage:
+    python worker_agent.py --coordinator http://desktop:8700
+    python worker_agent.py --coordinator http://localhost:8700 --worker-id fake-pixel --device-type pixel --ram-gb 8
+"""
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import argparse
+import threading
+import traceback
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+POLL_S = 10
+LLAMA_BENCH = "./deps/llama.cpp/build/bin/llama-bench"
+TINYGRAD_LLAMA = "deps/tinygrad/examples/llama3.py"
+
+
+def ram_gb() -> float:
+    try:
+        return round(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1e9, 1)
+    except (ValueError, OSError, AttributeError):
+        return 0.0
+
+
+def device_type() -> str:
+    if platform.system() == "Darwin":
+        return "mac"
+    if "ANDROID_ROOT" in os.environ or "TERMUX_VERSION" in os.environ:
+        return "pixel"
+    return "linux"
+
+
+def capabilities() -> Dict[str, Any]:
+    backends = []
+    if os.path.exists(LLAMA_BENCH):
+        backends.append("llamacpp")
+    if os.path.exists(TINYGRAD_LLAMA):
+        backends.append("tinygrad")
+    return {
+        "worker_id": f"{socket.gethostname()}:{os.getpid()}",
+        "hostname": socket.gethostname(),
+        "platform": platform.system(),
+        "machine": platform.machine(),
+        "device_type": device_type(),
+        "ram_gb": ram_gb(),
+        "cpu_count": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1,
+        "backends": backends,
+    }
+
+
+def run_llamacpp(config) -> List[Dict]:
+    from llamacpp_benchmark import run_config
+    return run_config(config)
+
+
+def run_tinygrad(config) -> List[Dict]:
+    from tinygrad_benchmark import run_config
+    rows, _ = run_config(config)
+    return rows
+
+
+RUNNERS = {"llamacpp": run_llamacpp, "tinygrad": run_tinygrad}
+
+
+def post(url: str, payload: Optional[Dict] = None, timeout: float = 60) -> Dict:
+    data = json.dumps(payload or {}, default=str).encode()
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b"{}")
+
+
+def _heartbeat(url: str, worker_id: str, interval: float, stop: threading.Event):
+    while not stop.wait(interval):
+        try:
+            post(url, {"worker_id": worker_id})
+        except urllib.error.HTTPError as e:
+            if e.code == 409:
+                print("Lease lost, the coordinator has requeued this job")
+                return
+            print(f"Heartbeat failed: {e}")
+        except OSError as e:
+            print(f"Heartbeat failed: {e}")
+
+
+def run_job(coordinator: str, job: Dict, lease_s: float, worker_id: str) -> Dict:
+    """Run one claimed job while heartbeating, then post its rows (or error) back."""
+    config = tuple(tuple(tup) for tup in job["config"])
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(f"{coordinator}/heartbeat/{job['id']}", worker_id, lease_s / 3, stop),
+                            daemon=True)
+    beat.start()
+    rows, error = [], None
+    try:
+        os.makedirs("benchmark_output", exist_ok=True)
+        rows = RUNNERS[job["backend"]](config)
+    except Exception as e:
+        traceback.print_exc()
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        stop.set()
+        beat.join()
+    try:
+        return post(f"{coordinator}/results/{job['id']}", {"rows": rows, "error": error, "worker_id": worker_id,
+                                                          "source": f"worker:{socket.gethostname()}:{job['id']}"})
+    except urllib.error.HTTPError as e:
+        if e.code != 409:
+            raise
+        # another worker holds the job now; its results are the ones that count
+        return {"state": "lease lost", "rows_written": 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run benchmark jobs handed out by coordinator.py")
+    parser.add_argument("--coordinator", required=True, help="Coordinator URL, e.g. http://desktop:8700")
+    parser.add_argument("--worker-id", help="Name for this worker (default: hostname:pid)")
+    parser.add_argument("--device-type", choices=["linux", "mac", "pixel"], help="Override the detected device type")
+    parser.add_argument("--ram-gb", type=float, help="Override the detected RAM")
+    parser.add_argument("--cpus", type=int, help="Override the detected core count")
+    parser.add_argument("--backend", action="append", choices=list(RUNNERS), help="Only take jobs for these runners (default: installed ones)")
+    parser.add_argument("--poll", type=float, default=POLL_S, help=f"Seconds between claims when idle (default: {POLL_S})")
+    parser.add_argument("--stay", action="store_true", help="Keep polling after the sweep is done")
+    args = parser.parse_args()
+
+    caps = capabilities()
+    overrides = {"worker_id": args.worker_id, "device_type": args.device_type, "ram_gb": args.ram_gb,
+                 "cpu_count": args.cpus, "backends": args.backend}
+    caps.update({k: v for k, v in overrides.items() if v is not None})
+    coordinator = args.coordinator.rstrip("/")
+    print(f"Worker {caps['worker_id']}: {caps['device_type']}, {caps['ram_gb']} GB, {caps['cpu_count']} cores, "
+          f"backends {', '.join(caps['backends']) or 'none'}")
+
+    while True:
+        try:
+            reply = post(f"{coordinator}/claim", caps)
+        except OSError as e:
+            print(f"Coordinator unreachable ({e}), retrying in {args.poll}s")
+            time.sleep(args.poll)
+            continue
+        job = reply.get("job")
+        if job is None:
+            if reply.get("done") and not args.stay:
+                print("Sweep finished")
+                return
+            time.sleep(args.poll)
+            continue
+        print(f"Running {job['id']}: {job['backend']} {' '.join(' '.join(t) for t in job['config'] if t)}")
+        result = run_job(coordinator, job, reply.get("lease_s", 300), caps["worker_id"])
+        print(f"  {job['id']}: {result.get('state')}, {result.get('rows_written', 0)} rows stored")
+
+
+if __name__ == "__main__":
+    sys.exit(main())